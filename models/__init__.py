@@ -28,4 +28,12 @@ class EvaluationResult:
     detailed_explanation: str
     suggested_improvement: str
     confidence_score: float  # 评估置信度
-    mistakes: List[str]  # 具体错误点
\ No newline at end of file
+    mistakes: List[str]  # 具体错误点
+
+@dataclass
+class GenerationEvent:
+    kind: str  # start: 开始生成 / chunk: 流式片段 / question: 题目完成 / skipped: 题目跳过 / deadline: 超过会话时限
+    index: int = 0
+    total: int = 0
+    text: str = ""
+    question: Optional[Question] = None
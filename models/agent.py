@@ -1,7 +1,12 @@
-from typing import Dict, Any, List, Optional
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional, Tuple
+import asyncio
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from models import Question, EvaluationResult
+from models import Question, EvaluationResult, GenerationEvent
+from models.cancellation import CancelToken, OperationCancelled
+from models.work_scheduler import Priority, Promotion, current_work, llm_work
+from models.question_dedup import material_hash
 
 class LLMAgent:
     """学习评估和巩固智能体"""
@@ -17,17 +22,101 @@ class LLMAgent:
         from models.answer_evaluator import AnswerEvaluator
         from models.weakness_analyzer import WeaknessAnalyzer
         from models.mongodb_client import MongoDBClient
+        from models.rate_limiter import AdaptiveRateLimiter
+        from models.llm_client import create_openai_client
+        from models.llm_gateway import LLMGateway
+        from models.model_router import ModelRouter
+        from models.endpoint_pool import EndpointPool
+        from models.prompt_templates import load_prompt_templates
+        from models.question_dedup import QuestionDeduplicator
+        from models.coverage_scheduler import CoverageScheduler
+        from models.question_pool import SharedQuestionPool
+        from models.embeddings import create_embedder
+        from models.semantic_cache import SemanticCache
+        from models.answer_pregrader import ShortAnswerPreGrader
+        from models.evaluation_cache import EvaluationCache
+        
+        # 所有LLM调用共享同一个客户端（连接池）、限流器和重试策略
+        # 配置了多个端点时由端点池路由，每个端点有自己的限流器，默认客户端和限流器取第一个端点
+        endpoint_pool = EndpointPool.from_config(
+            self.config, create_openai_client,
+            limiter_factory=lambda: AdaptiveRateLimiter.from_config(self.config)
+        )
+        if endpoint_pool is not None:
+            self.llm_client = endpoint_pool.endpoints[0].client
+            self.rate_limiter = endpoint_pool.endpoints[0].limiter
+        else:
+            self.llm_client = create_openai_client(self.config)
+            self.rate_limiter = AdaptiveRateLimiter.from_config(self.config)
+        self.llm_gateway = LLMGateway.from_config(
+            self.config,
+            self.llm_client,
+            limiter=self.rate_limiter,
+            endpoint_pool=endpoint_pool,
+            router=ModelRouter.from_config(self.config)
+        )
+        
+        # 提示词模板只加载和预编译一次
+        self.prompts = load_prompt_templates(self.config.PROMPT_TEMPLATES_DIR)
+        llm_options = {"llm": self.llm_gateway, "prompts": self.prompts}
+        
+        # 语义缓存和简答题预评分共用的embedding
+        self.embedder = create_embedder(self.config, self.llm_gateway)
+        
+        # 可选：语义缓存，每个调用点使用各自的相似度阈值
+        self.semantic_caches = {}
+        if self.config.SEMANTIC_CACHE:
+            self.semantic_caches["key_concepts"] = SemanticCache(
+                self.embedder, self.config.SEMANTIC_CACHE_CONCEPT_THRESHOLD, name="key_concepts"
+            )
+            # 本地哈希向量分不清"是"和"不是"，只有语义embedding可用于复用评分
+            if self.embedder.semantic:
+                self.semantic_caches["short_answer"] = SemanticCache(
+                    self.embedder, self.config.SEMANTIC_CACHE_GRADING_THRESHOLD, name="short_answer"
+                )
         
         # 初始化组件
-        self.data_processor = DataProcessor(self.config)
-        self.question_generator = QuestionGenerator(self.config)
-        self.answer_evaluator = AnswerEvaluator(self.config)
         self.mongo_client = MongoDBClient(self.config)
+        self.data_processor = DataProcessor(
+            self.config, concept_cache=self.semantic_caches.get("key_concepts"), **llm_options
+        )
+        deduplicator = QuestionDeduplicator(store=self.mongo_client)
+        self.question_generator = QuestionGenerator(
+            self.config,
+            deduplicator=deduplicator,
+            **llm_options
+        )
+        self.pregrader = ShortAnswerPreGrader(
+            self.embedder,
+            accept_threshold=self.config.PREGRADE_ACCEPT_THRESHOLD,
+            reject_threshold=self.config.PREGRADE_REJECT_THRESHOLD
+        ) if self.config.SHORT_ANSWER_PREGRADE else None
+        self.evaluation_cache = EvaluationCache(self.mongo_client) if self.config.EVALUATION_CACHE else None
+        self.answer_evaluator = AnswerEvaluator(
+            self.config,
+            grading_cache=self.semantic_caches.get("short_answer"),
+            pregrader=self.pregrader,
+            evaluation_cache=self.evaluation_cache,
+            rubric_accept=self.config.RUBRIC_LOCAL_ACCEPT,
+            consistency_samples=self.config.GRADING_SAMPLES,
+            **llm_options
+        )
         self.weakness_analyzer = WeaknessAnalyzer(self.mongo_client)
+        self.coverage_scheduler = CoverageScheduler(store=self.mongo_client)
+        # 可选：同一资料的题目在用户间共享
+        self.question_pool = SharedQuestionPool(self.mongo_client) if self.config.SHARED_QUESTION_POOL else None
         
         # 缓存
         self.question_cache = {}
         self.user_sessions = {}
+        
+        # 后台任务（两阶段模式下的解析生成等）
+        self.background_executor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="agent-bg"
+        )
+        # 题库指纹在后台加载，不阻塞第一道题
+        deduplicator.load_in_background(self.background_executor)
+        self.explanation_futures = {}  # 题目ID -> (后台解析任务, 任务的Promotion)
     
     def process_material(self, material_input: Any) -> List[Any]:
         """处理学习资料"""
@@ -40,32 +129,64 @@ class LLMAgent:
             # 假设是文本
             chunks = self.data_processor.process_input(str(material_input))
         
-        # 提取关键概念（只提取一次，后续复用）
-        key_concepts = self.data_processor.extract_key_concepts(chunks)
-        
         # 缓存处理结果
         session_id = f"session_{datetime.now().timestamp()}"
-        self.user_sessions[session_id] = {
+        session = self.user_sessions[session_id] = {
             "chunks": chunks,
-            "key_concepts": key_concepts,
-            "key_concepts": key_concepts,
+            "key_concepts": None,
             "timestamp": datetime.now()
         }
         
+        # 关键概念在后台提取（只提取一次，后续复用），不阻塞第一题的生成
+        future = self.background_executor.submit(
+            self._run_in_background, self.data_processor.extract_key_concepts, chunks
+        )
+        session["key_concepts_future"] = future
+        future.add_done_callback(lambda f: self._on_key_concepts(session, f))
+        
         return chunks
     
+    @staticmethod
+    def _on_key_concepts(session: Dict, future):
+        """后台概念提取完成后写入会话；失败时出题不使用概念"""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            print(f"Failed to extract key concepts: {error}")
+            return
+        session["key_concepts"] = future.result()
+    
+    def _latest_session(self) -> Dict:
+        latest_session_key = sorted(self.user_sessions.keys())[-1] if self.user_sessions else None
+        return self.user_sessions.get(latest_session_key, {}) if latest_session_key else {}
+    
+    def _latest_concepts(self):
+        """最新会话的关键概念；尚未提取完成时返回进行中的Future，由出题时按需取用"""
+        session = self._latest_session()
+        future = session.get("key_concepts_future")
+        if session.get("key_concepts") is not None or future is None:
+            return session.get("key_concepts")
+        if future.done() and not future.cancelled() and future.exception() is None:
+            return future.result()
+        return future
+    
     def generate_questions(
         self, 
         chunks: List[Any],
         num_questions: int = 5,
         question_types: List[str] = None,
-        difficulty_mix: str = "adaptive"
+        difficulty_mix: str = "adaptive",
+        user_id: Optional[str] = None
     ) -> List[Question]:
-        """生成评估题目"""
+        """生成评估题目
         
-        # 获取最新的session
-        latest_session_key = sorted(self.user_sessions.keys())[-1] if self.user_sessions else None
-        latest_concepts = self.user_sessions.get(latest_session_key, {}).get("key_concepts") if latest_session_key else None
+        指定user_id时按该用户的分块覆盖情况选择分块；启用共享题目池时
+        先从池中抽取该用户未见过的题目，只为不足的部分调用LLM。
+        """
+        
+        # 最新资料的关键概念（可能仍在后台提取中）
+        latest_concepts = self._latest_concepts()
         
         # 如果没有指定题目类型，根据难度混合设置调整参数
         if question_types is None:
@@ -79,16 +200,28 @@ class LLMAgent:
                 question_types = list(self.config.QUESTION_TYPES)
                 difficulty_bias = None
         
-        questions = self.question_generator.generate_questions(
-            chunks,
-            num_questions=num_questions,
-            question_types=question_types,
-            pre_extracted_concepts=latest_concepts
-        )
+        pooled = self._draw_from_pool(chunks, user_id, num_questions, question_types)
+        generated = []
+        if len(pooled) < num_questions:
+            with llm_work(Priority.NEXT_QUESTION, user_id):
+                generated = self.question_generator.generate_questions(
+                    chunks,
+                    num_questions=num_questions - len(pooled),
+                    question_types=question_types,
+                    pre_extracted_concepts=latest_concepts,
+                    instant_first=self.config.INSTANT_FIRST_QUESTION and not pooled,
+                    chunk_selector=self._chunk_selector(user_id, chunks)
+                )
         
         # 缓存问题
+        for q in generated:
+            if user_id is not None:
+                self._tag_material(q, chunks)
+        questions = pooled + generated
         for q in questions:
             self.question_cache[q.question_id] = q
+            self._schedule_explanation(q)
+        self._share_to_pool(chunks, user_id, pooled, generated)
         
         return questions
     
@@ -100,13 +233,17 @@ class LLMAgent:
         difficulty_mix: str = "adaptive",
         on_question_start: callable = None,
         on_question_chunk: callable = None,
-        on_question_complete: callable = None
+        on_question_complete: callable = None,
+        user_id: Optional[str] = None,
+        on_question_skipped: callable = None
     ) -> List[Question]:
-        """流式生成评估题目"""
+        """流式生成评估题目（分块选择和共享题目池同generate_questions）
         
-        # 获取最新的session
-        latest_session_key = sorted(self.user_sessions.keys())[-1] if self.user_sessions else None
-        latest_concepts = self.user_sessions.get(latest_session_key, {}).get("key_concepts") if latest_session_key else None
+        题目因重复或无法生成而跳过时调用on_question_skipped (question_index, total)。
+        """
+        
+        # 最新资料的关键概念（可能仍在后台提取中）
+        latest_concepts = self._latest_concepts()
         
         # 如果没有指定题目类型，根据难度混合设置调整参数
         if question_types is None:
@@ -120,34 +257,247 @@ class LLMAgent:
                 question_types = list(self.config.QUESTION_TYPES)
                 difficulty_bias = None
         
-        questions = self.question_generator.generate_questions_stream(
-            chunks,
-            num_questions=num_questions,
-            question_types=question_types,
-            pre_extracted_concepts=latest_concepts,
-            on_question_start=on_question_start,
-            on_question_chunk=on_question_chunk,
-            on_question_complete=on_question_complete
-        )
+        def on_complete(question):
+            # 题目一生成就开始后台生成解析，不等其余题目
+            if user_id is not None:
+                self._tag_material(question, chunks)
+            self._schedule_explanation(question)
+            if on_question_complete:
+                on_question_complete(question)
+        
+        # 池中的题目直接交付，无需等待生成
+        pooled = self._draw_from_pool(chunks, user_id, num_questions, question_types)
+        for question in pooled:
+            self._schedule_explanation(question)
+            if on_question_complete:
+                on_question_complete(question)
+        
+        generated = []
+        if len(pooled) < num_questions:
+            with llm_work(Priority.NEXT_QUESTION, user_id):
+                generated = self.question_generator.generate_questions_stream(
+                    chunks,
+                    num_questions=num_questions - len(pooled),
+                    question_types=question_types,
+                    pre_extracted_concepts=latest_concepts,
+                    on_question_start=on_question_start,
+                    on_question_chunk=on_question_chunk,
+                    on_question_complete=on_complete,
+                    instant_first=self.config.INSTANT_FIRST_QUESTION and not pooled,
+                    chunk_selector=self._chunk_selector(user_id, chunks),
+                    on_question_skipped=on_question_skipped
+                )
         
         # 缓存问题
+        questions = pooled + generated
         for q in questions:
             self.question_cache[q.question_id] = q
+        self._share_to_pool(chunks, user_id, pooled, generated)
         
         return questions
     
+    async def iter_questions(
+        self,
+        chunks: List[Any],
+        num_questions: int = 5,
+        question_types: List[str] = None,
+        difficulty_mix: str = "adaptive",
+        user_id: Optional[str] = None,
+        deadline: Optional[float] = None,
+        cancel_token: Optional[CancelToken] = None,
+        include_chunks: bool = False
+    ) -> AsyncIterator[GenerationEvent]:
+        """异步迭代生成题目，题目一完成即产出事件
+        
+        Args:
+            deadline: 会话时限（秒），到期后停止生成并产出deadline事件
+            cancel_token: 外部取消令牌；调用方提前退出迭代时也会自动取消，
+                同时传入deadline时令牌的截止时间收紧到deadline以内
+            include_chunks: 是否产出流式片段事件（chunk）
+        
+        取消或到期时，进行中的流式HTTP响应会被关闭，剩余的LLM调用不再发出。
+        """
+        if cancel_token is not None:
+            token = cancel_token
+            token.limit(deadline)
+        else:
+            token = CancelToken(deadline)
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        
+        def emit(event: GenerationEvent):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+        
+        def on_start(index, total):
+            token.check()
+            emit(GenerationEvent("start", index=index, total=total))
+        
+        def on_chunk(text):
+            token.check()  # 在流式读取中途响应取消
+            if include_chunks:
+                emit(GenerationEvent("chunk", text=text))
+        
+        def on_complete(question):
+            emit(GenerationEvent("question", question=question))
+        
+        def on_skipped(index, total):
+            emit(GenerationEvent("skipped", index=index, total=total))
+        
+        def run():
+            with token.bind():
+                return self.generate_questions_stream(
+                    chunks,
+                    num_questions=num_questions,
+                    question_types=question_types,
+                    difficulty_mix=difficulty_mix,
+                    on_question_start=on_start,
+                    on_question_chunk=on_chunk,
+                    on_question_complete=on_complete,
+                    user_id=user_id,
+                    on_question_skipped=on_skipped
+                )
+        
+        worker = asyncio.ensure_future(asyncio.to_thread(run))
+        timer = loop.call_later(token.remaining(), token.cancel) if token.expires_at else None
+        try:
+            while not worker.done() or not events.empty():
+                getter = asyncio.ensure_future(events.get())
+                await asyncio.wait({getter, worker}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                else:
+                    getter.cancel()
+            
+            try:
+                worker.result()
+            except OperationCancelled:
+                if token.expired:
+                    yield GenerationEvent("deadline")
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if not worker.done():
+                # 调用方提前退出：取消剩余生成，关闭进行中的流
+                token.cancel()
+    
+    def _draw_from_pool(
+        self,
+        chunks: List[Any],
+        user_id: Optional[str],
+        num_questions: int,
+        question_types: List[str]
+    ) -> List[Question]:
+        """从共享题目池抽取该用户未见过的题目"""
+        if user_id is None or self.question_pool is None:
+            return []
+        return self.question_pool.draw(material_hash(chunks), user_id, num_questions, question_types)
+    
+    def _share_to_pool(
+        self,
+        chunks: List[Any],
+        user_id: Optional[str],
+        pooled: List[Question],
+        generated: List[Question]
+    ):
+        """新生成的题目加入共享池，并记录该用户已抽到的全部题目"""
+        if user_id is None or self.question_pool is None:
+            return
+        material = material_hash(chunks)
+        self.question_pool.add(material, generated)
+        self.question_pool.mark_served(material, user_id, pooled + generated)
+    
+    def _chunk_selector(self, user_id: Optional[str], chunks: List[Any]):
+        """有用户时使用覆盖调度器选择分块，否则由生成器随机抽样"""
+        if user_id is None:
+            return None
+        return self.coverage_scheduler.selector(user_id, chunks)
+    
+    def _tag_material(self, question: Question, chunks: List[Any]):
+        """记录题目所属资料，作答后用于更新分块覆盖状态"""
+        if "chunk_indices" in question.metadata:
+            question.metadata["material_hash"] = material_hash(chunks)
+            question.metadata["num_chunks"] = len(chunks)
+    
     def evaluate_answer(
         self, 
         question: Question, 
         user_answer: str,
-        user_history: Optional[Dict] = None
+        user_history: Optional[Dict] = None,
+        user_id: Optional[str] = None,
+        on_field: Optional[Callable[[str, Any], None]] = None
     ) -> EvaluationResult:
-        """评估用户答案"""
-        return self.answer_evaluator.evaluate_answer(
-            question, 
-            user_answer, 
-            user_history
+        """评估用户答案（用户正在等待，LLM调用按最高优先级排队）
+        
+        传入on_field时简答题的评估结果流式返回，字段完整到达即回调 on_field(字段名, 值)
+        """
+        with llm_work(Priority.INTERACTIVE, user_id):
+            if question.question_type != "short_answer":
+                # 选择题和真假题的解析直接来自题目，评估前确保已生成
+                self.get_explanation(question)
+            evaluation = self.answer_evaluator.evaluate_answer(
+                question, 
+                user_answer, 
+                user_history,
+                on_field=on_field
+            )
+            if not evaluation.detailed_explanation:
+                # LLM评分自带详细解释；只有不调用LLM的评分途径（缓存、预评分、要点匹配）需要题目解析
+                evaluation.detailed_explanation = self.get_explanation(question)
+            return evaluation
+
+    def preview_answer(self, question: Question, user_answer: str):
+        """简答题的即时要点匹配结果（部分得分、命中和遗漏的要点），可在LLM评分返回前展示"""
+        return self.answer_evaluator.preview(question, user_answer)
+
+    def evaluate_batch(
+        self,
+        items: List[Tuple[Question, str]],
+        user_id: Optional[str] = None,
+        priority: Priority = Priority.BACKGROUND
+    ) -> List[EvaluationResult]:
+        """批量评估(题目, 答案)（会话结束时或离线评分），默认按后台优先级排队"""
+        with llm_work(priority, user_id):
+            for question, _ in items:
+                self.get_explanation(question)
+            return self.answer_evaluator.evaluate_batch(items)
+
+    def _schedule_explanation(self, question: Question):
+        """两阶段模式：缺少解析的题目在后台生成解析"""
+        if question.explanation or question.question_id in self.explanation_futures:
+            return
+        promotion = Promotion()
+        future = self.background_executor.submit(
+            self._run_in_background, self.question_generator.generate_explanation, question,
+            promotion=promotion
         )
+        self.explanation_futures[question.question_id] = (future, promotion)
+    
+    @staticmethod
+    def _run_in_background(fn, *args, promotion: Optional[Promotion] = None):
+        """后台任务的LLM调用排在交互请求之后；等待结果的调用方可通过promotion提升优先级"""
+        with llm_work(Priority.BACKGROUND, promotion=promotion):
+            return fn(*args)
+    
+    def get_explanation(self, question: Question) -> str:
+        """获取题目解析：已有则直接返回，后台生成中则等待，否则按调用方的优先级当场生成
+        
+        后台任务尚未开始时取消它并当场生成；已经开始时把它排队中的LLM调用
+        提升到调用方的优先级再等待，避免交互请求排在后台优先级之后。
+        """
+        if question.explanation:
+            return question.explanation
+        
+        future, promotion = self.explanation_futures.pop(question.question_id, (None, None))
+        try:
+            if future is not None and not future.cancel():
+                promotion.promote(current_work().priority)
+                question.explanation = future.result()
+            else:
+                question.explanation = self.question_generator.generate_explanation(question)
+        except Exception:
+            question.explanation = "解析暂时无法生成，请参考正确答案。"
+        
+        return question.explanation
     
     def save_performance(
         self, 
@@ -157,6 +507,15 @@ class LLMAgent:
         user_answer: str
     ):
         """保存用户表现"""
+        self.get_explanation(question)
+        if "material_hash" in question.metadata:
+            self.coverage_scheduler.record_result(
+                user_id,
+                question.metadata["material_hash"],
+                question.metadata["num_chunks"],
+                question.metadata["chunk_indices"],
+                evaluation.is_correct
+            )
         return self.mongo_client.save_user_performance(
             user_id, 
             question,
@@ -208,7 +567,30 @@ class LLMAgent:
         
         return self.weakness_analyzer.create_study_plan(analysis["weaknesses"])
     
+    def warm_up_connections(self):
+        """后台预热LLM连接，不阻塞调用方"""
+        from models.llm_client import warm_up_connections
+        for client in self.llm_gateway.clients:
+            warm_up_connections(client, self.config.LLM_WARMUP_CONNECTIONS)
+    
+    def get_llm_stats(self) -> Dict:
+        """获取LLM调用统计（排队等待时间、并发上限、对冲请求数、提示词token节省等）"""
+        return {
+            **self.rate_limiter.stats(),
+            **self.llm_gateway.stats(),
+            "prompt_tokens_trimmed": self.prompts.tokens_trimmed,
+            "question_pool": self.question_pool.stats() if self.question_pool else None,
+            "semantic_cache": [cache.stats() for cache in getattr(self, "semantic_caches", {}).values()],
+            "pregrader": self.pregrader.stats() if getattr(self, "pregrader", None) else None,
+            "evaluation_cache": self.evaluation_cache.stats() if getattr(self, "evaluation_cache", None) else None
+        }
+    
     def cleanup(self):
         """清理资源"""
+        if hasattr(self, 'background_executor'):
+            self.background_executor.shutdown(wait=False, cancel_futures=True)
         if hasattr(self, 'mongo_client'):
-            self.mongo_client.close()
\ No newline at end of file
+            self.mongo_client.close()
+        if hasattr(self, 'llm_gateway'):
+            for client in self.llm_gateway.clients:
+                client.close()
\ No newline at end of file
@@ -1,32 +1,71 @@
+import contextvars
 import json
-from typing import Dict, List, Any, Tuple
+import statistics
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from openai import OpenAI
+from models.cancellation import CancelToken, current_cancel_token
+from models.incremental_json import IncrementalJSONObject
+from models.llm_gateway import LLMGateway
+from models.prompt_templates import load_prompt_templates
+from models.rubric_matcher import RubricMatch, compile_rubric, negation_count
 from models import Question, EvaluationResult
 
 class AnswerEvaluator:
     """智能评估用户答案，使用Prometheus模式提高公平性"""
     
-    def __init__(self, config):
+    BATCH_SIZE = 8         # 批量评估时每次请求包含的答案数
+    BATCH_CONCURRENCY = 4  # 批量评估时并发的请求数
+    RUBRIC_ACCEPT_SCORE = 80  # 命中全部要点且要点得分不低于此值时本地判对
+    CONSISTENCY_TEMPERATURE = 0.7  # 自洽评分的采样温度（高于合并相同请求的温度阈值）
+    SCORE_BAND = 20  # 自洽评分按此宽度划分分数段，判定和分数段都相同才算一致
+    
+    def __init__(
+        self, config, llm=None, prompts=None,
+        grading_cache=None, pregrader=None, evaluation_cache=None,
+        rubric_accept: bool = False,
+        consistency_samples: int = 1
+    ):
         self.config = config
-        self.client = OpenAI(
+        self.prompts = prompts or load_prompt_templates()
+        # 可选：按(题目ID, 规范化答案)精确命中的持久化评分缓存
+        self.evaluation_cache = evaluation_cache
+        # 可选：语义缓存，同一题目下近似相同的简答题答案复用已有评分
+        self.grading_cache = grading_cache
+        # 可选：embedding相似度预评分，只有中间区间的答案调用LLM
+        self.pregrader = pregrader
+        # 答案命中全部评分要点关键词时直接按要点得分判对，不调用LLM
+        self.rubric_accept = rubric_accept
+        # 大于1时简答题并发采样多次评分，过半样本一致即提前结束（自洽评分）
+        self.consistency_samples = consistency_samples
+        # 优先使用LLMAgent注入的共享网关（共享客户端、限流和重试策略）
+        self.llm = llm or LLMGateway(config, OpenAI(
             api_key=config.OPENAI_API_KEY,
             base_url=config.OPENAI_BASE_URL
-        )
+        ))
+        self.client = self.llm.client
     
     def evaluate_answer(
         self, 
         question: Question, 
         user_answer: str,
-        user_history: Dict = None
+        user_history: Dict = None,
+        on_field: Optional[Callable[[str, Any], None]] = None
     ) -> EvaluationResult:
-        """评估用户答案"""
+        """评估用户答案
+        
+        Args:
+            on_field: 可选，简答题调用LLM评分时流式接收评估结果，
+                每个字段（score、feedback等）完整到达时回调 on_field(字段名, 值)；
+                开启自洽评分时不流式，只返回最终结果
+        """
         
         if question.question_type == "multiple_choice":
             return self._evaluate_multiple_choice(question, user_answer)
         elif question.question_type == "true_false":
             return self._evaluate_true_false(question, user_answer)
         elif question.question_type == "short_answer":
-            return self._evaluate_short_answer(question, user_answer, user_history)
+            return self._evaluate_short_answer(question, user_answer, user_history, on_field)
         else:
             raise ValueError(f"Unknown question type: {question.question_type}")
     
@@ -116,15 +155,75 @@ class AnswerEvaluator:
         self, 
         question: Question,
         user_answer: str,
-        user_history: Dict = None
+        user_history: Dict = None,
+        on_field: Optional[Callable[[str, Any], None]] = None
     ) -> EvaluationResult:
         """使用Prometheus模式评估简答题"""
+        result, vector = self._short_answer_shortcut(question, user_answer)
+        if result is not None:
+            return result
+        if self.consistency_samples > 1:
+            return self._grade_self_consistent(question, user_answer, vector)
+        if on_field is not None:
+            return self._grade_short_answer_stream(question, user_answer, on_field, vector)
+        return self._grade_short_answer(question, user_answer, vector)
+    
+    def _short_answer_shortcut(self, question: Question, user_answer: str):
+        """不调用LLM的评分途径（精确缓存、语义缓存、预评分），返回(结果或None, 答案embedding)"""
+        if self.evaluation_cache is not None:
+            cached = self.evaluation_cache.get(question, user_answer)
+            if cached is not None:
+                return cached, None
+        
+        vector = None
+        if self.grading_cache is not None:
+            vector = self.grading_cache.embed(user_answer)
+            signature = self._answer_signature(question, user_answer)
+            cached = self.grading_cache.get(
+                user_answer, partition=question.question_id, vector=vector,
+                accept=lambda entry: entry["signature"] == signature
+            )
+            if cached is not None:
+                return cached["result"], vector
+        
+        if self.pregrader is not None:
+            result = self.pregrader.grade(question, user_answer)
+            if result is not None:
+                return result, vector
         
-        prompt = self._build_prometheus_prompt(question, user_answer)
+        if self.rubric_accept:
+            match = self.preview(question, user_answer)
+            if match is not None and match.complete and match.score >= self.RUBRIC_ACCEPT_SCORE:
+                return self._rubric_result(question, match), vector
+        return None, vector
+    
+    def preview(self, question: Question, user_answer: str) -> Optional[RubricMatch]:
+        """按评分要点关键词即时给出部分得分和命中/遗漏的要点（无可用要点时返回None）"""
+        matcher = compile_rubric(question)
+        if matcher is None:
+            return None
+        return matcher.match(user_answer)
+    
+    @staticmethod
+    def _rubric_result(question: Question, match: RubricMatch) -> EvaluationResult:
+        return EvaluationResult(
+            is_correct=True,
+            score=match.score,
+            feedback=f"回答正确！答到了全部{len(match.hit)}个评分要点。",
+            detailed_explanation=question.explanation,
+            suggested_improvement="回答得很好！可以尝试挑战更高难度的题目。",
+            confidence_score=0.7,
+            mistakes=[]
+        )
+    
+    def _grade_short_answer(self, question: Question, user_answer: str, vector=None) -> EvaluationResult:
+        """单独调用LLM评估一道简答题"""
+        messages = self._build_prometheus_messages(question, user_answer)
         
-        response = self.client.chat.completions.create(
+        response = self.llm.chat(
             model=self.config.OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
+            route=("evaluate", "short_answer", question.difficulty),
+            messages=messages,
             temperature=0.1,
             response_format={"type": "json_object"}
         )
@@ -134,50 +233,260 @@ class AnswerEvaluator:
             
             # 验证评估结果
             self._validate_evaluation(evaluation)
+            result = self._to_result(evaluation)
+        except Exception as e:
+            # 如果评估失败，使用备用方案（备用结果不缓存）
+            return self._fallback_evaluation(question, user_answer)
+
+        self._remember(question, user_answer, result, vector)
+        return result
+    
+    def _grade_short_answer_stream(
+        self,
+        question: Question,
+        user_answer: str,
+        on_field: Callable[[str, Any], None],
+        vector=None
+    ) -> EvaluationResult:
+        """流式调用LLM评估一道简答题，评估结果的字段逐个完整到达时即回调"""
+        messages = self._build_prometheus_messages(question, user_answer)
+        parser = IncrementalJSONObject()
+        
+        try:
+            with self.llm.chat(
+                model=self.config.OPENAI_MODEL,
+                route=("evaluate", "short_answer", question.difficulty),
+                messages=messages,
+                temperature=0.1,
+                response_format={"type": "json_object"},
+                stream=True
+            ) as stream:
+                for chunk in stream:
+                    content = chunk.choices[0].delta.content if chunk.choices else None
+                    if not content:
+                        continue
+                    for field, value in parser.feed(content).items():
+                        on_field(field, value)
             
-            return EvaluationResult(
-                is_correct=evaluation.get("is_correct", False),
-                score=evaluation.get("score", 0),
-                feedback=evaluation.get("feedback", ""),
-                detailed_explanation=evaluation.get("detailed_explanation", ""),
-                suggested_improvement=evaluation.get("suggested_improvement", ""),
-                confidence_score=evaluation.get("confidence_score", 0.8),
-                mistakes=evaluation.get("mistakes", [])
-            )
+            evaluation = parser.fields
+            self._validate_evaluation(evaluation)
+            result = self._to_result(evaluation)
         except Exception as e:
-            # 如果评估失败，使用备用方案
+            # 流式评估失败（包括中途断开）时使用备用方案（备用结果不缓存）
             return self._fallback_evaluation(question, user_answer)
+        
+        self._remember(question, user_answer, result, vector)
+        return result
     
-    def _build_prometheus_prompt(self, question: Question, user_answer: str) -> str:
-        """构建Prometheus评估提示词"""
-        return f"""你是一个公平、客观的评估专家。请评估以下答案：
-
-        问题：{question.content}
+    def _grade_self_consistent(self, question: Question, user_answer: str, vector=None) -> EvaluationResult:
+        """并发采样多次LLM评分，过半样本的判定和分数段一致时提前返回
         
-        参考答案：{question.correct_answer}
+        置信度为一致样本占成功解析样本的比例（调用失败的采样不计入）；
+        采样全部返回仍未过半时取最大的一致组，
+        这类有争议的结果不缓存，再次评估时重新采样。
+        """
+        samples = self.consistency_samples
+        quorum = samples // 2 + 1
+        messages = self._build_prometheus_messages(question, user_answer)
+        # 提前结束时取消尚未发出的采样和重试；沿用会话令牌的剩余时限
+        outer = current_cancel_token()
+        token = CancelToken(deadline=outer.remaining() if outer is not None else None)
         
-        评分标准：{json.dumps(question.metadata.get('scoring_criteria', []), ensure_ascii=False)}
+        def sample() -> Dict:
+            with token.bind():
+                if outer is not None:
+                    outer.check()
+                response = self.llm.chat(
+                    model=self.config.OPENAI_MODEL,
+                    route=("evaluate", "short_answer", question.difficulty),
+                    messages=messages,
+                    temperature=self.CONSISTENCY_TEMPERATURE,
+                    response_format={"type": "json_object"}
+                )
+            evaluation = json.loads(response.choices[0].message.content)
+            self._validate_evaluation(evaluation)
+            return evaluation
+        
+        votes: Dict[Tuple[bool, int], List[Dict]] = {}
+        parsed = 0
+        agreed = None
+        executor = ThreadPoolExecutor(max_workers=samples, thread_name_prefix="eval-sample")
+        try:
+            # 在线程池中保留调用方上下文（优先级类别）
+            futures = [executor.submit(contextvars.copy_context().run, sample) for _ in range(samples)]
+            for future in as_completed(futures):
+                try:
+                    evaluation = future.result()
+                except Exception:
+                    continue
+                parsed += 1
+                key = (bool(evaluation.get("is_correct", False)), self._score_band(evaluation["score"]))
+                votes.setdefault(key, []).append(evaluation)
+                if len(votes[key]) >= quorum:
+                    agreed = key
+                    break
+        finally:
+            token.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
         
-        用户答案：{user_answer}
+        if not votes:
+            return self._fallback_evaluation(question, user_answer)
+        
+        group = votes[agreed] if agreed is not None else max(votes.values(), key=len)
+        # 取分数为组内中位数的样本作为评估结果
+        median = statistics.median_low(e["score"] for e in group)
+        representative = next(e for e in group if e["score"] == median)
+        result = self._to_result(dict(representative, confidence_score=round(len(group) / parsed, 2)))
+        if agreed is not None:
+            self._remember(question, user_answer, result, vector)
+        return result
+    
+    def _score_band(self, score: float) -> int:
+        return min(int(score) // self.SCORE_BAND, (100 - 1) // self.SCORE_BAND)
+    
+    def _remember(self, question: Question, user_answer: str, result: EvaluationResult, vector=None):
+        if self.evaluation_cache is not None:
+            self.evaluation_cache.put(question, user_answer, result)
+        if self.grading_cache is not None:
+            entry = {"result": result, "signature": self._answer_signature(question, user_answer)}
+            self.grading_cache.put(user_answer, entry, partition=question.question_id, vector=vector)
+    
+    def _answer_signature(self, question: Question, user_answer: str) -> Tuple:
+        """语义缓存命中的附加条件：否定词数和命中的评分要点都相同才复用评分"""
+        match = self.preview(question, user_answer)
+        return negation_count(user_answer), tuple(match.hit) if match is not None else ()
+    
+    @staticmethod
+    def _to_result(evaluation: Dict) -> EvaluationResult:
+        return EvaluationResult(
+            is_correct=evaluation.get("is_correct", False),
+            score=evaluation.get("score", 0),
+            feedback=evaluation.get("feedback", ""),
+            detailed_explanation=evaluation.get("detailed_explanation", ""),
+            suggested_improvement=evaluation.get("suggested_improvement", ""),
+            confidence_score=evaluation.get("confidence_score", 0.8),
+            mistakes=evaluation.get("mistakes", [])
+        )
+    
+    def evaluate_batch(
+        self,
+        items: List[Tuple[Question, str]],
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None
+    ) -> List[EvaluationResult]:
+        """批量评估(题目, 答案)，结果顺序与输入一致
         
-        请按照以下步骤进行（CoT推理）：
-        1. 分析用户答案是否涵盖了参考答案的关键要点
-        2. 检查是否有事实性错误
-        3. 评估答案的完整性和准确性
-        4. 给出具体的改进建议
+        选择题、真假题和可在本地确定的简答题不调用LLM；其余简答题每batch_size个
+        合并为一次结构化请求，多个请求并发执行。批量结果逐项校验，
+        缺失或无效的项单独重新评估，不重发整批。
+        """
+        batch_size = batch_size or self.BATCH_SIZE
+        max_concurrency = max_concurrency or self.BATCH_CONCURRENCY
         
-        请以JSON格式返回评估结果：
-        {{
-            "is_correct": true/false,
-            "score": 0-100,
-            "feedback": "总体反馈",
-            "detailed_explanation": "详细解释",
-            "suggested_improvement": "改进建议",
-            "confidence_score": 0-1,
-            "mistakes": ["错误点1", "错误点2"]
-        }}
+        results: List[Optional[EvaluationResult]] = [None] * len(items)
+        pending = []  # (下标, 答案embedding)
+        for index, (question, user_answer) in enumerate(items):
+            if question.question_type != "short_answer":
+                results[index] = self.evaluate_answer(question, user_answer)
+                continue
+            result, vector = self._short_answer_shortcut(question, user_answer)
+            if result is not None:
+                results[index] = result
+            else:
+                pending.append((index, vector))
         
-        确保评估公平，避免过于严格或宽松。"""
+        if not pending:
+            return results
+        
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        workers = min(max_concurrency, len(pending))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eval-batch") as executor:
+            # 在线程池中保留调用方上下文（优先级类别、取消令牌）
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._grade_batch, items, batch)
+                for batch in batches
+            ]
+            failed = []
+            for batch, future in zip(batches, futures):
+                graded = future.result()
+                for index, vector in batch:
+                    question, user_answer = items[index]
+                    if index in graded:
+                        results[index] = graded[index]
+                        self._remember(question, user_answer, graded[index], vector)
+                    else:
+                        failed.append((index, vector))
+            
+            retries = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self._grade_short_answer, items[index][0], items[index][1], vector
+                )
+                for index, vector in failed
+            ]
+            for (index, _), future in zip(failed, retries):
+                try:
+                    results[index] = future.result()
+                except Exception:
+                    results[index] = self._fallback_evaluation(*items[index])
+        
+        return results
+    
+    def _grade_batch(
+        self,
+        items: List[Tuple[Question, str]],
+        batch: List[Tuple[int, Any]]
+    ) -> Dict[int, EvaluationResult]:
+        """一次请求评估一批简答题，返回通过校验的结果 {下标: 结果}"""
+        payload = []
+        for index, _ in batch:
+            question, user_answer = items[index]
+            payload.append({
+                "id": str(index),
+                "question": question.content,
+                "reference_answer": question.correct_answer,
+                "scoring_criteria": question.metadata.get("scoring_criteria", []),
+                "user_answer": user_answer
+            })
+        messages = self.prompts.render_messages(
+            "prometheus_eval_batch", items=json.dumps(payload, ensure_ascii=False)
+        )
+        
+        try:
+            response = self.llm.chat(
+                model=self.config.OPENAI_MODEL,
+                route=("evaluate", "short_answer", "batch"),
+                messages=messages,
+                temperature=0.1,
+                response_format={"type": "json_object"}
+            )
+            evaluations = json.loads(response.choices[0].message.content).get("results", [])
+        except Exception as e:
+            print(f"Batch evaluation failed, grading individually: {e}")
+            return {}
+        
+        expected = {index for index, _ in batch}
+        graded = {}
+        for evaluation in evaluations if isinstance(evaluations, list) else []:
+            try:
+                index = int(evaluation["id"])
+                if index not in expected or index in graded:
+                    continue
+                self._validate_evaluation(evaluation)
+                graded[index] = self._to_result(evaluation)
+            except (KeyError, TypeError, ValueError):
+                continue
+        return graded
+    
+    def _build_prometheus_messages(self, question: Question, user_answer: str) -> List[Dict]:
+        """构建Prometheus评估消息：静态评分指令在前，题目和答案在后"""
+        return self.prompts.render_messages(
+            "prometheus_eval",
+            question=question.content,
+            reference_answer=question.correct_answer,
+            scoring_criteria=json.dumps(question.metadata.get('scoring_criteria', []), ensure_ascii=False),
+            user_answer=user_answer
+        )
     
     def _validate_evaluation(self, evaluation: Dict) -> None:
         """验证评估结果的合理性"""
@@ -0,0 +1,103 @@
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from models import Question, EvaluationResult
+from models.question_dedup import normalize_text
+from models.rubric_matcher import compile_rubric, negation_count
+
+
+class ShortAnswerPreGrader:
+    """简答题预评分：用embedding相似度在本地处理明确的情况
+
+    - 空白答案：直接判0分
+    - 与参考答案几乎一致（相似度不低于accept_threshold）：直接判对。
+      要求否定词数与参考答案一致、命中全部评分要点
+    - 与参考答案和所有评分要点都不相关（相似度均低于reject_threshold）：直接判错
+    - 其余中间区间交给LLM评分
+
+    判对和判错都只在使用语义embedding时启用。字符n-gram向量分不清"表现较差"和
+    "表现也很好"，也认不出换了说法或换了语言的正确答案，此时除空白答案外全部交给LLM。
+    """
+
+    def __init__(self, embedder, accept_threshold: float = 0.9, reject_threshold: float = 0.2):
+        self.embedder = embedder
+        self.accept_threshold = accept_threshold
+        self.reject_threshold = reject_threshold
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.escalated = 0
+
+    def grade(self, question: Question, user_answer: str) -> Optional[EvaluationResult]:
+        """本地可确定时返回评分结果，需要LLM评分时返回None"""
+        if not normalize_text(user_answer):
+            self._count("rejected")
+            return self._result(question, False, 0, "未作答。", ["未作答"], 1.0)
+
+        if not getattr(self.embedder, "semantic", False):
+            self._count("escalated")
+            return None
+
+        criteria = [str(c) for c in question.metadata.get("scoring_criteria", []) if str(c).strip()]
+        vectors = self.embedder.embed([user_answer, question.correct_answer] + criteria)
+        similarities = vectors[1:] @ vectors[0]
+        reference = float(similarities[0])
+        best = float(np.max(similarities))
+
+        if reference >= self.accept_threshold and self._may_accept(question, user_answer):
+            self._count("accepted")
+            return self._result(
+                question, True, min(100, round(reference * 100)),
+                "回答正确！与参考答案基本一致。", [], reference
+            )
+        if best < self.reject_threshold:
+            self._count("rejected")
+            return self._result(
+                question, False, 0, "回答与题目要求无关。",
+                ["答案未涉及参考答案和评分要点"], 1.0 - best
+            )
+
+        self._count("escalated")
+        return None
+
+    def _may_accept(self, question: Question, user_answer: str) -> bool:
+        """相似度之外的判对条件：否定词数一致、命中全部评分要点"""
+        if negation_count(user_answer) != negation_count(question.correct_answer):
+            return False
+        matcher = compile_rubric(question)
+        return matcher is None or matcher.match(user_answer).complete
+
+    def _count(self, outcome: str):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    @staticmethod
+    def _result(
+        question: Question,
+        is_correct: bool,
+        score: int,
+        feedback: str,
+        mistakes: List[str],
+        confidence: float
+    ) -> EvaluationResult:
+        return EvaluationResult(
+            is_correct=is_correct,
+            score=score,
+            feedback=feedback,
+            detailed_explanation=question.explanation,
+            suggested_improvement=(
+                "回答得很好！可以尝试挑战更高难度的题目。" if is_correct
+                else f"请对照参考答案复习：{question.correct_answer}"
+            ),
+            confidence_score=round(confidence, 2),
+            mistakes=mistakes
+        )
+
+    def stats(self) -> Dict:
+        total = self.accepted + self.rejected + self.escalated
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "escalated": self.escalated,
+            "escalation_rate": self.escalated / total if total else 0.0
+        }
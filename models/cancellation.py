@@ -0,0 +1,104 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+
+class OperationCancelled(Exception):
+    """操作被取消或超过会话时限"""
+
+
+class CancelToken:
+    """协作式取消令牌，可带会话截止时间
+
+    绑定到当前上下文后，LLMGateway在每次调用前检查令牌，
+    并把剩余时间作为调用时限；取消时主动关闭进行中的流式响应，中断HTTP读取。
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        """
+        Args:
+            deadline: 从现在起的时限（秒），None表示不限时
+        """
+        self.expires_at = time.monotonic() + deadline if deadline else None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._streams: List = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set() or self.expired
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的剩余秒数，不限时返回None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def limit(self, deadline: Optional[float]):
+        """把截止时间收紧到从现在起deadline秒以内（不会延长已有的截止时间）"""
+        if not deadline:
+            return
+        expires_at = time.monotonic() + deadline
+        with self._lock:
+            if self.expires_at is None or expires_at < self.expires_at:
+                self.expires_at = expires_at
+
+    def check(self):
+        """已取消或超时则抛出OperationCancelled"""
+        if self.cancelled:
+            raise OperationCancelled("deadline exceeded" if self.expired else "cancelled")
+
+    def cancel(self):
+        """取消并关闭全部进行中的流式响应"""
+        self._cancelled.set()
+        with self._lock:
+            streams, self._streams = self._streams, []
+        for stream in streams:
+            try:
+                stream.close()
+            except Exception:
+                pass  # 流可能已在读取线程中结束
+
+    def register(self, stream):
+        """登记进行中的流式响应；令牌已取消时立即关闭"""
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._streams.append(stream)
+                return
+        stream.close()
+
+    def unregister(self, stream):
+        with self._lock:
+            if stream in self._streams:
+                self._streams.remove(stream)
+
+    @contextmanager
+    def bind(self):
+        """在当前上下文（线程）中绑定令牌"""
+        reset = _current_token.set(self)
+        try:
+            yield self
+        finally:
+            _current_token.reset(reset)
+
+
+_current_token: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar(
+    "cancel_token", default=None
+)
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    return _current_token.get()
+
+
+def check_cancelled():
+    """当前上下文绑定的令牌已取消时抛出OperationCancelled"""
+    token = _current_token.get()
+    if token is not None:
+        token.check()
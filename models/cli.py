@@ -9,6 +9,7 @@ from rich.layout import Layout
 from rich.live import Live
 import questionary
 from models import Question, EvaluationResult
+from models.grading_pipeline import GradedAnswer, GradingPipeline
 
 class InteractiveCLI:
     """交互式命令行界面"""
@@ -43,7 +44,9 @@ class InteractiveCLI:
                 self.console.print("[red]无效选择，请重试[/red]")
     
     def _show_welcome(self):
-        """显示欢迎信息"""
+        """显示欢迎信息，同时在后台预热LLM连接"""
+        self.agent.warm_up_connections()
+        
         welcome_text = """
         LLMAgent 学习评估系统
         
@@ -89,6 +92,9 @@ class InteractiveCLI:
         # 配置评估参数
         config = self._configure_session()
         
+        # 记录会话开始时的LLM统计，用于会话结束时计算节省的提示词token
+        llm_stats_before = self.agent.get_llm_stats() if self.agent.config.DEBUG else None
+        
         # 处理学习资料
         self.console.print("[cyan]处理学习资料...[/cyan]")
         try:
@@ -117,46 +123,78 @@ class InteractiveCLI:
                 questions_list=questions
             )
         
+        # 后台评分模式：提交答案后直接进入下一题，评分和保存在后台完成
+        pipeline = GradingPipeline(self.agent, self.current_user) if self.agent.config.BACKGROUND_GRADING else None
         session_results = []
-        for i, question in enumerate(questions, 1):
-            self.console.clear()
-            self.console.print(f"\n[bold]题目 {i}/{len(questions)}[/bold]")
-            self.console.print(f"[dim]难度: {question.difficulty}[/dim]")
-            
-            # 显示题目
-            self._display_question(question)
-            
-            # 获取用户答案
-            user_answer = self._get_user_answer(question)
-            
-            # 评估答案
-            evaluation = self.agent.evaluate_answer(question, user_answer)
-            
-            # 显示结果
-            self._display_evaluation(question, user_answer, evaluation)
-            
-            # 保存结果
-            self.agent.save_performance(
-                self.current_user, 
-                question, 
-                evaluation, 
-                user_answer
-            )
-            
-            session_results.append({
-                "question": question.content,
-                "user_answer": user_answer,
-                "evaluation": evaluation,
-                "correct": evaluation.is_correct
-            })
-            
-            # 询问是否继续
-            if i < len(questions):
-                if not Confirm.ask("继续下一题？", default=True):
-                    break
+        graded = None
+        try:
+            for i, question in enumerate(questions, 1):
+                self.console.clear()
+                if pipeline is not None:
+                    self._show_background_results(pipeline.take_completed())
+                self.console.print(f"\n[bold]题目 {i}/{len(questions)}[/bold]")
+                self.console.print(f"[dim]难度: {question.difficulty}[/dim]")
+                
+                # 显示题目
+                self._display_question(question)
+                
+                # 获取用户答案
+                user_answer = self._get_user_answer(question)
+                
+                # 简答题先即时展示评分要点的命中情况，再等待完整评估
+                if question.question_type == "short_answer":
+                    self._show_rubric_preview(question, user_answer)
+                
+                if pipeline is not None:
+                    pipeline.submit(i, question, user_answer)
+                    self.console.print("[dim]答案已提交，评分结果稍后显示[/dim]")
+                else:
+                    # 评估答案（流式模式下简答题的得分和反馈先行显示）
+                    streamed = {}
+                    on_field = None
+                    if self.agent.config.ENABLE_STREAM and question.question_type == "short_answer":
+                        on_field = lambda field, value: self._show_streamed_field(field, value, streamed)
+                    evaluation = self.agent.evaluate_answer(
+                        question, user_answer, user_id=self.current_user, on_field=on_field
+                    )
+                    
+                    # 显示结果
+                    self._display_evaluation(question, user_answer, evaluation, streamed)
+                    
+                    # 保存结果
+                    self.agent.save_performance(
+                        self.current_user, 
+                        question, 
+                        evaluation, 
+                        user_answer
+                    )
+                    
+                    session_results.append({
+                        "question": question.content,
+                        "user_answer": user_answer,
+                        "evaluation": evaluation,
+                        "correct": evaluation.is_correct
+                    })
+                
+                # 询问是否继续
+                if i < len(questions):
+                    if not Confirm.ask("继续下一题？", default=True):
+                        break
+        finally:
+            # 退出会话（包括中断）前等待全部评分和写入完成
+            if pipeline is not None:
+                self.console.print("[cyan]等待评分完成...[/cyan]")
+                graded = pipeline.close()
+        
+        if graded is not None:
+            self._show_background_results(pipeline.take_completed())
+            session_results = self._reconcile_results(graded)
         
         # 显示会话总结
-        self._show_session_summary(session_results)
+        if session_results:
+            self._show_session_summary(session_results)
+        if llm_stats_before is not None:
+            self._show_prompt_savings(llm_stats_before, self.agent.get_llm_stats())
     
     def _display_question(self, question: Question):
         """显示题目"""
@@ -201,16 +239,83 @@ class InteractiveCLI:
                 self.console.print("[red]警告：您没有输入任何内容！[/red]")
             return answer
     
-    def _display_evaluation(self, question: Question, user_answer: str, evaluation: EvaluationResult):
-        """显示评估结果"""
-        self.console.print("\n" + "="*50)
-        
-        if evaluation.is_correct:
+    def _show_background_results(self, completed: List[GradedAnswer]):
+        """显示后台评分完成的结果（含正确答案和解析）"""
+        for answer in completed:
+            if answer.evaluation is None:
+                self.console.print(f"[red]第 {answer.index} 题评分失败: {answer.error}[/red]")
+                continue
+            self.console.print(f"\n[bold]第 {answer.index} 题：[/bold]{answer.question.content}")
+            if answer.evaluation.feedback:
+                self.console.print(answer.evaluation.feedback)
+            self._display_evaluation(answer.question, answer.user_answer, answer.evaluation)
+    
+    def _reconcile_results(self, graded: List[GradedAnswer]) -> List[Dict]:
+        """会话结束时汇总后台评分结果，报告评分或保存失败的题目"""
+        results = []
+        for answer in graded:
+            if answer.evaluation is None:
+                continue
+            if not answer.saved:
+                self.console.print(f"[yellow]第 {answer.index} 题的答题记录保存失败: {answer.error}[/yellow]")
+            results.append({
+                "question": answer.question.content,
+                "user_answer": answer.user_answer,
+                "evaluation": answer.evaluation,
+                "correct": answer.evaluation.is_correct
+            })
+        return results
+    
+    def _show_rubric_preview(self, question: Question, user_answer: str):
+        """显示按评分要点关键词即时匹配的预估得分"""
+        match = self.agent.preview_answer(question, user_answer)
+        if match is None:
+            return
+        total = len(match.hit) + len(match.missed)
+        self.console.print(f"[dim]要点命中 {len(match.hit)}/{total}，预估得分 {match.score:.0f}[/dim]")
+        for point in match.missed:
+            self.console.print(f"[dim]  未答到：{point}[/dim]")
+    
+    def _show_streamed_field(self, field: str, value, shown: Dict):
+        """流式评估时显示先到达的判定、得分和总体反馈"""
+        if field not in ("is_correct", "score", "feedback"):
+            return
+        if not shown:
+            self.console.print("\n" + "="*50)
+        shown[field] = value
+        if field == "is_correct":
+            self._print_verdict(bool(value))
+        elif field == "score":
+            self.console.print(f"[bold]得分: {value}/100[/bold]")
+        else:
+            self.console.print(f"\n{value}")
+    
+    def _print_verdict(self, is_correct: bool):
+        if is_correct:
             self.console.print("[bold green]✓ 回答正确！[/bold green]")
         else:
             self.console.print("[bold red]✗ 回答错误[/bold red]")
+    
+    def _display_evaluation(
+        self,
+        question: Question,
+        user_answer: str,
+        evaluation: EvaluationResult,
+        streamed: Optional[Dict] = None
+    ):
+        """显示评估结果（streamed为流式评估时已显示的字段，与最终结果一致的不再重复显示）"""
+        streamed = streamed or {}
+        consistent = (
+            streamed.get("is_correct", evaluation.is_correct) == evaluation.is_correct
+            and streamed.get("score", evaluation.score) == evaluation.score
+        )
+        if not streamed or not consistent:
+            self.console.print("\n" + "="*50)
         
-        self.console.print(f"[bold]得分: {evaluation.score}/100[/bold]")
+        if not consistent or "is_correct" not in streamed:
+            self._print_verdict(evaluation.is_correct)
+        if not consistent or "score" not in streamed:
+            self.console.print(f"[bold]得分: {evaluation.score}/100[/bold]")
         
         if not evaluation.is_correct:
             self.console.print(f"\n[bold]你的答案:[/bold] {user_answer[:100]}...")
@@ -253,6 +358,40 @@ class InteractiveCLI:
         else:
             self.console.print("\n[bold blue]建议：[/bold blue]优秀！可以开始学习新内容")
     
+    def _show_prompt_savings(self, before: Dict, after: Dict):
+        """显示本次会话节省的提示词token（调试模式）"""
+        trimmed = after["prompt_tokens_trimmed"] - before["prompt_tokens_trimmed"]
+        cached = after["cached_prompt_tokens"] - before["cached_prompt_tokens"]
+        total = after["prompt_tokens"] - before["prompt_tokens"]
+        
+        self.console.print(
+            f"[dim]提示词token：共 {total}，前缀缓存命中 {cached}，"
+            f"空白压缩节省约 {trimmed}[/dim]"
+        )
+        for route in after.get("routes", []):
+            self.console.print(
+                f"[dim]  {route['route']} → {route['model']}：{route['calls']} 次，"
+                f"平均 {route['avg_latency']:.2f}s，"
+                f"平均token {route['avg_prompt_tokens']:.0f}/{route['avg_completion_tokens']:.0f}[/dim]"
+            )
+        for cache in after.get("semantic_cache", []):
+            self.console.print(
+                f"[dim]  语义缓存 {cache['name']}：命中 {cache['hits']}/{cache['lookups']}"
+                f"（{cache['hit_rate']:.0%}）[/dim]"
+            )
+        evaluation_cache = after.get("evaluation_cache")
+        if evaluation_cache:
+            self.console.print(
+                f"[dim]  评分缓存：命中 {evaluation_cache['hits']}/{evaluation_cache['lookups']}"
+                f"（{evaluation_cache['hit_rate']:.0%}）[/dim]"
+            )
+        pregrader = after.get("pregrader")
+        if pregrader:
+            self.console.print(
+                f"[dim]  简答题预评分：本地判对 {pregrader['accepted']}，本地判错 {pregrader['rejected']}，"
+                f"交给LLM {pregrader['escalated']}（{pregrader['escalation_rate']:.0%}）[/dim]"
+            )
+
     def _review_wrong_questions(self):
         """复习错题本"""
         if not self.current_user:
@@ -445,10 +584,12 @@ class InteractiveCLI:
             chunks,
             num_questions=num_questions,
             question_types=question_types,
-            difficulty_mix=difficulty_mix
+            difficulty_mix=difficulty_mix,
+            user_id=self.current_user
         )
         
         questions_list.extend(questions)
+        self._show_shortfall(len(questions), num_questions)
     
     def _generate_questions_with_stream(
         self,
@@ -477,6 +618,11 @@ class InteractiveCLI:
             self.console.print(f"[bold green]✓ 题目 {question.question_id} 已生成[/bold green]")
             questions_list.append(question)
         
+        def on_question_skipped(current, total):
+            """题目因重复或无法生成而跳过时的回调"""
+            self.console.print()
+            self.console.print(f"[yellow]题目 {current}/{total} 重复或无法生成，已跳过[/yellow]")
+        
         # 调用agent的流式生成方法
         self.agent.generate_questions_stream(
             chunks,
@@ -485,8 +631,16 @@ class InteractiveCLI:
             difficulty_mix=difficulty_mix,
             on_question_start=on_question_start,
             on_question_chunk=on_question_chunk,
-            on_question_complete=on_question_complete
+            on_question_complete=on_question_complete,
+            user_id=self.current_user,
+            on_question_skipped=on_question_skipped
         )
+        self._show_shortfall(len(questions_list), num_questions)
+    
+    def _show_shortfall(self, generated: int, requested: int):
+        """实际出题数少于要求时提示用户"""
+        if generated < requested:
+            self.console.print(f"[yellow]本次共生成 {generated}/{requested} 道题目，其余题目重复或生成失败[/yellow]")
     
     def _get_sample_material(self) -> str:
         """获取示例学习资料"""
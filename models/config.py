@@ -13,6 +13,18 @@ class Config:
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "deepseek-ai/DeepSeek-V3.2")
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "Qwen/Qwen3-Embedding-8B")
     
+    # 模型路由：简单任务使用小模型，缺省时全部使用OPENAI_MODEL
+    # MODEL_ROUTES覆盖默认策略，格式"task:question_type:difficulty=model;..."，
+    # model可写small/large或具体模型名，例如"generate:short_answer:easy=small"
+    OPENAI_SMALL_MODEL: str = os.getenv("OPENAI_SMALL_MODEL", "")
+    MODEL_ROUTES: str = os.getenv("MODEL_ROUTES", "")
+    
+    # 多端点负载均衡：逗号分隔的base URL，API key按顺序对应，缺省时共用OPENAI_API_KEY
+    OPENAI_BASE_URLS: str = os.getenv("OPENAI_BASE_URLS", "")
+    OPENAI_API_KEYS: str = os.getenv("OPENAI_API_KEYS", "")
+    LLM_ENDPOINT_EJECT_SECONDS: float = float(os.getenv("LLM_ENDPOINT_EJECT_SECONDS", "30"))
+    LLM_ENDPOINT_RECOVERY_SECONDS: float = float(os.getenv("LLM_ENDPOINT_RECOVERY_SECONDS", "60"))
+    
     # MongoDB配置
     MONGO_URI: str = os.getenv("MONGO_URI", "mongodb://localhost:27017")
     MONGO_DB: str = "learning_agent"
@@ -25,10 +37,78 @@ class Config:
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
     ENABLE_STREAM: bool = os.getenv("ENABLE_STREAM", "True").lower() == "true"
     
+    # 各题型生成的输出token上限（紧凑输出格式下足够容纳一道题）
+    MAX_TOKENS_MULTIPLE_CHOICE: int = int(os.getenv("MAX_TOKENS_MULTIPLE_CHOICE", "400"))
+    # 简答题还要输出评分要点的关键词和同义词（"k"，约3组×2-3个词，紧凑JSON下约150 token）
+    MAX_TOKENS_SHORT_ANSWER: int = int(os.getenv("MAX_TOKENS_SHORT_ANSWER", "600"))
+    MAX_TOKENS_TRUE_FALSE: int = int(os.getenv("MAX_TOKENS_TRUE_FALSE", "200"))
+    MAX_TOKENS_EXPLANATION: int = int(os.getenv("MAX_TOKENS_EXPLANATION", "300"))
+    
+    # 两阶段生成：先只生成题干、选项和答案，解析在用户答题时后台生成或按需生成
+    LAZY_EXPLANATIONS: bool = os.getenv("LAZY_EXPLANATIONS", "False").lower() == "true"
+    
+    # 后台评分：CLI中提交答案后直接进入下一题，评分和保存在后台完成，会话结束时汇总
+    BACKGROUND_GRADING: bool = os.getenv("BACKGROUND_GRADING", "False").lower() == "true"
+    
+    # 第一题由本地规则（填空/真假题）即时生成，其余题目仍由LLM生成
+    INSTANT_FIRST_QUESTION: bool = os.getenv("INSTANT_FIRST_QUESTION", "False").lower() == "true"
+    
+    # 共享题目池：同一资料（按内容哈希）生成的题目供其他用户抽取，每个用户不重复
+    SHARED_QUESTION_POOL: bool = os.getenv("SHARED_QUESTION_POOL", "False").lower() == "true"
+    
+    # 语义缓存：近似相同的资料复用概念提取结果，同一题目下近似相同的答案复用评分
+    # 使用EMBEDDING_MODEL（见OpenAI配置）；设为空时使用本地字符n-gram哈希向量
+    SEMANTIC_CACHE: bool = os.getenv("SEMANTIC_CACHE", "False").lower() == "true"
+    SEMANTIC_CACHE_CONCEPT_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_CONCEPT_THRESHOLD", "0.95"))
+    SEMANTIC_CACHE_GRADING_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_GRADING_THRESHOLD", "0.97"))
+    
+    # 评分缓存：同一题目的相同答案（忽略空白、标点和全半角差异）直接复用已有评分
+    EVALUATION_CACHE: bool = os.getenv("EVALUATION_CACHE", "False").lower() == "true"
+    
+    # 简答题答案命中全部评分要点关键词时直接判对，不调用LLM评分
+    RUBRIC_LOCAL_ACCEPT: bool = os.getenv("RUBRIC_LOCAL_ACCEPT", "False").lower() == "true"
+    
+    # 简答题预评分：与参考答案的相似度足够高直接判对、与参考答案和评分要点都不相关直接判错，
+    # 只有中间区间调用LLM评分。相似度判断需要语义embedding（EMBEDDING_MODEL），
+    # 使用本地哈希向量时只在本地判空白答案
+    SHORT_ANSWER_PREGRADE: bool = os.getenv("SHORT_ANSWER_PREGRADE", "False").lower() == "true"
+    PREGRADE_ACCEPT_THRESHOLD: float = float(os.getenv("PREGRADE_ACCEPT_THRESHOLD", "0.9"))
+    PREGRADE_REJECT_THRESHOLD: float = float(os.getenv("PREGRADE_REJECT_THRESHOLD", "0.2"))
+    
+    # 自洽评分：简答题并发采样多次LLM评分，过半样本的判定和分数段一致即提前结束，
+    # 置信度取一致样本的比例；1为关闭（单次评分）
+    GRADING_SAMPLES: int = int(os.getenv("GRADING_SAMPLES", "1"))
+    
     # 评估参数
     MAX_QUESTIONS_PER_SESSION: int = 10
     RETRY_LIMIT: int = 3
     
+    # LLM调用重试与对冲配置
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))  # 秒
+    LLM_RETRY_MAX_DELAY: float = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))  # 秒
+    LLM_CALL_DEADLINE: float = float(os.getenv("LLM_CALL_DEADLINE", "90"))  # 秒，含排队和重试
+    # 对冲请求比例上限，0为关闭。只作用于非流式调用：流式调用（包括ENABLE_STREAM开启时的
+    # 题目生成）不对冲，需要降低题目生成的尾延迟时应同时关闭ENABLE_STREAM
+    LLM_HEDGE_MAX_RATIO: float = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0"))
+    
+    # 合并进行中的相同请求（如多个用户同时打开同一份资料时的概念提取）
+    # 只作用于temperature不超过阈值的非流式调用
+    LLM_SINGLE_FLIGHT: bool = os.getenv("LLM_SINGLE_FLIGHT", "True").lower() == "true"
+    LLM_SINGLE_FLIGHT_MAX_TEMPERATURE: float = float(os.getenv("LLM_SINGLE_FLIGHT_MAX_TEMPERATURE", "0.3"))
+    
+    # LLM客户端限流配置（令牌桶 + AIMD并发窗口），配置了多个端点时按每个端点分别生效
+    LLM_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "100000"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    LLM_LATENCY_TARGET: float = float(os.getenv("LLM_LATENCY_TARGET", "15"))  # 秒
+    
+    # HTTP连接池配置（所有组件共享一个OpenAI客户端）
+    LLM_POOL_MAX_CONNECTIONS: int = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+    LLM_POOL_MAX_KEEPALIVE: int = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10"))
+    LLM_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))  # 秒
+    LLM_REQUEST_TIMEOUT: float = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))  # 秒
+    LLM_WARMUP_CONNECTIONS: int = int(os.getenv("LLM_WARMUP_CONNECTIONS", "2"))
+    
     # 提示词模板路径
     PROMPT_TEMPLATES_DIR: str = "prompt_templates"
     
@@ -0,0 +1,133 @@
+import random
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from models import Chunk
+from models.question_dedup import material_hash
+
+# 出错分块的额外权重：未覆盖的分块权重为1，已覆盖但答错的分块仍可能被再次选中
+WEAK_WEIGHT = 0.6
+
+
+class ChunkCoverage:
+    """一个用户在一份资料上的分块覆盖状态
+
+    covered、weak均为整数位集，第i位对应第i个分块：
+    - covered: 本轮已出过题的分块，全部覆盖后开始新一轮
+    - weak: 最近一次作答错误的分块
+    """
+
+    def __init__(self, num_chunks: int, covered: int = 0, weak: int = 0):
+        self.num_chunks = num_chunks
+        self.full_mask = (1 << num_chunks) - 1
+        self.covered = covered & self.full_mask
+        self.weak = weak & self.full_mask
+
+    @property
+    def coverage_ratio(self) -> float:
+        if self.num_chunks == 0:
+            return 0.0
+        return bin(self.covered).count("1") / self.num_chunks
+
+    def select(self, k: int, rng: random.Random) -> List[int]:
+        """选择k个分块：优先未覆盖的分块，其次是答错过的分块"""
+        if self.covered == self.full_mask:
+            self.covered = 0  # 全部覆盖后开始新一轮
+
+        def score(i: int) -> float:
+            bit = 1 << i
+            new = 0.0 if self.covered & bit else 1.0
+            weak = WEAK_WEIGHT if self.weak & bit else 0.0
+            return new + weak + rng.random() * 1e-3  # 同分时随机打散
+
+        selected = sorted(range(self.num_chunks), key=score, reverse=True)[:k]
+        for i in selected:
+            self.covered |= 1 << i
+        return sorted(selected)
+
+    def record_result(self, indices: List[int], is_correct: bool):
+        """答错的分块标记为薄弱，答对则清除标记"""
+        mask = 0
+        for i in indices:
+            if 0 <= i < self.num_chunks:
+                mask |= 1 << i
+        if is_correct:
+            self.weak &= ~mask
+        else:
+            self.weak |= mask
+
+    def to_document(self) -> Dict:
+        """持久化格式：位集以十六进制字符串存储"""
+        return {
+            "num_chunks": self.num_chunks,
+            "covered": format(self.covered, "x"),
+            "weak": format(self.weak, "x")
+        }
+
+    @classmethod
+    def from_document(cls, num_chunks: int, document: Optional[Dict]) -> "ChunkCoverage":
+        if not document or document.get("num_chunks") != num_chunks:
+            return cls(num_chunks)
+        return cls(num_chunks, int(document["covered"], 16), int(document["weak"], 16))
+
+
+class CoverageScheduler:
+    """按用户和资料跟踪分块覆盖情况，为出题选择分块
+
+    替代随机抽样：每次选择新覆盖最多的分块，并按答错情况加权，
+    让用户用更少的会话覆盖整份资料。覆盖状态为几十字节的位集，
+    每次变化时写入store（MongoDB chunk_coverage集合）。
+    """
+
+    def __init__(self, store=None, rng: Optional[random.Random] = None):
+        self.store = store
+        self.rng = rng or random.Random()
+        self._coverage: Dict[Tuple[str, str], ChunkCoverage] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, user_id: str, material: str, num_chunks: int) -> ChunkCoverage:
+        key = (user_id, material)
+        coverage = self._coverage.get(key)
+        if coverage is None or coverage.num_chunks != num_chunks:
+            document = None
+            if self.store is not None:
+                try:
+                    document = self.store.load_chunk_coverage(user_id, material)
+                except Exception as e:
+                    print(f"Failed to load chunk coverage: {e}")
+            coverage = ChunkCoverage.from_document(num_chunks, document)
+            self._coverage[key] = coverage
+        return coverage
+
+    def _save(self, user_id: str, material: str, coverage: ChunkCoverage):
+        if self.store is None:
+            return
+        try:
+            self.store.save_chunk_coverage(user_id, material, coverage.to_document())
+        except Exception as e:
+            # 覆盖状态写入失败只影响跨进程的分块选择，不影响出题
+            print(f"Failed to save chunk coverage: {e}")
+
+    def select_chunks(self, user_id: str, chunks: List[Chunk], k: int) -> List[Chunk]:
+        """为一道题选择k个分块，并标记为已覆盖"""
+        material = material_hash(chunks)
+        with self._lock:
+            coverage = self._get(user_id, material, len(chunks))
+            indices = coverage.select(k, self.rng)
+        self._save(user_id, material, coverage)
+        return [chunks[i] for i in indices]
+
+    def selector(self, user_id: str, chunks: List[Chunk]) -> Callable[[List[Chunk], int], List[Chunk]]:
+        """绑定用户的分块选择函数，供QuestionGenerator使用"""
+        return lambda candidates, k: self.select_chunks(user_id, candidates, k)
+
+    def record_result(self, user_id: str, material: str, num_chunks: int, indices: List[int], is_correct: bool):
+        """根据作答结果更新分块的薄弱标记"""
+        with self._lock:
+            coverage = self._get(user_id, material, num_chunks)
+            coverage.record_result(indices, is_correct)
+        self._save(user_id, material, coverage)
+
+    def coverage_ratio(self, user_id: str, chunks: List[Chunk]) -> float:
+        """用户在本轮对资料分块的覆盖率"""
+        with self._lock:
+            return self._get(user_id, material_hash(chunks), len(chunks)).coverage_ratio
@@ -3,18 +3,25 @@ import json
 from typing import List, Dict, Any
 from pypdf import PdfReader
 from openai import OpenAI
+from models.llm_gateway import LLMGateway
+from models.prompt_templates import load_prompt_templates
 import tiktoken
 from models import Chunk
 
 class DataProcessor:
     """处理各种输入格式的学习资料"""
     
-    def __init__(self, config):
+    def __init__(self, config, llm=None, prompts=None, concept_cache=None):
         self.config = config
-        self.client = OpenAI(
+        self.prompts = prompts or load_prompt_templates()
+        # 可选：语义缓存，近似相同的资料（如修订版讲义）复用已提取的概念
+        self.concept_cache = concept_cache
+        # 优先使用LLMAgent注入的共享网关（共享客户端、限流和重试策略）
+        self.llm = llm or LLMGateway(config, OpenAI(
             api_key=config.OPENAI_API_KEY,
             base_url=config.OPENAI_BASE_URL
-        )
+        ))
+        self.client = self.llm.client
         self.tokenizer = tiktoken.get_encoding("cl100k_base")
     
     def process_input(self, input_data: str, input_type: str = "text") -> List[Chunk]:
@@ -96,21 +103,24 @@ class DataProcessor:
         """提取核心概念"""
         combined_text = "\n".join([chunk.text for chunk in chunks[:10]])  # 只取部分
         
-        prompt = f"""请从以下学习资料中提取核心概念和知识点：
-        
-        {combined_text}
+        vector = None
+        if self.concept_cache is not None:
+            vector = self.concept_cache.embed(combined_text)
+            cached = self.concept_cache.get(combined_text, vector=vector)
+            if cached is not None:
+                return cached
         
-        请以JSON格式返回，包含以下字段：
-        - concepts: 核心概念列表
-        - key_points: 关键知识点列表
-        - difficulty_level: 整体难度评估（easy/medium/hard）
-        """
+        messages = self.prompts.render_messages("key_concepts", content=combined_text)
         
-        response = self.client.chat.completions.create(
+        response = self.llm.chat(
             model=self.config.OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
+            route=("extract_concepts", "*", "*"),
+            messages=messages,
             temperature=0.3,
             response_format={"type": "json_object"}
         )
         
-        return json.loads(response.choices[0].message.content)
\ No newline at end of file
+        concepts = json.loads(response.choices[0].message.content)
+        if self.concept_cache is not None:
+            self.concept_cache.put(combined_text, concepts, vector=vector)
+        return concepts
\ No newline at end of file
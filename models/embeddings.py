@@ -0,0 +1,56 @@
+import hashlib
+from typing import List
+import numpy as np
+from models.question_dedup import normalize_text
+
+
+class HashingEmbedder:
+    """本地字符n-gram哈希向量（特征哈希），无需网络调用
+
+    对近似相同的文本（修订版讲义、措辞略有不同的答案）给出接近1的余弦相似度，
+    但不理解语义，同义改写的相似度偏低，否定改写（"是"/"不是"）的相似度仍接近1。
+    """
+
+    semantic = False  # 相似度不代表语义相同，不能用于复用评分
+
+    def __init__(self, dim: int = 512, ngrams=(1, 2, 3)):
+        self.dim = dim
+        self.ngrams = ngrams
+
+    def _bucket(self, gram: str) -> int:
+        digest = hashlib.blake2b(gram.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """返回L2归一化的向量矩阵，每行对应一个文本"""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            text = normalize_text(text)
+            for n in self.ngrams:
+                for i in range(len(text) - n + 1):
+                    vectors[row, self._bucket(text[i:i + n])] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+
+class GatewayEmbedder:
+    """通过LLMGateway调用embeddings接口（共享限流和重试）"""
+
+    semantic = True
+
+    def __init__(self, llm, model: str):
+        self.llm = llm
+        self.model = model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.llm.embed(texts, model=self.model), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def create_embedder(config, llm=None):
+    """配置了EMBEDDING_MODEL时使用远程embedding，否则使用本地哈希向量"""
+    model = config.EMBEDDING_MODEL
+    if isinstance(model, str) and model and llm is not None:
+        return GatewayEmbedder(llm, model)
+    return HashingEmbedder()
@@ -0,0 +1,166 @@
+import time
+import threading
+from typing import List, Optional
+
+
+class Endpoint:
+    """一个OpenAI兼容端点及其近期健康状况"""
+
+    def __init__(self, base_url: str, client, limiter=None):
+        self.base_url = base_url
+        self.client = client
+        self.limiter = limiter  # 端点自己的限流器（配额和AIMD并发窗口），None时使用网关的共享限流器
+        self.latency_ewma: Optional[float] = None  # 近期延迟（秒）
+        self.error_ewma = 0.0                      # 近期错误率
+        self.consecutive_failures = 0
+        self.in_flight = 0
+        self.ejected_until = 0.0
+        self.recovering_since: Optional[float] = None
+        self.ejection_count = 0
+
+    def is_ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+
+class EndpointPool:
+    """多端点负载均衡：按近期延迟和错误率路由
+
+    - 被动健康检查：连续失败或错误率过高的端点被摘除一段时间
+    - 慢恢复：摘除期满后流量权重在recovery_time内线性回升
+    """
+
+    EWMA_ALPHA = 0.3
+    MAX_CONSECUTIVE_FAILURES = 3
+    MAX_ERROR_RATE = 0.5
+    MIN_RECOVERY_WEIGHT = 0.05
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        eject_seconds: float = 30.0,
+        recovery_seconds: float = 60.0
+    ):
+        if not endpoints:
+            raise ValueError("EndpointPool requires at least one endpoint")
+        self.endpoints = endpoints
+        self.eject_seconds = eject_seconds
+        self.recovery_seconds = recovery_seconds
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, client_factory, limiter_factory=None) -> Optional["EndpointPool"]:
+        """根据OPENAI_BASE_URLS创建端点池，未配置多个端点时返回None
+
+        Args:
+            client_factory: (config, base_url, api_key) -> OpenAI客户端
+            limiter_factory: () -> 限流器，为每个端点各创建一个
+        """
+        base_urls = [u.strip() for u in config.OPENAI_BASE_URLS.split(",") if u.strip()]
+        if len(base_urls) < 2:
+            return None
+
+        api_keys = [k.strip() for k in config.OPENAI_API_KEYS.split(",") if k.strip()]
+        endpoints = []
+        for i, base_url in enumerate(base_urls):
+            api_key = api_keys[i] if i < len(api_keys) else config.OPENAI_API_KEY
+            endpoints.append(Endpoint(
+                base_url,
+                client_factory(config, base_url, api_key),
+                limiter=limiter_factory() if limiter_factory else None
+            ))
+
+        return cls(
+            endpoints,
+            eject_seconds=config.LLM_ENDPOINT_EJECT_SECONDS,
+            recovery_seconds=config.LLM_ENDPOINT_RECOVERY_SECONDS
+        )
+
+    @property
+    def clients(self) -> List:
+        return [endpoint.client for endpoint in self.endpoints]
+
+    def acquire(self) -> Endpoint:
+        """选择当前得分最优的端点"""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [e for e in self.endpoints if not e.is_ejected(now)]
+            if not candidates:
+                # 全部被摘除时选择最早恢复的端点，保证不中断服务
+                candidates = [min(self.endpoints, key=lambda e: e.ejected_until)]
+
+            endpoint = min(candidates, key=lambda e: self._score(e, now))
+            endpoint.in_flight += 1
+            return endpoint
+
+    def abandon(self, endpoint: Endpoint):
+        """未发出请求（如限流排队超时）时归还端点，不计入健康状况"""
+        with self._lock:
+            endpoint.in_flight = max(0, endpoint.in_flight - 1)
+
+    def release(self, endpoint: Endpoint, latency: Optional[float] = None, success: bool = True):
+        """上报调用结果，更新端点健康状况"""
+        with self._lock:
+            endpoint.in_flight = max(0, endpoint.in_flight - 1)
+            alpha = self.EWMA_ALPHA
+            endpoint.error_ewma = (1 - alpha) * endpoint.error_ewma + alpha * (0.0 if success else 1.0)
+
+            if success:
+                endpoint.consecutive_failures = 0
+                if latency is not None:
+                    endpoint.latency_ewma = latency if endpoint.latency_ewma is None else (
+                        (1 - alpha) * endpoint.latency_ewma + alpha * latency
+                    )
+                return
+
+            endpoint.consecutive_failures += 1
+            if (endpoint.consecutive_failures >= self.MAX_CONSECUTIVE_FAILURES
+                    or endpoint.error_ewma > self.MAX_ERROR_RATE):
+                self._eject(endpoint, time.monotonic())
+
+    def _eject(self, endpoint: Endpoint, now: float):
+        # 反复被摘除的端点摘除时间加倍，最多8倍
+        endpoint.ejection_count += 1
+        duration = self.eject_seconds * min(8, 2 ** (endpoint.ejection_count - 1))
+        endpoint.ejected_until = now + duration
+        endpoint.recovering_since = endpoint.ejected_until
+        endpoint.consecutive_failures = 0
+        # 恢复后以中等错误率重新开始，避免一次失败立即再次摘除
+        endpoint.error_ewma = self.MAX_ERROR_RATE / 2
+
+    def _weight(self, endpoint: Endpoint, now: float) -> float:
+        """慢恢复权重：刚恢复的端点只分到少量流量"""
+        if endpoint.recovering_since is None:
+            return 1.0
+        elapsed = now - endpoint.recovering_since
+        if elapsed >= self.recovery_seconds:
+            endpoint.recovering_since = None
+            endpoint.ejection_count = 0
+            return 1.0
+        return max(self.MIN_RECOVERY_WEIGHT, elapsed / self.recovery_seconds)
+
+    def _score(self, endpoint: Endpoint, now: float) -> float:
+        """得分越低越优先：延迟 × 排队 × 错误惩罚 / 恢复权重"""
+        # 没有延迟样本的端点按0处理，优先探测
+        latency = endpoint.latency_ewma or 0.0
+        return (
+            (latency + 0.01) * (1 + endpoint.in_flight)
+            * (1 + 4 * endpoint.error_ewma)
+            / self._weight(endpoint, now)
+        )
+
+    def stats(self) -> List[dict]:
+        """各端点状态"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "base_url": e.base_url,
+                    "latency_ewma": e.latency_ewma,
+                    "error_rate": round(e.error_ewma, 3),
+                    "in_flight": e.in_flight,
+                    "ejected": e.is_ejected(now),
+                    "weight": round(self._weight(e, now), 2),
+                    "concurrency_limit": round(e.limiter.concurrency_limit, 2) if e.limiter else None
+                }
+                for e in self.endpoints
+            ]
@@ -0,0 +1,97 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Dict, Optional
+from models import Question, EvaluationResult
+
+_WHITESPACE = re.compile(r"\s+")
+# 只去掉首尾的句末标点；开头的"."可能是数字的一部分（".5"）
+_LEADING_PUNCT = "。！!？?，,"
+_TRAILING_PUNCT = "。.！!？?，,"
+
+
+def normalize_answer(user_answer: str) -> str:
+    """评分缓存键的规范化：全角转半角、合并空白、去掉首尾的句末标点
+
+    比题目去重的normalize_text窄得多：正负号、小数点、比较符号等都会改变答案的含义，
+    必须保留（"-5"与"5"、"x>y"与"x<y"不能共用评分）。
+    """
+    text = unicodedata.normalize("NFKC", user_answer or "")
+    text = _WHITESPACE.sub(" ", text).strip()
+    text = text.rstrip(_TRAILING_PUNCT + " ").lstrip(_LEADING_PUNCT + " ")
+    return text
+
+
+def answer_hash(user_answer: str) -> str:
+    """规范化答案的SHA-256"""
+    return hashlib.sha256(normalize_answer(user_answer).encode()).hexdigest()
+
+
+class EvaluationCache:
+    """按(题目ID, 规范化答案)精确命中的评分缓存
+
+    同一题目的相同答案（如"过拟合"与" 过拟合。"）无论来自重试还是其他用户，
+    都直接返回已有的评分结果。持久化在MongoDB evaluation_cache集合，
+    进程内保留最近使用的结果，避免重复查询。
+    """
+
+    def __init__(self, store=None, max_local: int = 4096):
+        self.store = store
+        self.max_local = max_local
+        self._local: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+    def get(self, question: Question, user_answer: str) -> Optional[EvaluationResult]:
+        key = (question.question_id, answer_hash(user_answer))
+        with self._lock:
+            self.lookups += 1
+            document = self._local.get(key)
+            if document is not None:
+                self._local.move_to_end(key)
+                self.hits += 1
+                return EvaluationResult(**document)
+
+        if self.store is None:
+            return None
+        try:
+            document = self.store.load_evaluation(*key)
+        except Exception as e:
+            print(f"Failed to load cached evaluation: {e}")
+            return None
+        if document is None:
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._remember(key, document)
+        return EvaluationResult(**document)
+
+    def put(self, question: Question, user_answer: str, result: EvaluationResult):
+        key = (question.question_id, answer_hash(user_answer))
+        document = asdict(result)
+        with self._lock:
+            self._remember(key, document)
+        if self.store is not None:
+            try:
+                self.store.save_evaluation(*key, document)
+            except Exception as e:
+                # 写入失败只影响跨进程复用
+                print(f"Failed to save evaluation to cache: {e}")
+
+    def _remember(self, key: tuple, document: Dict):
+        self._local[key] = document
+        self._local.move_to_end(key)
+        if len(self._local) > self.max_local:
+            self._local.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0
+        }
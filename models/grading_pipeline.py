@@ -0,0 +1,96 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+from models import Question, EvaluationResult
+
+
+@dataclass
+class GradedAnswer:
+    index: int  # 题目序号（从1开始）
+    question: Question
+    user_answer: str
+    evaluation: Optional[EvaluationResult] = None
+    error: Optional[Exception] = None  # 评分失败的原因
+    saved: bool = False
+
+
+class GradingPipeline:
+    """后台评分与持久化流水线
+
+    答案提交后立即返回，用户可以直接进入下一题：评分在线程池中并发执行，
+    评分完成的结果交给单线程写入队列，按评分完成的顺序逐条持久化（写入失败时退避重试）。
+    close()等待全部评分和写入完成，退出会话时不丢失写入。
+    """
+
+    WRITE_ATTEMPTS = 3
+    WRITE_RETRY_DELAY = 0.5  # 秒，按尝试次数线性增加
+
+    def __init__(self, agent, user_id: str, max_workers: int = 2):
+        self.agent = agent
+        self.user_id = user_id
+        self._graders = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cli-grade")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cli-persist")
+        self._lock = threading.Lock()
+        self._answers: List[GradedAnswer] = []
+        self._writes: List[Future] = []
+        self._completed: List[GradedAnswer] = []  # 已评分、尚未展示的结果
+
+    def submit(self, index: int, question: Question, user_answer: str) -> Future:
+        """提交评分和持久化，立即返回"""
+        answer = GradedAnswer(index, question, user_answer)
+        with self._lock:
+            self._answers.append(answer)
+        # 在线程池中保留调用方上下文（优先级类别、取消令牌）
+        future = self._graders.submit(contextvars.copy_context().run, self._grade, answer)
+        future.add_done_callback(lambda _: self._enqueue_write(answer))
+        return future
+
+    def _grade(self, answer: GradedAnswer):
+        try:
+            answer.evaluation = self.agent.evaluate_answer(
+                answer.question, answer.user_answer, user_id=self.user_id
+            )
+        except Exception as e:
+            answer.error = e
+        with self._lock:
+            self._completed.append(answer)
+
+    def _enqueue_write(self, answer: GradedAnswer):
+        if answer.evaluation is None:
+            return
+        with self._lock:
+            self._writes.append(self._writer.submit(self._save, answer))
+
+    def _save(self, answer: GradedAnswer):
+        for attempt in range(self.WRITE_ATTEMPTS):
+            try:
+                self.agent.save_performance(
+                    self.user_id, answer.question, answer.evaluation, answer.user_answer
+                )
+                answer.saved = True
+                return
+            except Exception as e:
+                if attempt == self.WRITE_ATTEMPTS - 1:
+                    answer.error = e
+                    return
+                time.sleep(self.WRITE_RETRY_DELAY * (attempt + 1))
+
+    def take_completed(self) -> List[GradedAnswer]:
+        """取出自上次调用以来评分完成的结果（按题目顺序）"""
+        with self._lock:
+            completed, self._completed = self._completed, []
+        return sorted(completed, key=lambda a: a.index)
+
+    def close(self) -> List[GradedAnswer]:
+        """等待全部评分和写入完成，返回按题目顺序排列的全部结果"""
+        self._graders.shutdown(wait=True)
+        # 评分线程全部结束后，写入任务已全部入队
+        with self._lock:
+            writes = list(self._writes)
+        for write in writes:
+            write.result()
+        self._writer.shutdown(wait=True)
+        return sorted(self._answers, key=lambda a: a.index)
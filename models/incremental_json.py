@@ -0,0 +1,68 @@
+import json
+from typing import Any, Dict
+
+
+class IncrementalJSONObject:
+    """流式JSON对象的增量解析器
+
+    按片段喂入模型输出，每当顶层对象的一个字段完整到达时即返回该字段，
+    不必等待整个对象结束。字段值按标准JSON解析，嵌套对象和数组整体返回。
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}  # 已完整解析的顶层字段
+        self._buffer = ""
+        self._pos = 0            # 下一个待扫描字符的位置
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._pair_start = None  # 当前顶层字段在缓冲区中的起始位置
+
+    def feed(self, text: str) -> Dict[str, Any]:
+        """喂入一段输出，返回本次新完成的顶层字段"""
+        self._buffer += text
+        completed = {}
+        for pos in range(self._pos, len(self._buffer)):
+            char = self._buffer[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._pair_start = pos + 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0 and self._pair_start is not None:
+                    # 顶层对象结束：最后一个字段完整到达
+                    completed.update(self._parse_pair(self._buffer[self._pair_start:pos]))
+                    self._pair_start = None
+            elif char == "," and self._depth == 1 and self._pair_start is not None:
+                # 顶层的","：前一个字段完整到达
+                completed.update(self._parse_pair(self._buffer[self._pair_start:pos]))
+                self._pair_start = pos + 1
+        self._pos = len(self._buffer)
+        return completed
+
+    def _parse_pair(self, text: str) -> Dict[str, Any]:
+        if not text.strip():
+            return {}
+        try:
+            pair = json.loads("{" + text + "}")
+        except ValueError:
+            return {}  # 格式错误的字段留给最终校验处理
+        self.fields.update(pair)
+        return pair
+
+    @property
+    def text(self) -> str:
+        """目前收到的全部输出"""
+        return self._buffer
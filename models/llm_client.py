@@ -0,0 +1,60 @@
+import threading
+from typing import Optional
+import httpx
+from openai import OpenAI, DefaultHttpxClient
+
+
+def create_openai_client(
+    config,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None
+) -> OpenAI:
+    """创建共享的OpenAI客户端，统一配置HTTP连接池和keep-alive
+
+    未指定base_url/api_key时使用OPENAI_BASE_URL/OPENAI_API_KEY。
+    """
+    http_client = DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=config.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=config.LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY
+        ),
+        timeout=config.LLM_REQUEST_TIMEOUT
+    )
+    return OpenAI(
+        api_key=api_key or config.OPENAI_API_KEY,
+        base_url=base_url or config.OPENAI_BASE_URL,
+        http_client=http_client,
+        # 重试由LLMGateway统一处理，避免SDK内部重试叠加
+        max_retries=0
+    )
+
+
+def warm_up_connections(client: OpenAI, num_connections: int = 2) -> Optional[threading.Thread]:
+    """后台预热连接：并发发起轻量请求，提前完成DNS解析和TLS握手
+
+    预热失败不影响正常使用，首次调用时会重新建立连接。
+    """
+    if num_connections <= 0:
+        return None
+
+    def _ping():
+        try:
+            client.with_options(max_retries=0, timeout=10).models.list()
+        except Exception:
+            pass
+
+    def _warm():
+        # 并发请求才能让连接池同时建立多条连接
+        workers = [
+            threading.Thread(target=_ping, daemon=True)
+            for _ in range(num_connections)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    thread = threading.Thread(target=_warm, name="llm-warmup", daemon=True)
+    thread.start()
+    return thread
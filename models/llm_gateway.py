@@ -0,0 +1,407 @@
+import contextvars
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, List, Optional
+from openai import RateLimitError
+from models.cancellation import check_cancelled, current_cancel_token
+from models.model_router import Route
+from models.retry_policy import LatencyTracker, RetryPolicy
+from models.single_flight import SingleFlight, request_key
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: Optional[int] = None) -> int:
+    """粗略估算一次调用的token用量（中文约每2字符1个token）"""
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+    return prompt_chars // 2 + (max_tokens or 1000)
+
+
+class _LimitedStream:
+    """包装流式响应，在流结束时回调（归还限流槽位、记录路由统计）"""
+
+    def __init__(self, stream, on_finish):
+        self._stream = stream
+        self._on_finish = on_finish
+        self._iterable = stream
+        self.usage = None  # 请求了include_usage时，最后一个数据块带有整次调用的用量
+        self._first_chunk_latency = None
+        self._created_at = time.monotonic()
+        self._finished = False
+
+    def __enter__(self):
+        if hasattr(self._stream, "__enter__"):
+            self._iterable = self._stream.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if hasattr(self._stream, "__exit__"):
+                return self._stream.__exit__(exc_type, exc, tb)
+            return False
+        finally:
+            self._finish(rate_limited=isinstance(exc, RateLimitError))
+
+    def __iter__(self):
+        for chunk in self._iterable:
+            if self._first_chunk_latency is None:
+                self._first_chunk_latency = time.monotonic() - self._created_at
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                self.usage = usage
+            yield chunk
+
+    def close(self):
+        if hasattr(self._stream, "close"):
+            self._stream.close()
+        self._finish()
+
+    def _finish(self, rate_limited: bool = False):
+        if self._finished:
+            return
+        self._finished = True
+        # 流式调用以首个数据块的延迟作为拥塞信号
+        self._on_finish(self._first_chunk_latency, rate_limited)
+
+
+class LLMGateway:
+    """所有OpenAI Chat调用的统一入口
+
+    负责限流、排队统计、带退避的重试、截止时间控制、多端点路由，
+    以及可选的对冲请求（首个请求超过p95延迟时再发一个副本，取先返回者）。
+    对冲只作用于非流式调用，流式响应一旦开始输出无法在两个副本之间切换。
+    """
+
+    HEDGE_PERCENTILE = 0.95
+
+    def __init__(
+        self,
+        config,
+        client,
+        limiter=None,
+        retry_policy=None,
+        hedge_ratio: float = 0.0,
+        endpoint_pool=None,
+        router=None,
+        single_flight: Optional[SingleFlight] = None,
+        coalesce_max_temperature: float = 0.3
+    ):
+        self.config = config
+        self.client = client
+        self.limiter = limiter
+        self.endpoint_pool = endpoint_pool  # 配置多个端点时按延迟和错误率路由
+        self.router = router  # 按(任务, 题型, 难度)选择模型
+        self.retry_policy = retry_policy
+        # 合并进行中的相同请求，只作用于低温度（近似确定性）的非流式调用
+        self.single_flight = single_flight
+        self.coalesce_max_temperature = coalesce_max_temperature
+        self.hedge_ratio = hedge_ratio  # 对冲请求占总请求的比例上限，0表示关闭
+        self.latency = LatencyTracker()
+        self.last_queue_wait = 0.0  # 最近一次调用的排队等待时间（秒）
+
+        self._calls = 0
+        self._hedged = 0
+        self._executor = None
+        self._usage_lock = threading.Lock()
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0  # 命中服务端前缀缓存的提示词token
+
+    @classmethod
+    def from_config(
+        cls, config, client, limiter=None, endpoint_pool=None, router=None
+    ) -> "LLMGateway":
+        """根据配置创建带重试和对冲的网关"""
+        return cls(
+            config,
+            client,
+            limiter=limiter,
+            retry_policy=RetryPolicy.from_config(config),
+            hedge_ratio=config.LLM_HEDGE_MAX_RATIO,
+            endpoint_pool=endpoint_pool,
+            router=router,
+            single_flight=SingleFlight() if config.LLM_SINGLE_FLIGHT else None,
+            coalesce_max_temperature=config.LLM_SINGLE_FLIGHT_MAX_TEMPERATURE
+        )
+
+    @property
+    def clients(self) -> List:
+        """网关使用的全部客户端"""
+        if self.endpoint_pool is not None:
+            return self.endpoint_pool.clients
+        return [self.client]
+
+    def chat(
+        self,
+        deadline: Optional[float] = None,
+        route: Optional[Route] = None,
+        **kwargs
+    ) -> Any:
+        """调用chat.completions.create，参数与OpenAI SDK一致
+
+        Args:
+            deadline: 本次调用（含排队和重试）的总时限（秒），默认取重试策略配置
+            route: (任务, 题型, 难度)，配置了路由器时据此选择模型并记录统计
+        
+        当前上下文绑定了CancelToken时，调用前检查是否已取消，时限不超过令牌的剩余时间，
+        流式响应登记到令牌上，取消时被关闭。
+        """
+        token = current_cancel_token()
+        if token is not None:
+            token.check()
+            remaining = token.remaining()
+            if remaining is not None:
+                deadline = min(deadline, remaining) if deadline else remaining
+        
+        self._select_model(route, kwargs)
+        if self._coalescable(kwargs):
+            return self.single_flight.do(
+                request_key(kwargs), lambda: self._routed_chat(deadline, route, kwargs)
+            )
+        response = self._routed_chat(deadline, route, kwargs)
+        if token is not None and kwargs.get("stream"):
+            token.register(response)
+            return _LimitedStream(
+                response, lambda latency, rate_limited: token.unregister(response)
+            )
+        return response
+
+    def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        """调用embeddings.create，经过限流器并按重试策略重试"""
+        policy = self.retry_policy
+        attempts = policy.max_attempts if policy else 1
+        estimated = sum(len(text) for text in texts) // 2
+
+        for attempt in range(attempts):
+            check_cancelled()
+            ticket = self.limiter.acquire(estimated) if self.limiter else None
+            rate_limited = False
+            try:
+                response = self.client.embeddings.create(model=model, input=texts)
+                return [item.embedding for item in response.data]
+            except Exception as e:
+                rate_limited = isinstance(e, RateLimitError)
+                if attempt == attempts - 1 or not policy.is_retryable(e):
+                    raise
+            finally:
+                if ticket is not None:
+                    self.limiter.release(ticket, rate_limited=rate_limited)
+            time.sleep(policy.backoff(attempt))
+
+    def _select_model(self, route: Optional[Route], kwargs: Dict):
+        if route is not None and self.router is not None:
+            kwargs["model"] = self.router.select(*route)
+
+    def _coalescable(self, kwargs: Dict) -> bool:
+        """只有非流式、低温度的调用结果可以在调用方之间共享"""
+        return (
+            self.single_flight is not None
+            and not kwargs.get("stream")
+            and kwargs.get("temperature", 1.0) <= self.coalesce_max_temperature
+        )
+
+    def _routed_chat(self, deadline: Optional[float], route: Optional[Route], kwargs: Dict) -> Any:
+        """发出调用，并按路由记录延迟和token用量"""
+        if route is None or self.router is None:
+            return self._chat(deadline, kwargs)
+
+        started_at = time.monotonic()
+        if kwargs.get("stream"):
+            # 流式响应默认不返回用量，请求服务端在最后一个数据块中附带
+            kwargs.setdefault("stream_options", {"include_usage": True})
+            stream = _LimitedStream(
+                self._chat(deadline, kwargs),
+                lambda latency, rate_limited: self._record_route(
+                    route, kwargs["model"], started_at, stream.usage
+                )
+            )
+            return stream
+
+        response = self._chat(deadline, kwargs)
+        self._record_route(route, kwargs["model"], started_at, getattr(response, "usage", None))
+        return response
+
+    def _record_route(self, route: Route, model: str, started_at: float, usage):
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        self.router.record(
+            route,
+            model,
+            time.monotonic() - started_at,
+            prompt_tokens=prompt_tokens if isinstance(prompt_tokens, int) else 0,
+            completion_tokens=completion_tokens if isinstance(completion_tokens, int) else 0
+        )
+
+    def _chat(self, deadline: Optional[float], kwargs: Dict) -> Any:
+        """带重试和截止时间的调用"""
+        policy = self.retry_policy
+        if policy is None:
+            return self._call_once(kwargs)
+
+        deadline = deadline or policy.deadline
+        expires_at = time.monotonic() + deadline if deadline else None
+
+        for attempt in range(policy.max_attempts):
+            check_cancelled()
+            remaining = None
+            call_kwargs = dict(kwargs)
+            if expires_at is not None:
+                remaining = expires_at - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("LLM call deadline exceeded")
+                call_kwargs["timeout"] = remaining
+
+            try:
+                if self.hedge_ratio > 0 and not kwargs.get("stream"):
+                    return self._call_hedged(call_kwargs, remaining)
+                return self._call_once(call_kwargs, remaining)
+            except Exception as e:
+                if attempt == policy.max_attempts - 1 or not policy.is_retryable(e):
+                    raise
+                delay = policy.backoff(attempt)
+                if expires_at is not None and time.monotonic() + delay >= expires_at:
+                    raise
+                if self.config.DEBUG:
+                    print(f"[LLM] attempt {attempt + 1} failed ({e}), retry in {delay:.2f}s")
+                time.sleep(delay)
+
+    def _call_once(self, kwargs: Dict, timeout: Optional[float] = None) -> Any:
+        """经过限流器发出一次请求
+
+        配置了端点池时先选定端点，再经过该端点自己的限流器：
+        一个端点的429或延迟超标只收缩该端点的并发窗口，RPM/TPM配额也按端点分别计算。
+        """
+        self._calls += 1
+        endpoint = self.endpoint_pool.acquire() if self.endpoint_pool is not None else None
+        limiter = endpoint.limiter if endpoint is not None and endpoint.limiter else self.limiter
+        if limiter is None:
+            return self._timed_create(kwargs, endpoint)
+
+        try:
+            ticket = limiter.acquire(
+                estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens")),
+                timeout=timeout
+            )
+        except BaseException:
+            if endpoint is not None:
+                self.endpoint_pool.abandon(endpoint)
+            raise
+        self.last_queue_wait = ticket.queue_wait
+        if self.config.DEBUG:
+            print(f"[LLM] queue wait {ticket.queue_wait:.3f}s")
+
+        try:
+            response = self._timed_create(kwargs, endpoint)
+        except RateLimitError:
+            limiter.release(ticket, rate_limited=True)
+            raise
+        except Exception:
+            limiter.release(ticket)
+            raise
+
+        if kwargs.get("stream"):
+            return _LimitedStream(
+                response,
+                lambda latency, rate_limited: limiter.release(
+                    ticket, latency=latency, rate_limited=rate_limited
+                )
+            )
+
+        limiter.release(ticket, actual_tokens=self._usage_tokens(response))
+        return response
+
+    def _timed_create(self, kwargs: Dict, endpoint=None) -> Any:
+        response = self._create(kwargs, endpoint)
+        if not kwargs.get("stream"):
+            self._record_usage(response)
+        return response
+
+    def _create(self, kwargs: Dict, endpoint=None) -> Any:
+        if endpoint is None:
+            started_at = time.monotonic()
+            response = self.client.chat.completions.create(**kwargs)
+            if not kwargs.get("stream"):
+                self.latency.record(time.monotonic() - started_at)
+            return response
+
+        started_at = time.monotonic()
+        try:
+            response = endpoint.client.chat.completions.create(**kwargs)
+        except Exception as e:
+            # 只有瞬时错误计入端点健康状况，请求参数错误与端点无关
+            self.endpoint_pool.release(endpoint, success=not RetryPolicy.is_retryable(e))
+            raise
+
+        latency = time.monotonic() - started_at
+        self.endpoint_pool.release(endpoint, latency=latency)
+        if not kwargs.get("stream"):
+            self.latency.record(latency)
+        return response
+
+    def _call_hedged(self, kwargs: Dict, timeout: Optional[float]) -> Any:
+        """对冲请求：首个请求超过p95延迟仍未返回时，再发一个副本"""
+        threshold = self.latency.percentile(self.HEDGE_PERCENTILE)
+        if threshold is None:
+            return self._call_once(kwargs, timeout)
+
+        started_at = time.monotonic()
+        executor = self._get_executor()
+        # 在线程池中保留调用方上下文（优先级类别、取消令牌）
+        primary = executor.submit(contextvars.copy_context().run, self._call_once, kwargs, timeout)
+        done, _ = wait([primary], timeout=threshold)
+        # 对冲请求数超过预算比例时只等待首个请求，控制额外成本
+        if done or self._hedged + 1 > self._calls * self.hedge_ratio:
+            return primary.result(timeout=timeout)
+
+        self._hedged += 1
+        remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - started_at))
+        backup = executor.submit(contextvars.copy_context().run, self._call_once, kwargs, remaining)
+
+        # 取先成功返回的结果；落后的请求继续运行但结果被丢弃
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError("LLM call deadline exceeded")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=16, thread_name_prefix="llm-hedge"
+            )
+        return self._executor
+
+    def stats(self) -> Dict:
+        """调用统计：总请求数、对冲请求数、延迟分位数"""
+        return {
+            "calls": self._calls,
+            "hedged": self._hedged,
+            "p95_latency": self.latency.percentile(self.HEDGE_PERCENTILE),
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "endpoints": self.endpoint_pool.stats() if self.endpoint_pool else [],
+            "routes": self.router.stats() if self.router else [],
+            "single_flight": self.single_flight.stats() if self.single_flight else None
+        }
+
+    def _record_usage(self, response):
+        """累计提示词token和缓存命中token"""
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        if not isinstance(prompt_tokens, int):
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None)
+        with self._usage_lock:
+            self.prompt_tokens += prompt_tokens
+            self.cached_prompt_tokens += cached if isinstance(cached, int) else 0
+
+    @staticmethod
+    def _usage_tokens(response) -> Optional[int]:
+        usage = getattr(response, "usage", None)
+        total = getattr(usage, "total_tokens", None)
+        return total if isinstance(total, int) else None
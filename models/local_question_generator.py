@@ -0,0 +1,192 @@
+import random
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from models import Chunk, Question
+from models.question_dedup import content_hash
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[。！？!?；;])|\n+|(?<=\.)\s+")
+_QUOTED_TERM = re.compile(r"[「“《\"]([^」”》\"\n]{2,20})[」”》\"]")
+_LATIN_TERM = re.compile(r"[A-Za-z][A-Za-z\-]{2,}")
+_CJK_RUN = re.compile(r"[一-鿿]{2,}")
+_LIST_PREFIX = re.compile(r"^\s*(?:[-*•]|\d+[.、)）])\s*")
+# 常见虚词，包含这些字的n-gram通常不是术语
+_STOP_CHARS = set("的是了在和与及或一个这那中为有也就都而被把从对将其可以不")
+
+MIN_SENTENCE_LENGTH = 8
+MAX_SENTENCE_LENGTH = 150
+MAX_TERMS = 30
+CLOZE_BLANK = "____"
+
+
+def split_sentences(text: str) -> List[str]:
+    """按中英文句末标点和换行切分句子，过滤过短或过长的片段"""
+    sentences = []
+    for sentence in _SENTENCE_SPLIT.split(text or ""):
+        sentence = (sentence or "").strip()
+        if MIN_SENTENCE_LENGTH <= len(sentence) <= MAX_SENTENCE_LENGTH:
+            sentences.append(sentence)
+    return sentences
+
+
+def _concept_name(item) -> str:
+    """从概念提取结果中取出概念名：兼容字符串列表、编号行和字典"""
+    if isinstance(item, dict):
+        item = item.get("name") or item.get("concept") or next(
+            (v for v in item.values() if isinstance(v, str)), ""
+        )
+    name = _LIST_PREFIX.sub("", str(item)).replace("*", "")
+    return re.split(r"[：:（(]", name, maxsplit=1)[0].strip()
+
+
+def concept_names(key_concepts: Optional[Dict]) -> List[str]:
+    """概念提取结果中的概念名列表"""
+    names = [_concept_name(item) for item in (key_concepts or {}).get("concepts", [])]
+    return [name for name in names if name]
+
+
+class LocalQuestionGenerator:
+    """不调用LLM、基于规则从资料原文出题
+
+    - 填空题：挖掉句子中的关键术语，以其他术语作为干扰项（按选择题呈现）
+    - 真假题：原句为真；替换句中术语得到假命题
+
+    用作LLM题目生成期间的即时首题，以及LLM不可用时的降级出题。
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.rng = rng or random.Random()
+
+    def extract_terms(self, chunks: List[Chunk], key_concepts: Dict = None) -> List[str]:
+        """关键术语：优先取已提取的概念，其次是引号内短语、重复出现的英文词和中文词组"""
+        text = "\n".join(chunk.text for chunk in chunks)
+        terms = concept_names(key_concepts)
+        terms += _QUOTED_TERM.findall(text)
+        terms += [w for w, n in Counter(_LATIN_TERM.findall(text)).most_common() if n >= 2]
+        terms += self._frequent_cjk_terms(split_sentences(text))
+
+        seen = set()
+        result = []
+        for term in terms:
+            if 2 <= len(term) <= 20 and term not in seen and term in text:
+                seen.add(term)
+                result.append(term)
+        return result[:MAX_TERMS]
+
+    @staticmethod
+    def _frequent_cjk_terms(sentences: List[str]) -> List[str]:
+        """在多个句子中重复出现的2-4字中文词组，保留不被更长词组覆盖的部分"""
+        counts = Counter()
+        for sentence in sentences:
+            grams = set()
+            for run in _CJK_RUN.findall(sentence):
+                for n in range(2, 5):
+                    grams.update(run[i:i + n] for i in range(len(run) - n + 1))
+            counts.update(g for g in grams if not _STOP_CHARS & set(g))
+
+        frequent = {g: c for g, c in counts.items() if c >= 2}
+        maximal = [
+            g for g, c in frequent.items()
+            if not any(g != o and g in o and frequent[o] == c for o in frequent)
+        ]
+        return sorted(maximal, key=lambda g: (-frequent[g] * len(g), g))
+
+    def _sentences(self, chunks: List[Chunk]) -> List[Tuple[str, Chunk]]:
+        return [(s, chunk) for chunk in chunks for s in split_sentences(chunk.text)]
+
+    def generate(
+        self,
+        question_type: str,
+        chunks: List[Chunk],
+        key_concepts: Dict = None,
+        difficulty: str = "medium"
+    ) -> Optional[Question]:
+        """按题型出题；无法出填空题时退化为真假题，资料中没有可用句子时返回None"""
+        if question_type != "true_false":
+            question = self.generate_cloze(chunks, key_concepts, difficulty)
+            if question is not None:
+                return question
+        return self.generate_true_false(chunks, key_concepts, difficulty)
+
+    def generate_cloze(
+        self,
+        chunks: List[Chunk],
+        key_concepts: Dict = None,
+        difficulty: str = "medium"
+    ) -> Optional[Question]:
+        """填空题：挖去句中一个术语，另选3个术语作为干扰项"""
+        terms = self.extract_terms(chunks, key_concepts)
+        candidates = [
+            (sentence, chunk, term)
+            for sentence, chunk in self._sentences(chunks)
+            for term in terms
+            if term in sentence and len(sentence) - len(term) >= MIN_SENTENCE_LENGTH // 2
+        ]
+        self.rng.shuffle(candidates)
+
+        for sentence, chunk, term in candidates:
+            distractors = [
+                t for t in terms
+                if t not in sentence and term not in t and t not in term
+            ]
+            if len(distractors) < 3:
+                continue
+
+            options = self.rng.sample(distractors, 3) + [term]
+            self.rng.shuffle(options)
+            content = f"填空：{sentence.replace(term, CLOZE_BLANK, 1)}"
+            return Question(
+                question_id=content_hash("multiple_choice", content, options, term),
+                question_type="multiple_choice",
+                content=content,
+                options=options,
+                correct_answer=term,
+                explanation=f"资料原文：{sentence}",
+                difficulty=difficulty,
+                source_chunks=[chunk.text],
+                tags=["cloze", difficulty],
+                metadata={"source": "local", "generation_method": "local_cloze"}
+            )
+        return None
+
+    def generate_true_false(
+        self,
+        chunks: List[Chunk],
+        key_concepts: Dict = None,
+        difficulty: str = "medium"
+    ) -> Optional[Question]:
+        """真假题：原句为真命题；以另一个术语替换句中术语得到假命题"""
+        sentences = self._sentences(chunks)
+        if not sentences:
+            return None
+
+        terms = self.extract_terms(chunks, key_concepts)
+        sentence, chunk = self.rng.choice(sentences)
+        statement, answer = sentence, "True"
+        explanation = f"资料原文：{sentence}"
+
+        present = [t for t in terms if t in sentence]
+        if present and self.rng.random() < 0.5:
+            term = self.rng.choice(present)
+            replacements = [t for t in terms if t not in sentence and term not in t and t not in term]
+            if replacements:
+                statement = sentence.replace(term, self.rng.choice(replacements), 1)
+                answer = "False"
+                explanation = f"该陈述将“{term}”替换为了其他概念。资料原文：{sentence}"
+
+        return Question(
+            question_id=content_hash("true_false", statement, ["True", "False"], answer),
+            question_type="true_false",
+            content=statement,
+            options=["True", "False"],
+            correct_answer=answer,
+            explanation=explanation,
+            difficulty=difficulty,
+            source_chunks=[f"chunk_{chunks.index(chunk)}"],
+            tags=["true_false", difficulty],
+            metadata={
+                "statement": statement,
+                "source": "local",
+                "generation_method": "local_rule"
+            }
+        )
@@ -0,0 +1,97 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+Route = Tuple[str, str, str]  # (任务, 题型, 难度)，"*"表示任意
+
+# 默认路由策略：简单任务走小模型，难题和简答题评分保留大模型
+# 值为"small"或"large"，由配置映射为具体模型名
+DEFAULT_ROUTES: Dict[Route, str] = {
+    ("generate", "true_false", "*"): "small",
+    ("generate", "multiple_choice", "easy"): "small",
+    ("generate", "*", "hard"): "large",
+    ("extract_concepts", "*", "*"): "small",
+    ("explanation", "*", "*"): "small",
+    ("evaluate", "short_answer", "*"): "large",
+    ("repair", "*", "*"): "small",
+}
+
+
+def parse_routes(spec: str) -> Dict[Route, str]:
+    """解析路由配置，格式："task:type:difficulty=model;..."，缺省段视为"*" """
+    routes = {}
+    for item in spec.split(";"):
+        if "=" not in item:
+            continue
+        key, model = item.split("=", 1)
+        parts = [p.strip() or "*" for p in key.split(":")]
+        parts += ["*"] * (3 - len(parts))
+        routes[tuple(parts[:3])] = model.strip()
+    return routes
+
+
+class ModelRouter:
+    """按(任务, 题型, 难度)选择模型，并记录各路由的延迟和token用量"""
+
+    def __init__(self, default_model: str, routes: Optional[Dict[Route, str]] = None):
+        self.default_model = default_model
+        self.routes = routes or {}
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {
+            "calls": 0, "total_latency": 0.0, "prompt_tokens": 0, "completion_tokens": 0
+        })
+
+    @classmethod
+    def from_config(cls, config) -> "ModelRouter":
+        """根据配置创建路由器：默认策略 + MODEL_ROUTES覆盖"""
+        aliases = {
+            "small": config.OPENAI_SMALL_MODEL or config.OPENAI_MODEL,
+            "large": config.OPENAI_MODEL
+        }
+        routes = {route: aliases[alias] for route, alias in DEFAULT_ROUTES.items()}
+        for route, model in parse_routes(config.MODEL_ROUTES).items():
+            routes[route] = aliases.get(model, model)
+        return cls(config.OPENAI_MODEL, routes)
+
+    def select(self, task: str, question_type: str = "*", difficulty: str = "*") -> str:
+        """按从具体到宽泛的顺序匹配路由；只指定一项时难度优先于题型，难题不会被题型规则降到小模型"""
+        for key in (
+            (task, question_type, difficulty),
+            (task, "*", difficulty),
+            (task, question_type, "*"),
+            (task, "*", "*")
+        ):
+            if key in self.routes:
+                return self.routes[key]
+        return self.default_model
+
+    def record(
+        self,
+        route: Route,
+        model: str,
+        latency: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0
+    ):
+        """记录一次调用的延迟和用量"""
+        with self._lock:
+            stats = self._stats[(route, model)]
+            stats["calls"] += 1
+            stats["total_latency"] += latency
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+
+    def stats(self) -> list:
+        """各路由的调用次数、平均延迟和平均token用量"""
+        with self._lock:
+            return [
+                {
+                    "route": ":".join(route),
+                    "model": model,
+                    "calls": s["calls"],
+                    "avg_latency": s["total_latency"] / s["calls"],
+                    "avg_prompt_tokens": s["prompt_tokens"] / s["calls"],
+                    "avg_completion_tokens": s["completion_tokens"] / s["calls"]
+                }
+                for (route, model), s in self._stats.items()
+            ]
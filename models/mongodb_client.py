@@ -1,5 +1,6 @@
 from pymongo import MongoClient, ASCENDING, DESCENDING
 from pymongo.errors import ConnectionFailure
+from dataclasses import asdict
 from datetime import datetime
 from typing import Dict, Any, List
 import json
@@ -58,6 +59,31 @@ class MongoDBClient:
             ("review_count", ASCENDING)
         ])
         
+        # 题库集合索引（按内容哈希去重）
+        self.db.question_bank.create_index("content_hash", unique=True)
+        
+        # 分块覆盖状态索引（每个用户每份资料一条）
+        self.db.chunk_coverage.create_index([
+            ("user_id", ASCENDING),
+            ("material_hash", ASCENDING)
+        ], unique=True)
+        
+        # 共享题目池索引（按资料内容哈希）
+        self.db.question_pool.create_index([
+            ("material_hash", ASCENDING),
+            ("question_id", ASCENDING)
+        ], unique=True)
+        self.db.question_pool_served.create_index([
+            ("user_id", ASCENDING),
+            ("material_hash", ASCENDING)
+        ], unique=True)
+        
+        # 评分缓存索引（题目ID + 规范化答案哈希）
+        self.db.evaluation_cache.create_index([
+            ("question_id", ASCENDING),
+            ("answer_hash", ASCENDING)
+        ], unique=True)
+        
         # 学习进度集合索引
         self.db.learning_progress.create_index([
             ("user_id", ASCENDING),
@@ -278,6 +304,114 @@ class MongoDBClient:
             })
         }
     
+    def save_question_to_bank(self, question: Question, simhash: str):
+        """将生成的题目写入题库，按内容哈希去重"""
+        self.db.question_bank.update_one(
+            {"content_hash": question.question_id},
+            {"$setOnInsert": {
+                "content_hash": question.question_id,
+                "simhash": simhash,
+                "question": asdict(question),
+                "created_at": datetime.now()
+            }},
+            upsert=True
+        )
+    
+    def load_question_fingerprints(self, limit: int = 50000) -> List[Dict]:
+        """加载题库中题目的哈希指纹，用于去重"""
+        return list(self.db.question_bank.find(
+            {},
+            projection={"_id": 0, "content_hash": 1, "simhash": 1},
+            sort=[("created_at", DESCENDING)],
+            limit=limit
+        ))
+    
+    def load_chunk_coverage(self, user_id: str, material_hash: str) -> Dict:
+        """加载用户在某份资料上的分块覆盖位集"""
+        return self.db.chunk_coverage.find_one(
+            {"user_id": user_id, "material_hash": material_hash},
+            projection={"_id": 0}
+        )
+    
+    def save_chunk_coverage(self, user_id: str, material_hash: str, coverage: Dict):
+        """保存分块覆盖位集"""
+        self.db.chunk_coverage.update_one(
+            {"user_id": user_id, "material_hash": material_hash},
+            {"$set": {**coverage, "updated_at": datetime.now()}},
+            upsert=True
+        )
+    
+    def save_pool_questions(self, material_hash: str, questions: List[Question]):
+        """将题目写入资料的共享题目池"""
+        for question in questions:
+            self.db.question_pool.update_one(
+                {"material_hash": material_hash, "question_id": question.question_id},
+                {"$setOnInsert": {
+                    "material_hash": material_hash,
+                    "question_id": question.question_id,
+                    "question_type": question.question_type,
+                    "question": asdict(question),
+                    "created_at": datetime.now()
+                }},
+                upsert=True
+            )
+    
+    def load_pool_questions(
+        self,
+        material_hash: str,
+        question_types: List[str],
+        exclude_ids: List[str] = None,
+        limit: int = 500
+    ) -> List[Dict]:
+        """加载资料共享池中的题目（排除指定题目）"""
+        query = {
+            "material_hash": material_hash,
+            "question_type": {"$in": question_types}
+        }
+        if exclude_ids:
+            query["question_id"] = {"$nin": list(exclude_ids)}
+        return [
+            doc["question"]
+            for doc in self.db.question_pool.find(query, projection={"_id": 0, "question": 1}, limit=limit)
+        ]
+    
+    def load_served_question_ids(self, user_id: str, material_hash: str) -> List[str]:
+        """用户在某份资料上已抽到过的题目ID"""
+        doc = self.db.question_pool_served.find_one(
+            {"user_id": user_id, "material_hash": material_hash},
+            projection={"_id": 0, "question_ids": 1}
+        )
+        return doc["question_ids"] if doc else []
+    
+    def mark_questions_served(self, user_id: str, material_hash: str, question_ids: List[str]):
+        """记录用户已抽到的题目"""
+        self.db.question_pool_served.update_one(
+            {"user_id": user_id, "material_hash": material_hash},
+            {"$addToSet": {"question_ids": {"$each": question_ids}}},
+            upsert=True
+        )
+    
+    def load_evaluation(self, question_id: str, answer_hash: str) -> Dict:
+        """加载同一题目相同答案的已有评分"""
+        doc = self.db.evaluation_cache.find_one(
+            {"question_id": question_id, "answer_hash": answer_hash},
+            projection={"_id": 0, "result": 1}
+        )
+        return doc["result"] if doc else None
+    
+    def save_evaluation(self, question_id: str, answer_hash: str, result: Dict):
+        """保存评分结果，已存在时保留最早的结果"""
+        self.db.evaluation_cache.update_one(
+            {"question_id": question_id, "answer_hash": answer_hash},
+            {"$setOnInsert": {
+                "question_id": question_id,
+                "answer_hash": answer_hash,
+                "result": result,
+                "created_at": datetime.now()
+            }},
+            upsert=True
+        )
+    
     def close(self):
         """关闭连接"""
         if self.client:
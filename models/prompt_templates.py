@@ -0,0 +1,97 @@
+import os
+import re
+import threading
+from functools import lru_cache
+from string import Template
+from typing import Dict, List, Optional
+
+DEFAULT_TEMPLATES_DIR = "prompt_templates"
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SECTION_PATTERN = re.compile(r"^\[(system|user)\]\s*$", re.MULTILINE)
+
+
+def minify(text: str) -> str:
+    """去除缩进、行尾空白、空行和注释行"""
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def strip_comments(text: str) -> str:
+    """只去除注释行和首尾空行，保留正文内的空白（用于计算空白压缩的节省量）"""
+    return "\n".join(line for line in text.splitlines() if not line.strip().startswith("#")).strip("\n")
+
+
+class PromptTemplate:
+    """预编译的提示词模板
+
+    模板分为两段：
+    - [system]：静态指令，不允许包含变量，所有请求逐字相同，命中服务端前缀缓存
+    - [user]：变量内容（学习资料、难度、用户答案等），放在最后
+    """
+
+    def __init__(self, name: str, source: str):
+        sections = _SECTION_PATTERN.split(source)
+        # split结果: [前导内容, 段名, 段内容, 段名, 段内容...]
+        parts = dict(zip(sections[1::2], sections[2::2]))
+        if "system" not in parts or "user" not in parts:
+            raise ValueError(f"Prompt template '{name}' must define [system] and [user] sections")
+
+        self.name = name
+        self.system = minify(parts["system"])
+        if Template(self.system).get_identifiers():
+            raise ValueError(f"Prompt template '{name}': [system] section must not contain variables")
+
+        self.user = Template(minify(parts["user"]))
+        # 估算压缩空白节省的token数（中文约每2字符1个token）；
+        # 注释行和段标题本来就不会发送，不计入节省
+        raw_chars = len(strip_comments(parts["system"])) + len(strip_comments(parts["user"]))
+        self.trimmed_tokens = max(0, raw_chars - len(self.system) - len(self.user.template)) // 2
+
+    def render_messages(self, **variables) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user.substitute(**variables)}
+        ]
+
+
+class PromptTemplateEngine:
+    """从模板目录加载并预编译全部提示词模板"""
+
+    TEMPLATE_SUFFIX = ".txt"
+
+    def __init__(self, templates_dir: str):
+        self.templates_dir = templates_dir
+        self.templates: Dict[str, PromptTemplate] = {}
+        self.tokens_trimmed = 0
+        self._lock = threading.Lock()
+
+        for filename in sorted(os.listdir(templates_dir)):
+            if not filename.endswith(self.TEMPLATE_SUFFIX):
+                continue
+            name = filename[:-len(self.TEMPLATE_SUFFIX)]
+            with open(os.path.join(templates_dir, filename), encoding="utf-8") as f:
+                self.templates[name] = PromptTemplate(name, f.read())
+
+    def render_messages(self, name: str, **variables) -> List[Dict[str, str]]:
+        """渲染为chat消息列表：system为静态指令，user为变量内容"""
+        template = self.templates.get(name)
+        if template is None:
+            raise KeyError(f"Prompt template not found: {name}")
+
+        with self._lock:
+            self.tokens_trimmed += template.trimmed_tokens
+        return template.render_messages(**variables)
+
+
+@lru_cache(maxsize=None)
+def load_prompt_templates(templates_dir: Optional[str] = None) -> PromptTemplateEngine:
+    """加载模板目录（相对路径以项目根目录为基准），同一目录只编译一次"""
+    templates_dir = templates_dir or DEFAULT_TEMPLATES_DIR
+    if not os.path.isabs(templates_dir):
+        templates_dir = os.path.join(PROJECT_ROOT, templates_dir)
+    return PromptTemplateEngine(templates_dir)
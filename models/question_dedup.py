@@ -0,0 +1,125 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from concurrent.futures import Executor, Future
+from typing import Dict, List, Optional, Set
+import numpy as np
+from models import Chunk, Question
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 8  # 鸽巢原理：汉明距离<=7时至少有一个8位分段完全相同
+_PUNCT_PATTERN = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：全角转半角、小写、去除空白和标点"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _PUNCT_PATTERN.sub("", text)
+
+
+def content_hash(question_type: str, content: str, options: List[str], correct_answer: str) -> str:
+    """题目ID：规范化内容的完整SHA-256，避免截断哈希在大规模题库下碰撞"""
+    parts = [question_type, normalize_text(content)]
+    parts.extend(sorted(normalize_text(option) for option in options))
+    parts.append(normalize_text(correct_answer))
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+def material_hash(chunks: List[Chunk]) -> str:
+    """资料ID：全部分块规范化文本的SHA-256，同一份资料在不同用户间相同"""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(normalize_text(chunk.text).encode())
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+def simhash(text: str, ngram: int = 3) -> int:
+    """基于字符n-gram的64位SimHash，用于近似重复检测"""
+    text = normalize_text(text)
+    grams = {text[i:i + ngram] for i in range(max(1, len(text) - ngram + 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), "big") for g in grams],
+        dtype=">u8"
+    )
+    # 每个n-gram哈希按位投票
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(len(hashes), SIMHASH_BITS)
+    votes = bits.sum(axis=0) * 2 > len(hashes)
+    return int("".join("1" if v else "0" for v in votes), 2)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class QuestionDeduplicator:
+    """题目去重：规范化哈希精确去重 + SimHash近似去重
+
+    题库来自本进程生成的题目和持久化的题库（MongoDB question_bank集合）。
+    持久化题库的指纹由load_in_background在后台加载一次，加载完成前只与
+    本进程生成的题目去重，不阻塞出题。
+    """
+
+    def __init__(self, store=None, max_distance: int = 6):
+        self.store = store
+        self.max_distance = max_distance
+        self._hashes: Set[str] = set()
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(SIMHASH_BANDS)]
+        self._loading: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    def load_in_background(self, executor: Executor) -> Optional[Future]:
+        """在后台加载持久化题库的指纹，只加载一次"""
+        if self.store is None:
+            return None
+        with self._lock:
+            if self._loading is None:
+                self._loading = executor.submit(self._load_fingerprints)
+            return self._loading
+
+    def _load_fingerprints(self):
+        try:
+            fingerprints = self.store.load_question_fingerprints()
+        except Exception as e:
+            # 加载失败时只与本进程生成的题目去重
+            print(f"Failed to load question fingerprints: {e}")
+            return
+        with self._lock:
+            for fingerprint in fingerprints:
+                self._index(fingerprint["content_hash"], int(fingerprint["simhash"], 16))
+
+    def _index(self, question_hash: str, signature: int):
+        self._hashes.add(question_hash)
+        band_bits = SIMHASH_BITS // SIMHASH_BANDS
+        for i, band in enumerate(self._bands):
+            key = (signature >> (i * band_bits)) & ((1 << band_bits) - 1)
+            band.setdefault(key, []).append(signature)
+
+    def _near_duplicate(self, signature: int) -> bool:
+        band_bits = SIMHASH_BITS // SIMHASH_BANDS
+        for i, band in enumerate(self._bands):
+            key = (signature >> (i * band_bits)) & ((1 << band_bits) - 1)
+            for candidate in band.get(key, []):
+                if hamming_distance(signature, candidate) <= self.max_distance:
+                    return True
+        return False
+
+    def is_duplicate(self, question: Question) -> bool:
+        """题目与题库中已有题目完全相同或近似重复"""
+        with self._lock:
+            if question.question_id in self._hashes:
+                return True
+            return self._near_duplicate(simhash(question.content))
+
+    def add(self, question: Question):
+        """将题目加入题库"""
+        signature = simhash(question.content)
+        with self._lock:
+            self._index(question.question_id, signature)
+        if self.store is not None:
+            try:
+                self.store.save_question_to_bank(question, format(signature, "016x"))
+            except Exception as e:
+                # 题库写入失败不影响出题，本进程内仍可去重
+                print(f"Failed to save question to bank: {e}")
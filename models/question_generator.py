@@ -1,59 +1,78 @@
 import json
 import random
-from typing import List, Dict, Any, Generator
+from concurrent.futures import Future
+from typing import List, Dict, Any, Callable, Generator, Optional, Tuple, Union
 from openai import OpenAI
-import hashlib
+from models.cancellation import OperationCancelled, check_cancelled
+from models.llm_gateway import LLMGateway
+from models.local_question_generator import LocalQuestionGenerator, concept_names
+from models.prompt_templates import load_prompt_templates
+from models.question_dedup import QuestionDeduplicator
+from models.question_schema import (
+    FIELD_REQUIREMENTS, QuestionValidationError, expand_question,
+    invalid_fields, repair_locally, validate_payload
+)
 from models import Chunk, Question
 
 class QuestionGenerator:
     """基于学习资料生成题目"""
     
-    def __init__(self, config):
+    DEDUP_RETRY_BUDGET = 2  # 每次出题中因重复而重新生成的总次数上限，用完后重复的题目跳过
+    MAX_REPAIR_ROUNDS = 2
+    REPAIR_MAX_TOKENS = 300
+    MAX_PROMPT_CONCEPTS = 12  # 出题提示词中最多列出的核心概念数
+    # 每道题使用的资料分块数
+    CHUNKS_PER_QUESTION = {"multiple_choice": 3, "short_answer": 2, "true_false": 2}
+    
+    def __init__(self, config, llm=None, prompts=None, deduplicator=None):
         self.config = config
-        self.client = OpenAI(
+        self.deduplicator = deduplicator  # 可选：与题库去重
+        self.local_generator = LocalQuestionGenerator()  # 即时首题和LLM不可用时的降级出题
+        self.prompts = prompts or load_prompt_templates()
+        # 优先使用LLMAgent注入的共享网关（共享客户端、限流和重试策略）
+        self.llm = llm or LLMGateway(config, OpenAI(
             api_key=config.OPENAI_API_KEY,
             base_url=config.OPENAI_BASE_URL
-        )
+        ))
+        self.client = self.llm.client
     
     def generate_questions(
         self, 
         chunks: List[Chunk], 
         num_questions: int = 5,
         question_types: List[str] = None,
-        pre_extracted_concepts: Dict = None
+        pre_extracted_concepts: Union[Dict, Future] = None,
+        instant_first: bool = False,
+        chunk_selector: Callable[[List[Chunk], int], List[Chunk]] = None
     ) -> List[Question]:
-        """生成题目"""
+        """生成题目
+        
+        Args:
+            pre_extracted_concepts: 预提取的概念，或仍在后台提取中的Future（完成后才使用）
+            instant_first: 第一题由本地规则即时生成，不等待LLM
+            chunk_selector: 为每道题选择分块 (chunks, k) -> 分块列表，默认随机抽样
+        """
         if not question_types:
             question_types = list(self.config.QUESTION_TYPES)
         
-        # 使用预提取的概念或提取新概念
-        if pre_extracted_concepts is None:
-            key_concepts = self._extract_key_concepts_for_questions(chunks)
-        else:
-            key_concepts = pre_extracted_concepts
-        
         questions = []
+        served = QuestionDeduplicator()  # 本次已出的题目
+        retries = self.DEDUP_RETRY_BUDGET
         for i in range(num_questions):
             q_type = random.choice(question_types)
             difficulty = self._select_difficulty(i, num_questions)
             
-            if q_type == "multiple_choice":
-                question = self._generate_multiple_choice(
-                    chunks, key_concepts, difficulty
-                )
-            elif q_type == "short_answer":
-                question = self._generate_short_answer(
-                    chunks, key_concepts, difficulty
-                )
-            elif q_type == "true_false":
-                question = self._generate_true_false(
-                    chunks, key_concepts, difficulty
-                )
-            else:
+            question, retries = self._generate_unique(
+                q_type, chunks, self._ready_concepts(pre_extracted_concepts), difficulty,
+                local=instant_first and i == 0, chunk_selector=chunk_selector,
+                served=served, retries=retries
+            )
+            if question is None:
                 continue
             
             questions.append(question)
         
+        self._report_shortfall(len(questions), num_questions)
         return questions
     
     def generate_questions_stream(
@@ -61,10 +80,13 @@ class QuestionGenerator:
         chunks: List[Chunk],
         num_questions: int = 5,
         question_types: List[str] = None,
-        pre_extracted_concepts: Dict = None,
+        pre_extracted_concepts: Union[Dict, Future] = None,
         on_question_start: callable = None,
         on_question_chunk: callable = None,
-        on_question_complete: callable = None
+        on_question_complete: callable = None,
+        instant_first: bool = False,
+        chunk_selector: Callable[[List[Chunk], int], List[Chunk]] = None,
+        on_question_skipped: callable = None
     ) -> List[Question]:
         """流式生成题目，实时回调通知进度
         
@@ -72,22 +94,22 @@ class QuestionGenerator:
             chunks: 学习资料块
             num_questions: 题目数量
             question_types: 题目类型列表
-            pre_extracted_concepts: 预提取的概念
+            pre_extracted_concepts: 预提取的概念，或仍在后台提取中的Future（完成后才使用）
             on_question_start: 开始生成题目时的回调 (question_index, total)
             on_question_chunk: 生成过程中流式回调 (chunk_text)
             on_question_complete: 题目生成完成时的回调 (question_object)
+            instant_first: 第一题由本地规则即时生成，用户无需等待LLM
+            chunk_selector: 为每道题选择分块 (chunks, k) -> 分块列表，默认随机抽样
+            on_question_skipped: 题目因重复或无法生成而跳过时的回调 (question_index, total)
         """
         if not question_types:
             question_types = list(self.config.QUESTION_TYPES)
         
-        # 使用预提取的概念或提取新概念
-        if pre_extracted_concepts is None:
-            key_concepts = self._extract_key_concepts_for_questions(chunks)
-        else:
-            key_concepts = pre_extracted_concepts
-        
         questions = []
+        served = QuestionDeduplicator()  # 本次已出的题目
+        retries = self.DEDUP_RETRY_BUDGET
         for i in range(num_questions):
+            check_cancelled()
             q_type = random.choice(question_types)
             difficulty = self._select_difficulty(i, num_questions)
             
@@ -95,19 +117,15 @@ class QuestionGenerator:
             if on_question_start:
                 on_question_start(i + 1, num_questions)
             
-            if q_type == "multiple_choice":
-                question = self._generate_multiple_choice_stream(
-                    chunks, key_concepts, difficulty, on_question_chunk
-                )
-            elif q_type == "short_answer":
-                question = self._generate_short_answer_stream(
-                    chunks, key_concepts, difficulty, on_question_chunk
-                )
-            elif q_type == "true_false":
-                question = self._generate_true_false_stream(
-                    chunks, key_concepts, difficulty, on_question_chunk
-                )
-            else:
+            question, retries = self._generate_unique(
+                q_type, chunks, self._ready_concepts(pre_extracted_concepts), difficulty,
+                stream=True, on_chunk=on_question_chunk,
+                local=instant_first and i == 0, chunk_selector=chunk_selector,
+                served=served, retries=retries
+            )
+            if question is None:
+                if on_question_skipped:
+                    on_question_skipped(i + 1, num_questions)
                 continue
             
             # 通知完成
@@ -116,8 +134,92 @@ class QuestionGenerator:
             
             questions.append(question)
         
+        self._report_shortfall(len(questions), num_questions)
         return questions
     
+    @staticmethod
+    def _report_shortfall(generated: int, requested: int):
+        if generated < requested:
+            print(f"Generated {generated}/{requested} questions; the rest were duplicates or failed")
+    
+    def _generate_unique(
+        self,
+        q_type: str,
+        chunks: List[Chunk],
+        key_concepts: Dict,
+        difficulty: str,
+        stream: bool = False,
+        on_chunk: callable = None,
+        local: bool = False,
+        chunk_selector: Callable[[List[Chunk], int], List[Chunk]] = None,
+        served: QuestionDeduplicator = None,
+        retries: int = 0
+    ) -> Tuple[Optional[Question], int]:
+        """生成一道不重复的题目，返回(题目, 剩余重试次数)
+        
+        题目交付前与题库（deduplicator）和本次已出的题目（served）比对，
+        重复时重新生成这一题，每次重新生成消耗一次retries；次数用完仍重复则跳过，返回None。
+        local为True或LLM调用失败时由本地规则出题，无法出题时返回None。
+        提供chunk_selector时先选定分块，题目metadata记录所用分块的下标。
+        """
+        generators = {
+            "multiple_choice": (self._generate_multiple_choice, self._generate_multiple_choice_stream),
+            "short_answer": (self._generate_short_answer, self._generate_short_answer_stream),
+            "true_false": (self._generate_true_false, self._generate_true_false_stream)
+        }
+        if q_type not in generators:
+            return None, retries
+        
+        generate, generate_stream = generators[q_type]
+        all_chunks = chunks
+        while True:
+            if chunk_selector is not None:
+                chunks = chunk_selector(all_chunks, self.CHUNKS_PER_QUESTION[q_type])
+            
+            question = None
+            if not local:
+                try:
+                    if stream:
+                        question = generate_stream(chunks, key_concepts, difficulty, on_chunk)
+                    else:
+                        question = generate(chunks, key_concepts, difficulty)
+                except OperationCancelled:
+                    raise
+                except Exception as e:
+                    # 取消时被关闭的流会以连接错误结束，不应降级出题
+                    check_cancelled()
+                    # 降级：LLM不可用时改用本地规则出题
+                    print(f"LLM question generation failed, using local generator: {e}")
+            
+            if question is None:
+                question = self.local_generator.generate(q_type, chunks, key_concepts, difficulty)
+                if question is None:
+                    return None, retries
+            
+            if not self._is_duplicate(question, served):
+                break
+            if retries == 0:
+                print(f"Skipping duplicate question {question.question_id}")
+                return None, retries
+            retries -= 1
+        
+        if served is not None:
+            served.add(question)
+        if chunk_selector is not None:
+            selected = {id(chunk) for chunk in chunks}
+            question.metadata["chunk_indices"] = [
+                i for i, chunk in enumerate(all_chunks) if id(chunk) in selected
+            ]
+        if self.deduplicator is not None:
+            self.deduplicator.add(question)
+        return question, retries
+    
+    def _is_duplicate(self, question: Question, served: Optional[QuestionDeduplicator]) -> bool:
+        """与本次已出的题目或题库中的题目重复"""
+        if served is not None and served.is_duplicate(question):
+            return True
+        return self.deduplicator is not None and self.deduplicator.is_duplicate(question)
+    
     def _generate_multiple_choice(
         self, 
         chunks: List[Chunk], 
@@ -127,56 +229,7 @@ class QuestionGenerator:
         """生成选择题"""
         # 选择相关的内容块
         relevant_chunks = random.sample(chunks, min(3, len(chunks)))
-        context = "\n".join([chunk.text for chunk in relevant_chunks])
-        
-        prompt = f"""基于以下学习内容生成一道{difficulty}难度的选择题：
-
-        学习内容：
-        {context}
-
-        要求：
-        1. 问题应该测试对核心概念的理解
-        2. 提供4个选项，其中一个是正确答案
-        3. 错误选项应该是有迷惑性的常见误解
-        4. 提供详细的解释说明为什么正确答案正确，其他选项为什么错误
-
-        返回JSON格式：
-        {{
-            "question": "问题文本",
-            "options": ["选项A", "选项B", "选项C", "选项D"],
-            "correct_answer": "正确选项的完整文本",
-            "explanation": "详细的解释",
-            "tags": ["标签1", "标签2"],
-            "difficulty": "{difficulty}"
-        }}
-        """
-        
-        response = self.client.chat.completions.create(
-            model=self.config.OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
-        
-        data = json.loads(response.choices[0].message.content)
-        
-        # 生成唯一ID
-        question_id = hashlib.md5(
-            f"{data['question']}_{difficulty}".encode()
-        ).hexdigest()[:8]
-        
-        return Question(
-            question_id=question_id,
-            question_type="multiple_choice",
-            content=data["question"],
-            options=data["options"],
-            correct_answer=data["correct_answer"],
-            explanation=data["explanation"],
-            difficulty=difficulty,
-            source_chunks=[chunk.text for chunk in relevant_chunks],
-            tags=data.get("tags", []),
-            metadata={"generation_method": "llm"}
-        )
+        return self._request_question("multiple_choice", relevant_chunks, difficulty, key_concepts)
     
     def _generate_short_answer(
         self, 
@@ -186,75 +239,16 @@ class QuestionGenerator:
     ) -> Question:
         """生成简答题"""
         relevant_chunks = random.sample(chunks, min(2, len(chunks)))
-        context = "\n".join([chunk.text for chunk in relevant_chunks])
-        
-        prompt = f"""基于以下学习内容生成一道{difficulty}难度的简答题：
-
-        学习内容：
-        {context}
-
-        要求：
-        1. 问题应该测试对概念的理解和应用能力
-        2. 提供参考答案要点
-        3. 提供评分标准
-
-        返回JSON格式：
-        {{
-            "question": "问题文本",
-            "reference_answer": "参考答案",
-            "scoring_criteria": ["要点1", "要点2", "要点3"],
-            "explanation": "题目考察的知识点和解题思路",
-            "tags": ["标签1", "标签2"],
-            "difficulty": "{difficulty}"
-        }}
-        """
-        
-        response = self.client.chat.completions.create(
-            model=self.config.OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
-        
-        data = json.loads(response.choices[0].message.content)
-        
-        question_id = hashlib.md5(
-            f"{data['question']}_{difficulty}".encode()
-        ).hexdigest()[:8]
-        
-        return Question(
-            question_id=question_id,
-            question_type="short_answer",
-            content=data["question"],
-            options=[],  # 简答题无选项
-            correct_answer=data["reference_answer"],
-            explanation=data["explanation"],
-            difficulty=difficulty,
-            source_chunks=[chunk.text for chunk in relevant_chunks],
-            tags=data.get("tags", []),
-            metadata={
-                "scoring_criteria": data.get("scoring_criteria", []),
-                "generation_method": "llm"
-            }
-        )
+        return self._request_question("short_answer", relevant_chunks, difficulty, key_concepts)
     
-    def _extract_key_concepts_for_questions(self, chunks: List[Chunk]) -> Dict:
-        """提取用于生成题目的关键概念"""
-        # 简化的概念提取，实际可以使用更复杂的方法
-        combined = " ".join([chunk.text[:500] for chunk in chunks[:5]])
-        
-        prompt = f"""提取以下内容中的关键概念：
-        {combined}
-        
-        返回重要概念列表"""
-        
-        response = self.client.chat.completions.create(
-            model=self.config.OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3
-        )
-        
-        return {"concepts": response.choices[0].message.content.split("\n")}
+    @staticmethod
+    def _ready_concepts(concepts: Union[Dict, Future, None]) -> Dict:
+        """概念是可选输入：后台提取尚未完成或失败时不等待，按无概念出题"""
+        if isinstance(concepts, Future):
+            if not concepts.done() or concepts.cancelled() or concepts.exception() is not None:
+                return {}
+            concepts = concepts.result()
+        return concepts if isinstance(concepts, dict) else {}
     
     def _select_difficulty(self, index: int, total: int) -> str:
         """根据位置选择难度，实现难度梯度"""
@@ -283,83 +277,9 @@ class QuestionGenerator:
         difficulty: str
     ) -> Question:
         """生成真假题"""
-        # 选择相关的内容块
         relevant_chunks = random.sample(chunks, min(2, len(chunks)))
-        context = "\n".join([chunk.text for chunk in relevant_chunks])
-        
-        prompt = f"""基于以下学习内容，生成一个真假题（True/False Question）。
-        
-        学习内容:
-        {context}
-        
-        难度: {difficulty}
-        
-        请生成一个JSON格式的真假题，包含以下字段：
-        - statement: 陈述句（需要判断真假）
-        - correct_answer: 正确答案（"True" 或 "False"）
-        - explanation: 解释为什么这个答案是正确的
-        - difficulty: 难度等级
-        
-        返回格式: {{"statement": "...", "correct_answer": "...", "explanation": "...", "difficulty": "{difficulty}"}}
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=self.config.OPENAI_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                response_format={"type": "json_object"}
-            )
-            
-            import json
-            result = json.loads(response.choices[0].message.content)
-            
-            # 从chunks中获取source块IDs
-            source_chunk_ids = [f"chunk_{i}" for i in range(len(relevant_chunks))]
-            
-            question = Question(
-                question_id=hashlib.md5(result["statement"].encode()).hexdigest()[:12],
-                question_type="true_false",
-                content=result["statement"],
-                options=["True", "False"],
-                correct_answer=result["correct_answer"],
-                explanation=result["explanation"],
-                difficulty=difficulty,
-                source_chunks=source_chunk_ids,
-                tags=["true_false", difficulty],
-                metadata={
-                    "statement": result["statement"],
-                    "source": "generated"
-                }
-            )
-            
-            return question
-        except Exception as e:
-            # 备选真假题
-            fallback_statements = [
-                "机器学习是人工智能的一个重要分支。",
-                "所有监督学习算法都需要标记数据。",
-                "过拟合发生在模型过于复杂时。",
-                "准确率是评估分类模型的唯一指标。",
-                "交叉验证是一种评估模型的技术。"
-            ]
-            
-            statement = random.choice(fallback_statements)
-            
-            question = Question(
-                question_id=hashlib.md5(statement.encode()).hexdigest()[:12],
-                question_type="true_false",
-                content=statement,
-                options=["True", "False"],
-                correct_answer="True",
-                explanation="这是一个真命题。",
-                difficulty=difficulty,
-                source_chunks=[f"chunk_{i}" for i in range(len(relevant_chunks))],
-                tags=["true_false", difficulty],
-                metadata={"source": "fallback"}
-            )
-            
-            return question
+        return self._request_question("true_false", relevant_chunks, difficulty, key_concepts)
+    
     def _generate_multiple_choice_stream(
         self,
         chunks: List[Chunk],
@@ -369,63 +289,8 @@ class QuestionGenerator:
     ) -> Question:
         """流式生成选择题"""
         relevant_chunks = random.sample(chunks, min(3, len(chunks)))
-        context = "\n".join([chunk.text for chunk in relevant_chunks])
-        
-        prompt = f"""基于以下学习内容生成一道{difficulty}难度的选择题：
-
-        学习内容：
-        {context}
-
-        要求：
-        1. 问题应该测试对核心概念的理解
-        2. 提供4个选项，其中一个是正确答案
-        3. 错误选项应该是有迷惑性的常见误解
-        4. 提供详细的解释说明为什么正确答案正确，其他选项为什么错误
-
-        返回JSON格式：
-        {{
-            "question": "问题文本",
-            "options": ["选项A", "选项B", "选项C", "选项D"],
-            "correct_answer": "正确选项的完整文本",
-            "explanation": "详细的解释",
-            "tags": ["标签1", "标签2"],
-            "difficulty": "{difficulty}"
-        }}
-        """
-        
-        # 使用流式API
-        full_content = ""
-        with self.client.chat.completions.create(
-            model=self.config.OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            response_format={"type": "json_object"},
-            stream=True
-        ) as stream:
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    full_content += content
-                    if on_chunk:
-                        on_chunk(content)
-        
-        data = json.loads(full_content)
-        
-        question_id = hashlib.md5(
-            f"{data['question']}_{difficulty}".encode()
-        ).hexdigest()[:8]
-        
-        return Question(
-            question_id=question_id,
-            question_type="multiple_choice",
-            content=data["question"],
-            options=data["options"],
-            correct_answer=data["correct_answer"],
-            explanation=data["explanation"],
-            difficulty=difficulty,
-            source_chunks=[chunk.text for chunk in relevant_chunks],
-            tags=data.get("tags", []),
-            metadata={"generation_method": "llm_stream"}
+        return self._request_question_stream(
+            "multiple_choice", relevant_chunks, difficulty, on_chunk, key_concepts
         )
     
     def _generate_short_answer_stream(
@@ -437,155 +302,171 @@ class QuestionGenerator:
     ) -> Question:
         """流式生成简答题"""
         relevant_chunks = random.sample(chunks, min(2, len(chunks)))
+        return self._request_question_stream(
+            "short_answer", relevant_chunks, difficulty, on_chunk, key_concepts
+        )
+    
+    def _generate_true_false_stream(
+        self,
+        chunks: List[Chunk],
+        key_concepts: Dict,
+        difficulty: str,
+        on_chunk: callable = None
+    ) -> Question:
+        """流式生成真假题"""
+        relevant_chunks = random.sample(chunks, min(2, len(chunks)))
+        return self._request_question_stream(
+            "true_false", relevant_chunks, difficulty, on_chunk, key_concepts
+        )
+    
+    def _max_tokens(self, question_type: str) -> int:
+        """各题型的输出token上限"""
+        return {
+            "multiple_choice": self.config.MAX_TOKENS_MULTIPLE_CHOICE,
+            "short_answer": self.config.MAX_TOKENS_SHORT_ANSWER,
+            "true_false": self.config.MAX_TOKENS_TRUE_FALSE
+        }[question_type]
+    
+    def _template_name(self, question_type: str) -> str:
+        """两阶段模式下第一阶段只生成题干、选项和答案"""
+        if self.config.LAZY_EXPLANATIONS:
+            return f"{question_type}_stem"
+        return question_type
+    
+    def _render_question_prompt(
+        self,
+        question_type: str,
+        relevant_chunks: List[Chunk],
+        difficulty: str,
+        key_concepts: Dict = None
+    ) -> List[Dict]:
+        """出题消息：后台概念提取已完成时在[user]段列出核心概念，未完成时写“无”"""
         context = "\n".join([chunk.text for chunk in relevant_chunks])
+        concepts = "、".join(concept_names(key_concepts)[:self.MAX_PROMPT_CONCEPTS]) or "无"
+        return self.prompts.render_messages(
+            self._template_name(question_type), difficulty=difficulty, concepts=concepts, context=context
+        )
+    
+    def _request_question(
+        self,
+        question_type: str,
+        relevant_chunks: List[Chunk],
+        difficulty: str,
+        key_concepts: Dict = None
+    ) -> Question:
+        """请求紧凑格式的题目并在本地展开"""
+        messages = self._render_question_prompt(question_type, relevant_chunks, difficulty, key_concepts)
         
-        prompt = f"""基于以下学习内容生成一道{difficulty}难度的简答题：
-
-        学习内容：
-        {context}
-
-        要求：
-        1. 问题应该测试对概念的理解和应用能力
-        2. 提供参考答案要点
-        3. 提供评分标准
-
-        返回JSON格式：
-        {{
-            "question": "问题文本",
-            "reference_answer": "参考答案",
-            "scoring_criteria": ["要点1", "要点2", "要点3"],
-            "explanation": "题目考察的知识点和解题思路",
-            "tags": ["标签1", "标签2"],
-            "difficulty": "{difficulty}"
-        }}
-        """
+        response = self.llm.chat(
+            model=self.config.OPENAI_MODEL,
+            route=("generate", question_type, difficulty),
+            messages=messages,
+            temperature=0.7,
+            max_tokens=self._max_tokens(question_type),
+            response_format={"type": "json_object"}
+        )
+        
+        data = self._validate_with_repair(
+            question_type, _load_json(response.choices[0].message.content), difficulty
+        )
+        return expand_question(question_type, data, difficulty, relevant_chunks, "llm")
+    
+    def _request_question_stream(
+        self,
+        question_type: str,
+        relevant_chunks: List[Chunk],
+        difficulty: str,
+        on_chunk: callable = None,
+        key_concepts: Dict = None
+    ) -> Question:
+        """流式请求紧凑格式的题目并在本地展开"""
+        messages = self._render_question_prompt(question_type, relevant_chunks, difficulty, key_concepts)
         
         # 使用流式API
         full_content = ""
-        with self.client.chat.completions.create(
+        with self.llm.chat(
             model=self.config.OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
+            route=("generate", question_type, difficulty),
+            messages=messages,
             temperature=0.7,
+            max_tokens=self._max_tokens(question_type),
             response_format={"type": "json_object"},
             stream=True
         ) as stream:
             for chunk in stream:
-                if chunk.choices[0].delta.content:
+                # 附带用量的最后一个数据块没有choices
+                if chunk.choices and chunk.choices[0].delta.content:
                     content = chunk.choices[0].delta.content
                     full_content += content
                     if on_chunk:
                         on_chunk(content)
         
-        data = json.loads(full_content)
-        
-        question_id = hashlib.md5(
-            f"{data['question']}_{difficulty}".encode()
-        ).hexdigest()[:8]
-        
-        return Question(
-            question_id=question_id,
-            question_type="short_answer",
-            content=data["question"],
-            options=[],
-            correct_answer=data["reference_answer"],
-            explanation=data["explanation"],
-            difficulty=difficulty,
-            source_chunks=[chunk.text for chunk in relevant_chunks],
-            tags=data.get("tags", []),
-            metadata={
-                "scoring_criteria": data.get("scoring_criteria", []),
-                "generation_method": "llm_stream"
-            }
+        data = self._validate_with_repair(question_type, _load_json(full_content), difficulty)
+        return expand_question(question_type, data, difficulty, relevant_chunks, "llm_stream")
+    
+    def _validate_with_repair(self, question_type: str, data: Dict, difficulty: str) -> Dict:
+        """校验LLM输出；只修复出错的字段（先本地修复，再定向请求LLM），不重新生成整道题"""
+        data = repair_locally(question_type, data)
+        for _ in range(self.MAX_REPAIR_ROUNDS):
+            fields = invalid_fields(question_type, data)
+            if not fields:
+                break
+            for field in sorted(fields):
+                if (question_type, field) not in FIELD_REQUIREMENTS:
+                    data.pop(field, None)  # 可选字段格式错误时使用默认值
+                    continue
+                data[field] = self._request_field_repair(question_type, data, field, difficulty)
+            data = repair_locally(question_type, data)
+        return validate_payload(question_type, data)
+    
+    def _request_field_repair(self, question_type: str, data: Dict, field: str, difficulty: str) -> Any:
+        """请求LLM只重新生成一个字段"""
+        messages = self.prompts.render_messages(
+            "repair_field",
+            question=json.dumps(data, ensure_ascii=False),
+            field=field,
+            requirement=FIELD_REQUIREMENTS[(question_type, field)]
         )
+        response = self.llm.chat(
+            model=self.config.OPENAI_MODEL,
+            route=("repair", question_type, difficulty),
+            messages=messages,
+            temperature=0,
+            max_tokens=self.REPAIR_MAX_TOKENS,
+            response_format={"type": "json_object"}
+        )
+        repaired = _load_json(response.choices[0].message.content)
+        if field not in repaired:
+            raise QuestionValidationError(question_type, {field})
+        return repaired[field]
     
-    def _generate_true_false_stream(
-        self,
-        chunks: List[Chunk],
-        key_concepts: Dict,
-        difficulty: str,
-        on_chunk: callable = None
-    ) -> Question:
-        """流式生成真假题"""
-        relevant_chunks = random.sample(chunks, min(2, len(chunks)))
-        context = "\n".join([chunk.text for chunk in relevant_chunks])
-        
-        prompt = f"""基于以下学习内容，生成一个真假题（True/False Question）。
-        
-        学习内容:
-        {context}
-        
-        难度: {difficulty}
-        
-        请生成一个JSON格式的真假题，包含以下字段：
-        - statement: 陈述句（需要判断真假）
-        - correct_answer: 正确答案（"True" 或 "False"）
-        - explanation: 解释为什么这个答案是正确的
-        - difficulty: 难度等级
+    def generate_explanation(self, question: Question) -> str:
+        """为题目生成解析（两阶段模式的第二阶段）"""
+        messages = self.prompts.render_messages(
+            "explanation",
+            question=question.content,
+            options=" / ".join(question.options) if question.options else "无",
+            correct_answer=question.correct_answer,
+            context="\n".join(question.metadata.get("source_text") or question.source_chunks)
+        )
         
-        返回格式: {{"statement": "...", "correct_answer": "...", "explanation": "...", "difficulty": "{difficulty}"}}
-        """
+        response = self.llm.chat(
+            model=self.config.OPENAI_MODEL,
+            route=("explanation", question.question_type, question.difficulty),
+            messages=messages,
+            temperature=0.3,
+            max_tokens=self.config.MAX_TOKENS_EXPLANATION
+        )
         
-        try:
-            # 使用流式API
-            full_content = ""
-            with self.client.chat.completions.create(
-                model=self.config.OPENAI_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                response_format={"type": "json_object"},
-                stream=True
-            ) as stream:
-                for chunk in stream:
-                    if chunk.choices[0].delta.content:
-                        content = chunk.choices[0].delta.content
-                        full_content += content
-                        if on_chunk:
-                            on_chunk(content)
-            
-            result = json.loads(full_content)
-            
-            source_chunk_ids = [f"chunk_{i}" for i in range(len(relevant_chunks))]
-            
-            question = Question(
-                question_id=hashlib.md5(result["statement"].encode()).hexdigest()[:12],
-                question_type="true_false",
-                content=result["statement"],
-                options=["True", "False"],
-                correct_answer=result["correct_answer"],
-                explanation=result["explanation"],
-                difficulty=difficulty,
-                source_chunks=source_chunk_ids,
-                tags=["true_false", difficulty],
-                metadata={
-                    "statement": result["statement"],
-                    "source": "generated_stream"
-                }
-            )
-            
-            return question
-        except Exception as e:
-            # 备选真假题
-            fallback_statements = [
-                "机器学习是人工智能的一个重要分支。",
-                "所有监督学习算法都需要标记数据。",
-                "过拟合发生在模型过于复杂时。",
-                "准确率是评估分类模型的唯一指标。",
-                "交叉验证是一种评估模型的技术。"
-            ]
-            
-            statement = random.choice(fallback_statements)
-            
-            question = Question(
-                question_id=hashlib.md5(statement.encode()).hexdigest()[:12],
-                question_type="true_false",
-                content=statement,
-                options=["True", "False"],
-                correct_answer="True",
-                explanation="这是一个真命题。",
-                difficulty=difficulty,
-                source_chunks=[f"chunk_{i}" for i in range(len(relevant_chunks))],
-                tags=["true_false", difficulty],
-                metadata={"source": "fallback"}
-            )
-            
-            return question
\ No newline at end of file
+        return response.choices[0].message.content.strip()
+
+
+def _load_json(content: str) -> Dict:
+    """解析LLM输出的JSON，兼容前后夹带说明文字或代码块标记的情况"""
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        start, end = content.find("{"), content.rfind("}")
+        if start == -1 or end <= start:
+            raise
+        return json.loads(content[start:end + 1])
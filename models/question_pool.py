@@ -0,0 +1,71 @@
+import random
+from typing import List, Optional
+from models import Question
+
+DIFFICULTY_ORDER = {"easy": 0, "medium": 1, "hard": 2}
+
+
+class SharedQuestionPool:
+    """按资料内容哈希共享的题目池
+
+    同一份资料（如课堂上全班加载的同一个PDF）生成的题目进入共享池，
+    其他用户优先从池中抽题，只为缺少的部分调用LLM，
+    使LLM开销随不同资料数增长而不是随用户数增长。
+    每个用户已抽到过的题目会被记录，不会重复出现。
+    """
+
+    def __init__(self, store, rng: Optional[random.Random] = None):
+        self.store = store
+        self.rng = rng or random.Random()
+        self.drawn = 0      # 从池中抽取的题目数
+        self.generated = 0  # 新生成并加入池中的题目数
+
+    def draw(
+        self,
+        material: str,
+        user_id: str,
+        num_questions: int,
+        question_types: List[str]
+    ) -> List[Question]:
+        """抽取用户未见过的题目，按难度从易到难排列"""
+        try:
+            seen = self.store.load_served_question_ids(user_id, material)
+            candidates = self.store.load_pool_questions(material, question_types, exclude_ids=seen)
+        except Exception as e:
+            print(f"Failed to load shared question pool: {e}")
+            return []
+
+        questions = self.rng.sample(candidates, min(num_questions, len(candidates)))
+        questions = [Question(**q) for q in questions]
+        questions.sort(key=lambda q: DIFFICULTY_ORDER.get(q.difficulty, 1))
+        self.drawn += len(questions)
+        return questions
+
+    def add(self, material: str, questions: List[Question]):
+        """将新生成的题目加入资料的共享池"""
+        if not questions:
+            return
+        self.generated += len(questions)
+        try:
+            self.store.save_pool_questions(material, questions)
+        except Exception as e:
+            print(f"Failed to save questions to shared pool: {e}")
+
+    def mark_served(self, material: str, user_id: str, questions: List[Question]):
+        """记录用户已抽到的题目（防止重复）"""
+        if not questions:
+            return
+        try:
+            self.store.mark_questions_served(
+                user_id, material, [q.question_id for q in questions]
+            )
+        except Exception as e:
+            print(f"Failed to record served questions: {e}")
+
+    def stats(self) -> dict:
+        total = self.drawn + self.generated
+        return {
+            "drawn": self.drawn,
+            "generated": self.generated,
+            "pool_hit_rate": self.drawn / total if total else 0.0
+        }
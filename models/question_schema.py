@@ -0,0 +1,251 @@
+import difflib
+import re
+from typing import Any, Dict, List, Set, Union
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from models import Chunk, Question
+from models.question_dedup import content_hash
+from models.rubric_matcher import compile_rubric
+
+# 紧凑传输格式：LLM只输出短键，在本地展开为完整的Question
+# multiple_choice: {"q": 问题, "o": [选项], "a": 正确选项下标, "e": 解释, "t": [标签]}
+# short_answer:    {"q": 问题, "r": 参考答案, "c": [评分要点], "k": [[要点关键词及同义词]], "e": 解释, "t": [标签]}
+# true_false:      {"s": 陈述, "a": true/false, "e": 解释}
+
+NUM_OPTIONS = 4
+_OPTION_LABEL = re.compile(r"^\s*[A-Da-d][.、:：)）]\s*")
+_TRUE_WORDS = {"true", "t", "1", "对", "是", "正确", "yes"}
+_FALSE_WORDS = {"false", "f", "0", "错", "否", "错误", "no"}
+
+
+class QuestionValidationError(ValueError):
+    """LLM输出不符合题型格式，且修复后仍无效"""
+
+    def __init__(self, question_type: str, fields: Set[str]):
+        super().__init__(f"Invalid {question_type} question fields: {sorted(fields)}")
+        self.question_type = question_type
+        self.fields = fields
+
+
+class MultipleChoicePayload(BaseModel):
+    q: str = Field(min_length=1)
+    o: List[str] = Field(min_length=NUM_OPTIONS, max_length=NUM_OPTIONS)
+    a: Union[int, str]
+    e: str = ""
+    t: List[str] = []
+
+    @field_validator("o")
+    @classmethod
+    def options_distinct(cls, options: List[str]) -> List[str]:
+        if any(not option.strip() for option in options) or len(set(options)) != len(options):
+            raise ValueError("options must be non-empty and distinct")
+        return options
+
+    @field_validator("a")
+    @classmethod
+    def answer_in_options(cls, answer, info):
+        options = info.data.get("o")
+        if options is None:
+            return answer  # 选项本身无效，先修复选项
+        if isinstance(answer, str) and answer.strip().isdigit():
+            answer = int(answer)
+        if isinstance(answer, int) and 0 <= answer < len(options):
+            return answer
+        if isinstance(answer, str) and answer in options:
+            return options.index(answer)
+        raise ValueError("answer does not match any option")
+
+
+class ShortAnswerPayload(BaseModel):
+    q: str = Field(min_length=1)
+    r: str = Field(min_length=1)
+    c: List[str] = []
+    k: List[List[str]] = []
+    e: str = ""
+    t: List[str] = []
+
+    @field_validator("k", mode="before")
+    @classmethod
+    def lenient_keywords(cls, keywords):
+        """关键词只用于本地预评分，格式不对时尽量保留而不触发修复"""
+        if not isinstance(keywords, list):
+            return []
+        groups = []
+        for group in keywords:
+            group = [group] if isinstance(group, str) else group
+            groups.append([str(k) for k in group if isinstance(k, (str, int))] if isinstance(group, list) else [])
+        return groups
+
+
+class TrueFalsePayload(BaseModel):
+    s: str = Field(min_length=1)
+    a: bool
+    e: str = ""
+
+
+PAYLOAD_MODELS = {
+    "multiple_choice": MultipleChoicePayload,
+    "short_answer": ShortAnswerPayload,
+    "true_false": TrueFalsePayload
+}
+
+# 定向修复时告知模型各字段的要求
+FIELD_REQUIREMENTS = {
+    ("multiple_choice", "q"): "题干文本",
+    ("multiple_choice", "o"): f"恰好{NUM_OPTIONS}个互不相同的选项文本组成的数组，其中一个是正确答案",
+    ("multiple_choice", "a"): f"正确选项在o中的下标（0-{NUM_OPTIONS - 1}的整数）",
+    ("short_answer", "q"): "题干文本",
+    ("short_answer", "r"): "参考答案文本",
+    ("short_answer", "c"): "评分要点文本组成的数组",
+    ("true_false", "s"): "需要判断真假的陈述句",
+    ("true_false", "a"): "陈述是否正确，true或false"
+}
+
+
+def invalid_fields(question_type: str, data: Dict[str, Any]) -> Set[str]:
+    """校验紧凑格式数据，返回无效或缺失的字段名"""
+    try:
+        PAYLOAD_MODELS[question_type].model_validate(data)
+    except ValidationError as e:
+        return {str(error["loc"][0]) for error in e.errors() if error["loc"]}
+    return set()
+
+
+def validate_payload(question_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """校验并规范化紧凑格式数据（选择题答案统一为下标）"""
+    if question_type not in PAYLOAD_MODELS:
+        raise ValueError(f"Unknown question type: {question_type}")
+    try:
+        return PAYLOAD_MODELS[question_type].model_validate(data).model_dump()
+    except ValidationError as e:
+        fields = {str(error["loc"][0]) for error in e.errors() if error["loc"]}
+        raise QuestionValidationError(question_type, fields) from e
+
+
+def repair_locally(question_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """不调用LLM的修复：选项格式、答案字母或文本与选项模糊匹配、真假值文本"""
+    data = dict(data)
+    if question_type == "multiple_choice":
+        options = data.get("o")
+        if isinstance(options, dict):
+            options = list(options.values())
+        if isinstance(options, list):
+            options = [_OPTION_LABEL.sub("", str(option)).strip() for option in options]
+            data["o"] = options
+            data["a"] = _match_option(options, data.get("a"))
+            # 选项过多时保留正确答案和前几个干扰项
+            if len(options) > NUM_OPTIONS and isinstance(data["a"], int):
+                answer = options[data["a"]]
+                kept = [o for o in options if o != answer][:NUM_OPTIONS - 1] + [answer]
+                kept.sort(key=options.index)
+                data["o"], data["a"] = kept, kept.index(answer)
+
+    elif question_type == "true_false":
+        answer = data.get("a")
+        if isinstance(answer, str):
+            word = answer.strip().lower()
+            if word in _TRUE_WORDS:
+                data["a"] = True
+            elif word in _FALSE_WORDS:
+                data["a"] = False
+    return data
+
+
+def _match_option(options: List[str], answer: Any) -> Any:
+    """将答案字母、带标签的文本或近似文本解析为选项下标，无法匹配时原样返回"""
+    if not isinstance(answer, str):
+        return answer
+    text = answer.strip()
+    if text.isdigit():
+        return int(text)
+    if len(text) == 1 and text.upper() in "ABCD" and "ABCD".index(text.upper()) < len(options):
+        return "ABCD".index(text.upper())
+    text = _OPTION_LABEL.sub("", text).strip()
+    if text in options:
+        return options.index(text)
+    matches = difflib.get_close_matches(text, options, n=1, cutoff=0.6)
+    return options.index(matches[0]) if matches else answer
+
+
+def _option_answer(options: List[str], answer: Any) -> str:
+    """将选项下标还原为选项文本；模型直接返回文本时原样保留"""
+    if isinstance(answer, int) and not isinstance(answer, bool) and 0 <= answer < len(options):
+        return options[answer]
+    if isinstance(answer, str) and answer.strip().isdigit() and int(answer) < len(options):
+        return options[int(answer)]
+    return str(answer)
+
+
+def _bool_answer(answer: Any) -> str:
+    if isinstance(answer, str):
+        return "True" if answer.strip().lower() in ("true", "t", "1", "对", "是") else "False"
+    return "True" if answer else "False"
+
+
+def expand_question(
+    question_type: str,
+    data: Dict[str, Any],
+    difficulty: str,
+    relevant_chunks: List[Chunk],
+    generation_method: str
+) -> Question:
+    """将紧凑格式的LLM输出展开为完整的Question"""
+    if question_type == "multiple_choice":
+        options = data["o"]
+        correct_answer = _option_answer(options, data["a"])
+        return Question(
+            question_id=content_hash("multiple_choice", data["q"], options, correct_answer),
+            question_type="multiple_choice",
+            content=data["q"],
+            options=options,
+            correct_answer=correct_answer,
+            explanation=data.get("e", ""),
+            difficulty=difficulty,
+            source_chunks=[chunk.text for chunk in relevant_chunks],
+            tags=data.get("t", []),
+            metadata={"generation_method": generation_method}
+        )
+
+    if question_type == "short_answer":
+        question = Question(
+            question_id=content_hash("short_answer", data["q"], [], data["r"]),
+            question_type="short_answer",
+            content=data["q"],
+            options=[],  # 简答题无选项
+            correct_answer=data["r"],
+            explanation=data.get("e", ""),
+            difficulty=difficulty,
+            source_chunks=[chunk.text for chunk in relevant_chunks],
+            tags=data.get("t", []),
+            metadata={
+                "scoring_criteria": data.get("c", []),
+                "rubric_keywords": data.get("k", []),
+                "generation_method": generation_method
+            }
+        )
+        # 出题时即编译评分要点自动机，评分时直接使用
+        compile_rubric(question)
+        return question
+
+    if question_type == "true_false":
+        statement = data["s"]
+        correct_answer = _bool_answer(data["a"])
+        return Question(
+            question_id=content_hash("true_false", statement, ["True", "False"], correct_answer),
+            question_type="true_false",
+            content=statement,
+            options=["True", "False"],
+            correct_answer=correct_answer,
+            explanation=data.get("e", ""),
+            difficulty=difficulty,
+            source_chunks=[f"chunk_{i}" for i in range(len(relevant_chunks))],
+            tags=["true_false", difficulty],
+            metadata={
+                "statement": statement,
+                "source": "generated_stream" if generation_method == "llm_stream" else "generated",
+                "generation_method": generation_method,
+                # source_chunks只记录片段序号，两阶段生成的解析需要原文
+                "source_text": [chunk.text for chunk in relevant_chunks]
+            }
+        )
+
+    raise ValueError(f"Unknown question type: {question_type}")
@@ -0,0 +1,228 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Optional
+from models.work_scheduler import FairWorkQueue, Waiter, current_work
+
+
+class TokenBucket:
+    """按分钟配额匀速补充的令牌桶"""
+
+    def __init__(self, capacity_per_minute: float):
+        self.capacity = float(capacity_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """距离可以取出amount个令牌还需等待的秒数"""
+        self._refill(now)
+        # 单次请求超过桶容量时按满桶处理，避免永久等待
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        # 允许透支，透支部分由后续补充抵消
+        self.tokens -= amount
+
+
+@dataclass
+class LimiterTicket:
+    """一次LLM调用占用的并发槽位"""
+    estimated_tokens: int
+    queue_wait: float  # 排队等待时间（秒）
+    started_at: float
+
+
+class AdaptiveRateLimiter:
+    """LLM客户端限流器
+
+    组合两类限制：
+    1. 令牌桶：每分钟请求数(RPM)和每分钟token数(TPM)
+    2. AIMD并发窗口：成功且延迟正常时加性增加并发上限，
+       遇到429或延迟超过目标时乘性减小
+    
+    排队的调用按优先级类别和用户公平出队（见work_scheduler），
+    类别和用户取自调用方上下文中的llm_work声明；声明中带Promotion的调用
+    在排队期间可被等待方提升到更高的类别。
+    """
+
+    RATE_LIMIT_BACKOFF = 0.5   # 429时的并发缩减系数
+    LATENCY_BACKOFF = 0.8      # 延迟超标时的并发缩减系数
+    WAIT_HISTORY_SIZE = 512
+
+    def __init__(
+        self,
+        requests_per_minute: int = 60,
+        tokens_per_minute: int = 100000,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        latency_target: float = 15.0,
+        initial_concurrency: Optional[int] = None
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.latency_target = latency_target
+        self.concurrency_limit = float(initial_concurrency or self.max_concurrency)
+
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        self._queue = FairWorkQueue()
+
+        # 统计
+        self._waits = deque(maxlen=self.WAIT_HISTORY_SIZE)
+        self._total_calls = 0
+        self._total_wait = 0.0
+        self._rate_limited = 0
+
+    @classmethod
+    def from_config(cls, config) -> "AdaptiveRateLimiter":
+        """根据配置创建限流器"""
+        return cls(
+            requests_per_minute=config.LLM_REQUESTS_PER_MINUTE,
+            tokens_per_minute=config.LLM_TOKENS_PER_MINUTE,
+            max_concurrency=config.LLM_MAX_CONCURRENCY,
+            latency_target=config.LLM_LATENCY_TARGET
+        )
+
+    def acquire(self, estimated_tokens: int = 0, timeout: Optional[float] = None) -> LimiterTicket:
+        """阻塞直到轮到本调用出队并获得并发槽位和足够的令牌，超过timeout秒抛出TimeoutError"""
+        work = current_work()
+        waiter = Waiter(work)
+        enqueued_at = waiter.enqueued_at
+        expires_at = enqueued_at + timeout if timeout is not None else None
+
+        def on_promote(priority):
+            with self._condition:
+                if self._queue.promote(waiter, priority):
+                    self._condition.notify_all()
+
+        with self._condition:
+            if work.promotion is not None:
+                promoted = work.promotion.subscribe(on_promote)
+                if promoted is not None and promoted < waiter.priority:
+                    waiter.priority = promoted
+            self._queue.push(waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = 0.0
+                    is_head = self._queue.head() is waiter
+                    if is_head:
+                        wait = max(
+                            self.request_bucket.time_until(1, now),
+                            self.token_bucket.time_until(estimated_tokens, now)
+                        )
+                        if self.in_flight < int(self.concurrency_limit) and wait <= 0:
+                            break
+                    if expires_at is not None:
+                        if now >= expires_at:
+                            raise TimeoutError("Timed out waiting for LLM rate limiter")
+                        wait = min(wait, expires_at - now) if wait > 0 else expires_at - now
+                    # 未轮到或并发已满时等待通知，令牌不足时等待补充
+                    self._condition.wait(timeout=wait if wait > 0 else None)
+            except BaseException:
+                self._queue.remove(waiter)
+                self._condition.notify_all()
+                raise
+            finally:
+                if work.promotion is not None:
+                    work.promotion.unsubscribe(on_promote)
+
+            self._queue.remove(waiter, admitted=True)
+            self._condition.notify_all()  # 新的队首重新检查
+            self.in_flight += 1
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(estimated_tokens)
+
+            started_at = time.monotonic()
+            queue_wait = started_at - enqueued_at
+            self._waits.append(queue_wait)
+            self._total_calls += 1
+            self._total_wait += queue_wait
+
+        return LimiterTicket(
+            estimated_tokens=estimated_tokens,
+            queue_wait=queue_wait,
+            started_at=started_at
+        )
+
+    def release(
+        self,
+        ticket: LimiterTicket,
+        latency: Optional[float] = None,
+        rate_limited: bool = False,
+        actual_tokens: Optional[int] = None
+    ):
+        """释放槽位，并根据调用结果调整并发上限"""
+        now = time.monotonic()
+        if latency is None:
+            latency = now - ticket.started_at
+
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - 1)
+
+            # 用真实用量修正预估值
+            if actual_tokens is not None:
+                self.token_bucket.consume(actual_tokens - ticket.estimated_tokens)
+
+            if rate_limited:
+                self._rate_limited += 1
+                self._decrease(self.RATE_LIMIT_BACKOFF, now)
+            elif latency > self.latency_target:
+                self._decrease(self.LATENCY_BACKOFF, now)
+            else:
+                # 加性增加：每个完整窗口约增加1
+                self.concurrency_limit = min(
+                    float(self.max_concurrency),
+                    self.concurrency_limit + 1.0 / max(self.concurrency_limit, 1.0)
+                )
+
+            self._condition.notify_all()
+
+    def _decrease(self, factor: float, now: float):
+        """乘性减小，同一个延迟窗口内只减一次，避免并发请求同时失败时过度收缩"""
+        if now - self._last_decrease < self.latency_target:
+            return
+        self._last_decrease = now
+        self.concurrency_limit = max(
+            float(self.min_concurrency),
+            self.concurrency_limit * factor
+        )
+
+    @contextmanager
+    def slot(self, estimated_tokens: int = 0):
+        """上下文管理器形式的acquire/release"""
+        ticket = self.acquire(estimated_tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> Dict:
+        """限流统计：排队等待时间、当前并发上限等"""
+        with self._condition:
+            waits = sorted(self._waits)
+            return {
+                "total_calls": self._total_calls,
+                "in_flight": self.in_flight,
+                "concurrency_limit": round(self.concurrency_limit, 2),
+                "rate_limited": self._rate_limited,
+                "avg_queue_wait": self._total_wait / self._total_calls if self._total_calls else 0.0,
+                "p95_queue_wait": waits[int(len(waits) * 0.95) - 1] if waits else 0.0,
+                "max_queue_wait": waits[-1] if waits else 0.0,
+                "queues": self._queue.stats()
+            }
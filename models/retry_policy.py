@@ -0,0 +1,72 @@
+import random
+import threading
+from collections import deque
+from typing import Optional
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    RateLimitError
+)
+
+
+class RetryPolicy:
+    """LLM调用重试策略：带抖动的指数退避 + 单次调用截止时间"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        deadline: Optional[float] = None
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline  # 单次调用（含重试）的总时限（秒）
+
+    @classmethod
+    def from_config(cls, config) -> "RetryPolicy":
+        """根据配置创建重试策略"""
+        return cls(
+            max_attempts=config.RETRY_LIMIT,
+            base_delay=config.LLM_RETRY_BASE_DELAY,
+            max_delay=config.LLM_RETRY_MAX_DELAY,
+            deadline=config.LLM_CALL_DEADLINE
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """第attempt次失败后的等待时间（full jitter）"""
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """只重试瞬时错误：限流、超时、连接失败和5xx"""
+        if isinstance(error, (RateLimitError, APITimeoutError, APIConnectionError)):
+            return True
+        if isinstance(error, APIStatusError):
+            return error.status_code >= 500
+        return False
+
+
+class LatencyTracker:
+    """滑动窗口延迟统计，用于确定对冲请求的触发阈值"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """样本不足时返回None"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * p))
+        return ordered[index]
@@ -0,0 +1,173 @@
+import re
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from models import Question
+from models.question_dedup import normalize_text
+
+# 评分要点开头的动词（"提到……"、"能够说明……"），不作为关键词
+_CRITERION_PREFIX = re.compile(
+    r"^(能够|能|正确地?|准确地?|清楚地?)?"
+    r"(提到|提及|指出|说明|解释|阐述|描述|列举|给出|写出|涉及|包含|理解|区分|举例说明)?"
+)
+_TERM_SEPARATORS = re.compile(r"[，,、；;。.和与及或/（）()\s]+")
+MIN_TERM_LENGTH = 2
+# 否定词：embedding相似度和关键词匹配都对否定不敏感
+_NEGATION_PATTERN = re.compile(r"不|没|无|非|未|否|勿|\b(?:not|no|never|none|cannot)\b|n't")
+
+
+class AhoCorasick:
+    """多模式串匹配自动机：一次扫描文本找出全部出现的模式串"""
+
+    def __init__(self, patterns: Dict[str, Set]):
+        """
+        Args:
+            patterns: 模式串 -> 命中时输出的标签集合
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Set] = [set()]
+
+        for pattern, labels in patterns.items():
+            node = 0
+            for char in pattern:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(set())
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            self._output[node] |= set(labels)
+
+        # 按BFS顺序构建失配指针，并合并后缀节点的输出
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] |= self._output[self._fail[child]]
+
+    def find(self, text: str) -> Set:
+        """文本中出现的全部模式串的标签"""
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            found |= self._output[node]
+        return found
+
+
+def negation_count(text: str) -> int:
+    """文本中否定词的个数，用于识别"表现较差"/"表现也不差"这类否定改写"""
+    return len(_NEGATION_PATTERN.findall((text or "").lower()))
+
+
+def criterion_terms(criterion: str) -> List[List[str]]:
+    """从评分要点文本中拆出关键词，每个关键词单独成组"""
+    text = _CRITERION_PREFIX.sub("", criterion.strip())
+    terms = [normalize_text(term) for term in _TERM_SEPARATORS.split(text)]
+    return [[term] for term in terms if len(term) >= MIN_TERM_LENGTH]
+
+
+@dataclass
+class RubricMatch:
+    score: float  # 0-100，按要点命中比例给出的部分得分
+    hit: List[str] = field(default_factory=list)     # 命中的评分要点
+    missed: List[str] = field(default_factory=list)  # 未命中的评分要点
+
+    @property
+    def complete(self) -> bool:
+        return not self.missed
+
+
+class RubricMatcher:
+    """评分要点的关键词自动机
+
+    每个评分要点对应若干关键词组，组内为同义词（命中任意一个即算该组命中）。
+    要点得分为命中组数的比例，命中一半以上的组视为命中该要点；
+    总分为各要点得分的平均值。
+    """
+
+    HIT_RATIO = 0.5
+
+    def __init__(self, criteria: List[str], keywords: Optional[List[List[str]]] = None):
+        """
+        Args:
+            criteria: 评分要点文本
+            keywords: 与criteria一一对应的关键词及同义词（出题时由模型给出），
+                缺失时从要点文本中拆分关键词
+        """
+        keywords = keywords or []
+        self.criteria: List[str] = []
+        self.groups: List[int] = []  # 每个要点的关键词组数
+        patterns: Dict[str, Set[Tuple[int, int]]] = {}
+
+        for i, criterion in enumerate(criteria):
+            synonyms = keywords[i] if i < len(keywords) else []
+            synonyms = [synonyms] if isinstance(synonyms, str) else synonyms
+            synonyms = [normalize_text(str(k)) for k in synonyms]
+            synonyms = [k for k in synonyms if k]
+            groups = [synonyms] if synonyms else criterion_terms(criterion)
+            if not groups:
+                continue  # 无法提取关键词的要点只能由LLM评分
+
+            index = len(self.criteria)
+            self.criteria.append(criterion)
+            self.groups.append(len(groups))
+            for g, alternatives in enumerate(groups):
+                for term in alternatives:
+                    patterns.setdefault(term, set()).add((index, g))
+
+        self._automaton = AhoCorasick(patterns)
+
+    def match(self, answer: str) -> RubricMatch:
+        found = self._automaton.find(normalize_text(answer))
+        matched_groups = [0] * len(self.criteria)
+        for criterion, _ in found:
+            matched_groups[criterion] += 1
+
+        result = RubricMatch(score=0.0)
+        credits = []
+        for criterion, total, matched in zip(self.criteria, self.groups, matched_groups):
+            credit = matched / total
+            credits.append(credit)
+            (result.hit if credit >= self.HIT_RATIO else result.missed).append(criterion)
+        result.score = round(100 * sum(credits) / len(credits), 1) if credits else 0.0
+        return result
+
+
+_compiled: "OrderedDict[str, Optional[RubricMatcher]]" = OrderedDict()
+_compiled_lock = threading.Lock()
+MAX_COMPILED = 4096
+
+
+def compile_rubric(question: Question) -> Optional[RubricMatcher]:
+    """编译（或取出已编译的）简答题评分要点自动机，没有可用要点时返回None
+
+    自动机按题目ID缓存在进程内；题目元数据只保存可序列化的要点和关键词，
+    从题库或共享池加载的题目在首次评分时编译。
+    """
+    if question.question_type != "short_answer":
+        return None
+    with _compiled_lock:
+        if question.question_id in _compiled:
+            _compiled.move_to_end(question.question_id)
+            return _compiled[question.question_id]
+
+    criteria = [str(c) for c in question.metadata.get("scoring_criteria", []) if str(c).strip()]
+    matcher = RubricMatcher(criteria, question.metadata.get("rubric_keywords")) if criteria else None
+    if matcher is not None and not matcher.criteria:
+        matcher = None
+
+    with _compiled_lock:
+        _compiled[question.question_id] = matcher
+        if len(_compiled) > MAX_COMPILED:
+            _compiled.popitem(last=False)
+    return matcher
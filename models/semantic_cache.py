@@ -0,0 +1,111 @@
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+import numpy as np
+
+
+class _Partition:
+    """一个分区内的缓存键向量矩阵和对应的值，满后按先进先出覆盖"""
+
+    def __init__(self, dim: int, capacity: int):
+        self.keys = np.zeros((capacity, dim), dtype=np.float32)
+        self.values = [None] * capacity
+        self.size = 0
+        self.next = 0
+
+    def nearest(self, vector: np.ndarray):
+        """余弦相似度最高的条目（向量已归一化，点积即余弦）"""
+        if self.size == 0:
+            return None, 0.0
+        scores = self.keys[:self.size] @ vector
+        best = int(np.argmax(scores))
+        return self.values[best], float(scores[best])
+
+    def put(self, vector: np.ndarray, value: Any):
+        self.keys[self.next] = vector
+        self.values[self.next] = value
+        self.next = (self.next + 1) % len(self.values)
+        self.size = min(self.size + 1, len(self.values))
+
+
+class SemanticCache:
+    """按embedding相似度命中的语义缓存
+
+    精确键缓存无法命中修订版讲义、同义改写的答案这类近似相同的请求。
+    缓存键为请求文本的embedding，与已缓存键的余弦相似度不低于threshold即命中。
+    每个调用点使用各自的实例和阈值；partition用于隔离不可互相命中的请求
+    （如不同题目的答案）。
+    """
+
+    def __init__(
+        self,
+        embedder,
+        threshold: float,
+        name: str = "",
+        capacity: int = 256,
+        max_partitions: int = 1024
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.name = name
+        self.capacity = capacity
+        self.max_partitions = max_partitions
+        self._partitions: "OrderedDict[str, _Partition]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embedder.embed([text])[0]
+
+    def get(
+        self,
+        text: str,
+        partition: str = "",
+        vector: Optional[np.ndarray] = None,
+        accept: Optional[Callable[[Any], bool]] = None
+    ):
+        """查找近似相同的已缓存请求，未命中返回None；返回值为副本
+        
+        Args:
+            accept: 可选，对相似度达到阈值的缓存值做额外校验，返回False时视为未命中
+        """
+        if vector is None:
+            vector = self.embed(text)
+        with self._lock:
+            self.lookups += 1
+            entries = self._partitions.get(partition)
+            if entries is None:
+                return None
+            self._partitions.move_to_end(partition)
+            value, score = entries.nearest(vector)
+            if value is None or score < self.threshold:
+                return None
+            if accept is not None and not accept(value):
+                return None
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def put(self, text: str, value: Any, partition: str = "", vector: Optional[np.ndarray] = None):
+        """缓存请求结果"""
+        if vector is None:
+            vector = self.embed(text)
+        with self._lock:
+            entries = self._partitions.get(partition)
+            if entries is None:
+                entries = self._partitions[partition] = _Partition(len(vector), self.capacity)
+                if len(self._partitions) > self.max_partitions:
+                    self._partitions.popitem(last=False)
+            self._partitions.move_to_end(partition)
+            entries.put(vector, copy.deepcopy(value))
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "entries": sum(p.size for p in self._partitions.values())
+        }
@@ -0,0 +1,67 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+
+def request_key(kwargs: Dict) -> str:
+    """请求键：对请求参数（不含超时）做规范化JSON后取哈希"""
+    payload = {k: v for k, v in kwargs.items() if k != "timeout"}
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class SingleFlight:
+    """合并相同键的并发调用：进行中的请求只执行一次，其余调用方共享结果
+
+    请求完成后立即移除，之后的调用会重新执行（不做结果缓存）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self.executed = 0   # 实际执行的调用数
+        self.coalesced = 0  # 被合并（共享结果）的调用数
+
+    def _join(self, key: Hashable):
+        """返回(future, 是否为首个调用方)"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+            self.executed += 1
+            return future, True
+
+    def _settle(self, key: Hashable, future: Future, result: Any = None, error: BaseException = None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """同步调用：相同键的并发调用只执行一次fn"""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight)
+            }
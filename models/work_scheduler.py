@@ -0,0 +1,151 @@
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Callable, Dict, List, Optional
+
+
+class Priority(IntEnum):
+    """LLM调用的优先级类别，数值越小越优先"""
+    INTERACTIVE = 0    # 用户正在等待的评分
+    NEXT_QUESTION = 1  # 即将展示的题目、资料处理
+    BACKGROUND = 2     # 后台预生成、解析补全
+
+
+class Promotion:
+    """可提升的优先级：等待后台任务结果的调用方把任务中排队的LLM调用提升到自己的类别
+
+    后台任务在llm_work中带上Promotion，限流器排队时订阅；
+    调用方promote后，仍在排队的调用立即移到更高优先级的队列。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.priority: Optional[Priority] = None
+        self._listeners: List[Callable[[Priority], None]] = []
+
+    def promote(self, priority: Priority):
+        """提升到priority；已经不低于该优先级时不变"""
+        with self._lock:
+            if self.priority is not None and self.priority <= priority:
+                return
+            self.priority = priority
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(priority)
+
+    def subscribe(self, listener: Callable[[Priority], None]) -> Optional[Priority]:
+        """订阅提升通知，返回当前已提升到的优先级"""
+        with self._lock:
+            self._listeners.append(listener)
+            return self.priority
+
+    def unsubscribe(self, listener: Callable[[Priority], None]):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+
+@dataclass(frozen=True)
+class WorkContext:
+    priority: Priority = Priority.NEXT_QUESTION
+    user_id: str = ""
+    promotion: Optional[Promotion] = None
+
+
+_current_work: contextvars.ContextVar[WorkContext] = contextvars.ContextVar(
+    "llm_work", default=WorkContext()
+)
+
+
+def current_work() -> WorkContext:
+    return _current_work.get()
+
+
+@contextmanager
+def llm_work(priority: Priority, user_id: Optional[str] = None, promotion: Optional[Promotion] = None):
+    """在上下文中声明后续LLM调用的优先级类别和所属用户，promotion允许等待方提升优先级"""
+    reset = _current_work.set(WorkContext(priority, user_id or "", promotion))
+    try:
+        yield
+    finally:
+        _current_work.reset(reset)
+
+
+class Waiter:
+    """排队中的一次LLM调用"""
+
+    __slots__ = ("priority", "user_id", "enqueued_at")
+
+    def __init__(self, work: WorkContext):
+        self.priority = work.priority
+        self.user_id = work.user_id
+        self.enqueued_at = time.monotonic()
+
+
+class FairWorkQueue:
+    """优先级 + 按用户公平排队
+
+    不同类别之间严格按优先级出队；同一类别内按用户轮转，
+    避免某个用户的批量请求挤占其他用户。调用方负责加锁。
+    """
+
+    WAIT_HISTORY_SIZE = 512
+
+    def __init__(self):
+        self._queues: Dict[Priority, "OrderedDict[str, deque]"] = {p: OrderedDict() for p in Priority}
+        self._waits: Dict[Priority, deque] = {p: deque(maxlen=self.WAIT_HISTORY_SIZE) for p in Priority}
+        self._served: Dict[Priority, int] = {p: 0 for p in Priority}
+
+    def push(self, waiter: Waiter):
+        self._queues[waiter.priority].setdefault(waiter.user_id, deque()).append(waiter)
+
+    def promote(self, waiter: Waiter, priority: Priority) -> bool:
+        """把仍在排队的调用移到更高优先级的类别，排在该类别中同一用户的最后"""
+        queue = self._queues[waiter.priority].get(waiter.user_id)
+        if priority >= waiter.priority or queue is None or waiter not in queue:
+            return False
+        self.remove(waiter)
+        waiter.priority = priority
+        self.push(waiter)
+        return True
+
+    def head(self) -> Optional[Waiter]:
+        """下一个应当出队的调用：最高优先级类别中轮到的用户的最早请求"""
+        for priority in Priority:
+            users = self._queues[priority]
+            if users:
+                return next(iter(users.values()))[0]
+        return None
+
+    def remove(self, waiter: Waiter, admitted: bool = False):
+        """移除排队者；被放行时记录等待时间，并把该用户轮转到队尾"""
+        users = self._queues[waiter.priority]
+        queue = users.get(waiter.user_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        if not queue:
+            del users[waiter.user_id]
+        elif admitted:
+            users.move_to_end(waiter.user_id)
+
+        if admitted:
+            self._waits[waiter.priority].append(time.monotonic() - waiter.enqueued_at)
+            self._served[waiter.priority] += 1
+
+    def stats(self) -> Dict[str, Dict]:
+        """各类别的排队深度和等待时间"""
+        result = {}
+        for priority in Priority:
+            waits = sorted(self._waits[priority])
+            result[priority.name.lower()] = {
+                "depth": sum(len(q) for q in self._queues[priority].values()),
+                "served": self._served[priority],
+                "avg_wait": sum(waits) / len(waits) if waits else 0.0,
+                "p95_wait": waits[max(0, int(len(waits) * 0.95) - 1)] if waits else 0.0
+            }
+        return result
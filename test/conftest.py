@@ -1,10 +1,14 @@
 import pytest
 import sys
 import os
+from dataclasses import asdict
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from models import EvaluationResult, Question
+from models.question_dedup import content_hash
+
 
 def pytest_configure(config):
     """配置 pytest"""
@@ -19,6 +23,86 @@ def pytest_configure(config):
     )
 
 
+@pytest.fixture
+def make_question():
+    """题目工厂：默认是一道选择题，按需覆盖字段；不指定question_id时按内容哈希生成"""
+    def factory(question_id: str = None, **fields) -> Question:
+        values = dict(
+            question_type="multiple_choice", content=f"题目{question_id or ''}",
+            options=["A", "B"], correct_answer="A", explanation="解析",
+            difficulty="medium", source_chunks=[], tags=[], metadata={}
+        )
+        values.update(fields)
+        if question_id is None:
+            question_id = content_hash(
+                values["question_type"], values["content"], values["options"], values["correct_answer"]
+            )
+        return Question(question_id=question_id, **values)
+    return factory
+
+
+@pytest.fixture
+def make_result():
+    """评估结果工厂：60分及以上判为正确，按需覆盖字段"""
+    def factory(score: int = 80, **fields) -> EvaluationResult:
+        values = dict(
+            is_correct=score >= 60, feedback="反馈", detailed_explanation="解释",
+            suggested_improvement="", confidence_score=0.9, mistakes=[]
+        )
+        values.update(fields)
+        return EvaluationResult(score=score, **values)
+    return factory
+
+
+class InMemoryPoolStore:
+    """共享题目池的内存store"""
+
+    def __init__(self):
+        self.pool = {}
+        self.served = {}
+
+    def save_pool_questions(self, material, questions):
+        for q in questions:
+            self.pool.setdefault(material, {}).setdefault(q.question_id, asdict(q))
+
+    def load_pool_questions(self, material, question_types, exclude_ids=None):
+        return [
+            q for q in self.pool.get(material, {}).values()
+            if q["question_type"] in question_types and q["question_id"] not in (exclude_ids or [])
+        ]
+
+    def load_served_question_ids(self, user_id, material):
+        return list(self.served.get((user_id, material), set()))
+
+    def mark_questions_served(self, user_id, material, question_ids):
+        self.served.setdefault((user_id, material), set()).update(question_ids)
+
+
+@pytest.fixture
+def pool_store():
+    """空的共享题目池store"""
+    return InMemoryPoolStore()
+
+
+class InMemoryEvaluationStore:
+    """评分缓存的内存store"""
+
+    def __init__(self):
+        self.results = {}
+
+    def load_evaluation(self, question_id, answer_hash):
+        return self.results.get((question_id, answer_hash))
+
+    def save_evaluation(self, question_id, answer_hash, result):
+        self.results.setdefault((question_id, answer_hash), result)
+
+
+@pytest.fixture
+def evaluation_store():
+    """空的评分缓存store"""
+    return InMemoryEvaluationStore()
+
+
 if __name__ == "__main__":
     # 运行所有测试
     pytest.main(["-v", "--tb=short"])
@@ -1,6 +1,14 @@
+import asyncio
+import threading
+import time
 import pytest
+from concurrent.futures import Future, ThreadPoolExecutor
 from unittest.mock import Mock, patch, MagicMock
 from models.agent import LLMAgent
+from models.question_generator import QuestionGenerator
+from models.cancellation import CancelToken
+from models.rate_limiter import AdaptiveRateLimiter
+from models.work_scheduler import Priority, Promotion, current_work, llm_work
 from models import Chunk, Question, EvaluationResult
 from models.config import Config
 
@@ -39,6 +47,7 @@ class TestAgent:
             agent.answer_evaluator = Mock()
             agent.question_cache = {}
             agent.user_sessions = {}
+            agent.background_executor = ThreadPoolExecutor(max_workers=2)
             return agent
     
     def test_agent_initialization(self, agent, config):
@@ -55,12 +64,33 @@ class TestAgent:
         
         assert result is not None
         agent.data_processor.process_input.assert_called_once()
+        agent._latest_session()["key_concepts_future"].result(timeout=5)
+        assert agent._latest_concepts() == ["concept1", "concept2"]
         agent.data_processor.extract_key_concepts.assert_called_once()
     
+    def test_generation_does_not_wait_for_concepts(self, agent, sample_chunks):
+        """测试：概念提取在后台进行，未完成时出题不等待，完成后再使用"""
+        release = threading.Event()
+        agent.data_processor.process_input.return_value = sample_chunks
+        agent.data_processor.extract_key_concepts.side_effect = lambda chunks: release.wait(5) and {"concepts": ["监督学习"]}
+        agent.question_generator.generate_questions.return_value = []
+        
+        agent.process_material("测试资料文本")
+        agent.generate_questions(sample_chunks, num_questions=1)
+        pending = agent.question_generator.generate_questions.call_args.kwargs["pre_extracted_concepts"]
+        assert not pending.done()
+        
+        release.set()
+        pending.result(timeout=5)
+        assert QuestionGenerator._ready_concepts(agent._latest_concepts()) == {"concepts": ["监督学习"]}
+        agent.generate_questions(sample_chunks, num_questions=1)
+        assert agent.question_generator.generate_questions.call_args.kwargs["pre_extracted_concepts"] == {"concepts": ["监督学习"]}
+    
     def test_generate_questions(self, agent, sample_chunks):
         """测试：生成题目"""
         mock_question = Mock(spec=Question)
         mock_question.question_id = "q1"
+        mock_question.explanation = "解析"
         
         with patch.object(agent.question_generator, 'generate_questions') as mock_gen:
             mock_gen.return_value = [mock_question]
@@ -99,12 +129,15 @@ class TestAgent:
     def test_evaluate_answer(self, agent):
         """测试：评估答案"""
         mock_question = Mock(spec=Question)
+        mock_question.question_type = "multiple_choice"
         mock_question.content = "测试题目"
         mock_question.correct_answer = "正确答案"
+        mock_question.explanation = "解析"
         
         mock_result = Mock(spec=EvaluationResult)
         mock_result.is_correct = True
         mock_result.score = 100
+        mock_result.detailed_explanation = "解析"
         
         with patch.object(agent.answer_evaluator, 'evaluate_answer') as mock_eval:
             mock_eval.return_value = mock_result
@@ -114,6 +147,133 @@ class TestAgent:
             assert result.is_correct == True
             assert result.score == 100
     
+    def test_lazy_explanation_generated_in_background(self, agent):
+        """测试：缺少解析的题目在后台生成解析，评估前补齐"""
+        agent.explanation_futures = {}
+        agent.question_generator.generate_explanation.return_value = "后台生成的解析"
+        question = Question(
+            question_id="q1", question_type="multiple_choice", content="题目",
+            options=["A", "B"], correct_answer="A", explanation="",
+            difficulty="easy", source_chunks=[], tags=[], metadata={}
+        )
+        agent.question_generator.generate_questions.return_value = [question]
+        
+        agent.generate_questions([], num_questions=1)
+        agent.evaluate_answer(question, "A")
+        
+        assert question.explanation == "后台生成的解析"
+        agent.question_generator.generate_explanation.assert_called_once_with(question)
+    
+    def test_pending_explanation_generated_at_caller_priority(self, agent):
+        """测试：后台解析任务尚未开始时取消，按评估请求的交互优先级当场生成"""
+        question = Question(
+            question_id="q1", question_type="multiple_choice", content="题目",
+            options=["A", "B"], correct_answer="A", explanation="",
+            difficulty="easy", source_chunks=[], tags=[], metadata={}
+        )
+        queued = Future()
+        agent.explanation_futures = {"q1": (queued, Promotion())}
+        priorities = []
+        def generate(q):
+            priorities.append(current_work().priority)
+            return "当场生成的解析"
+        agent.question_generator.generate_explanation.side_effect = generate
+        
+        agent.evaluate_answer(question, "A")
+        
+        assert queued.cancelled()
+        assert priorities == [Priority.INTERACTIVE]
+        assert question.explanation == "当场生成的解析"
+    
+    def test_running_explanation_promoted_to_caller_priority(self, agent):
+        """测试：后台解析任务已开始但仍在限流器中排队时，等待的交互请求把它提升到交互优先级"""
+        question = Question(
+            question_id="q-running", question_type="multiple_choice", content="题目",
+            options=["A", "B"], correct_answer="A", explanation="",
+            difficulty="easy", source_chunks=[], tags=[], metadata={}
+        )
+        limiter = AdaptiveRateLimiter(max_concurrency=1)
+        held = limiter.acquire()  # 占住唯一的并发槽位
+        admitted = []
+        
+        def call_llm(name):
+            limiter.release(limiter.acquire())
+            admitted.append(name)
+            return name
+        
+        def wait_for_depth(priority, depth):
+            deadline = time.monotonic() + 5
+            while limiter.stats()["queues"][priority]["depth"] != depth:
+                assert time.monotonic() < deadline
+                time.sleep(0.005)
+        
+        def next_question():
+            with llm_work(Priority.NEXT_QUESTION):
+                call_llm("next_question")
+        
+        def interactive():
+            with llm_work(Priority.INTERACTIVE):
+                agent.get_explanation(question)
+        
+        agent.explanation_futures = {}
+        agent.question_generator.generate_explanation.side_effect = lambda q: call_llm("explanation")
+        threads = [threading.Thread(target=next_question), threading.Thread(target=interactive)]
+        try:
+            agent._schedule_explanation(question)
+            wait_for_depth("background", 1)
+            threads[0].start()
+            wait_for_depth("next_question", 1)
+            threads[1].start()
+            wait_for_depth("interactive", 1)
+        finally:
+            limiter.release(held)
+            for thread in threads:
+                if thread.is_alive():
+                    thread.join(timeout=5)
+        
+        assert admitted == ["explanation", "next_question"]
+        assert question.explanation == "explanation"
+    
+    def test_short_answer_grading_not_blocked_on_explanation(self, agent):
+        """测试：简答题LLM评分自带详细解释，不等待题目解析生成"""
+        question = Question(
+            question_id="sa", question_type="short_answer", content="题目",
+            options=[], correct_answer="答案", explanation="",
+            difficulty="easy", source_chunks=[], tags=[], metadata={}
+        )
+        agent.answer_evaluator.evaluate_answer.return_value = EvaluationResult(
+            is_correct=True, score=90, feedback="好", detailed_explanation="评分解释",
+            suggested_improvement="", confidence_score=0.9, mistakes=[]
+        )
+        
+        result = agent.evaluate_answer(question, "答案")
+        
+        assert result.detailed_explanation == "评分解释"
+        agent.question_generator.generate_explanation.assert_not_called()
+    
+    def test_shared_pool_reduces_generation(self, agent, sample_chunks):
+        """测试：共享池中的题目优先使用，只生成不足的部分"""
+        def make(question_id):
+            return Question(
+                question_id=question_id, question_type="multiple_choice", content="题目",
+                options=["A", "B"], correct_answer="A", explanation="解析",
+                difficulty="easy", source_chunks=[], tags=[], metadata={}
+            )
+
+        pooled, generated = make("pooled"), make("generated")
+        agent.question_pool = Mock()
+        agent.question_pool.draw.return_value = [pooled]
+        agent.question_generator.generate_questions.return_value = [generated]
+        agent.coverage_scheduler = Mock()
+
+        questions = agent.generate_questions(sample_chunks, num_questions=2, user_id="bob")
+
+        assert questions == [pooled, generated]
+        assert agent.question_generator.generate_questions.call_args.kwargs["num_questions"] == 1
+        agent.question_pool.add.assert_called_once()
+        assert agent.question_pool.add.call_args.args[1] == [generated]
+        assert agent.question_pool.mark_served.call_args.args[2] == [pooled, generated]
+
     def test_question_caching(self, agent):
         """测试：题目缓存"""
         mock_question = Mock(spec=Question)
@@ -126,6 +286,51 @@ class TestAgent:
         assert "q1" in agent.question_cache
         assert agent.question_cache["q1"] == mock_question
 
+    @staticmethod
+    def _slow_stream_generation(question):
+        """模拟流式生成：第一题立即完成，第二题持续输出片段直到被取消"""
+        def generate(chunks, on_question_start=None, on_question_chunk=None,
+                     on_question_complete=None, **kwargs):
+            on_question_start(1, 2)
+            on_question_complete(question)
+            on_question_start(2, 2)
+            for _ in range(500):
+                on_question_chunk("片段")
+                time.sleep(0.01)
+            return [question]
+        return generate
+
+    def test_iter_questions_stops_at_deadline(self, agent, sample_chunks):
+        """测试：异步迭代器产出已完成的题目，到达会话时限后停止"""
+        question = Mock(spec=Question, question_id="q1", explanation="解析")
+        agent.question_generator.generate_questions_stream.side_effect = self._slow_stream_generation(question)
+
+        async def collect():
+            return [event async for event in agent.iter_questions(sample_chunks, num_questions=2, deadline=0.1)]
+
+        started_at = time.monotonic()
+        events = asyncio.run(collect())
+
+        assert time.monotonic() - started_at < 2
+        assert [e.kind for e in events] == ["start", "question", "start", "deadline"]
+        assert events[1].question is question
+
+    def test_iter_questions_cancel_on_exit(self, agent, sample_chunks):
+        """测试：调用方提前退出迭代时取消剩余生成"""
+        question = Mock(spec=Question, question_id="q1", explanation="解析")
+        agent.question_generator.generate_questions_stream.side_effect = self._slow_stream_generation(question)
+        token = CancelToken()
+
+        async def first_question():
+            iterator = agent.iter_questions(sample_chunks, num_questions=2, cancel_token=token)
+            async for event in iterator:
+                if event.kind == "question":
+                    await iterator.aclose()
+                    return event.question
+
+        assert asyncio.run(first_question()) is question
+        assert token.cancelled
+
 
 class TestAgentIntegration:
     """Agent 集成测试"""
@@ -152,6 +357,7 @@ class TestAgentIntegration:
             agent.answer_evaluator = Mock()
             agent.question_cache = {}
             agent.user_sessions = {}
+            agent.background_executor = ThreadPoolExecutor(max_workers=2)
             return agent
     
     def test_session_management(self, agent):
@@ -1,6 +1,9 @@
+import json
+import threading
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, MagicMock, patch
 from models.answer_evaluator import AnswerEvaluator
+from models.incremental_json import IncrementalJSONObject
 from models import Question, EvaluationResult
 from models.config import Config
 
@@ -109,5 +112,221 @@ class TestAnswerEvaluator:
             assert 0 <= result.score <= 100, "分数必须在 0-100 之间"
 
 
+class TestBatchEvaluation:
+    """AnswerEvaluator.evaluate_batch 单元测试"""
+
+    @pytest.fixture
+    def evaluator(self):
+        config = Mock(spec=Config)
+        config.OPENAI_MODEL = "gpt-3.5-turbo"
+        return AnswerEvaluator(config, llm=MagicMock())
+
+    @staticmethod
+    def short_answer(index):
+        return Question(
+            question_id=f"q{index}", question_type="short_answer", content=f"问题{index}",
+            options=[], correct_answer=f"参考答案{index}", explanation="", difficulty="medium",
+            source_chunks=[], tags=[], metadata={}
+        )
+
+    @staticmethod
+    def reply(payload):
+        return Mock(choices=[Mock(message=Mock(content=json.dumps(payload, ensure_ascii=False)))])
+
+    @staticmethod
+    def graded(item_id, score):
+        return {"id": item_id, "is_correct": score >= 60, "score": score,
+                "feedback": "反馈", "detailed_explanation": "解释"}
+
+    def test_one_request_per_batch(self, evaluator):
+        """测试：多道简答题合并为一次请求，结果顺序与输入一致"""
+        items = [(self.short_answer(i), f"答案{i}") for i in range(3)]
+        evaluator.llm.chat.return_value = self.reply(
+            {"results": [self.graded("2", 30), self.graded("0", 90), self.graded("1", 60)]}
+        )
+
+        results = evaluator.evaluate_batch(items)
+
+        assert evaluator.llm.chat.call_count == 1
+        assert [r.score for r in results] == [90, 60, 30]
+
+    def test_only_invalid_items_retried(self, evaluator):
+        """测试：批量结果中缺失或无效的项单独重新评估，其余项不重发"""
+        items = [(self.short_answer(i), f"答案{i}") for i in range(3)]
+        invalid = dict(self.graded("1", 150))
+        evaluator.llm.chat.side_effect = [
+            self.reply({"results": [self.graded("0", 80), invalid]}),
+            self.reply(self.graded("x", 70)),
+            self.reply(self.graded("x", 40))
+        ]
+
+        results = evaluator.evaluate_batch(items)
+
+        assert evaluator.llm.chat.call_count == 3
+        assert results[0].score == 80
+        assert sorted([results[1].score, results[2].score]) == [40, 70]
+        retried = [c.kwargs["messages"][1]["content"] for c in evaluator.llm.chat.call_args_list[1:]]
+        assert all("答案0" not in content for content in retried)
+
+    def test_splits_into_concurrent_batches(self, evaluator):
+        """测试：超过批大小时拆分为多个请求；选择题不调用LLM"""
+        choice = Question(
+            question_id="mc", question_type="multiple_choice", content="选择题",
+            options=["A", "B"], correct_answer="A", explanation="", difficulty="easy",
+            source_chunks=[], tags=[], metadata={}
+        )
+        items = [(self.short_answer(i), f"答案{i}") for i in range(4)] + [(choice, "A")]
+
+        def answer_batch(**kwargs):
+            payload = json.loads(kwargs["messages"][1]["content"])
+            return self.reply({"results": [self.graded(item["id"], 75) for item in payload]})
+        evaluator.llm.chat.side_effect = answer_batch
+
+        results = evaluator.evaluate_batch(items, batch_size=2)
+
+        assert evaluator.llm.chat.call_count == 2
+        assert [r.score for r in results] == [75, 75, 75, 75, 100]
+
+
+class TestStreamingEvaluation:
+    """简答题流式评估单元测试"""
+
+    @pytest.fixture
+    def evaluator(self):
+        config = Mock(spec=Config)
+        config.OPENAI_MODEL = "gpt-3.5-turbo"
+        return AnswerEvaluator(config, llm=MagicMock())
+
+    @pytest.fixture
+    def question(self):
+        return Question(
+            question_id="sa", question_type="short_answer", content="什么是过拟合？",
+            options=[], correct_answer="模型过于复杂", explanation="解析", difficulty="medium",
+            source_chunks=[], tags=[], metadata={}
+        )
+
+    @staticmethod
+    def stream_of(text, size=4):
+        chunks = [
+            Mock(choices=[Mock(delta=Mock(content=text[i:i + size]))])
+            for i in range(0, len(text), size)
+        ]
+        stream = MagicMock()
+        stream.__enter__.return_value = iter(chunks)
+        return stream
+
+    def test_parser_emits_completed_fields(self):
+        """测试：增量解析器在字段完整到达时返回，字符串内的逗号和括号不影响切分"""
+        parser = IncrementalJSONObject()
+
+        assert parser.feed('{"score": 8') == {}
+        assert parser.feed('5, "feedback": "好, {还行}"') == {"score": 85}
+        assert parser.feed(', "mistakes": ["a", ["b"]]}') == {"feedback": "好, {还行}", "mistakes": ["a", ["b"]]}
+        assert parser.fields["score"] == 85
+
+    def test_fields_streamed_in_order(self, evaluator, question):
+        """测试：得分和反馈先于详细解释回调，最终仍返回完整的EvaluationResult"""
+        payload = {"is_correct": True, "score": 85, "feedback": "不错", "detailed_explanation": "解释",
+                   "mistakes": ["遗漏正则化"]}
+        evaluator.llm.chat.return_value = self.stream_of(json.dumps(payload, ensure_ascii=False))
+        received = []
+
+        result = evaluator.evaluate_answer(question, "答案", on_field=lambda f, v: received.append(f))
+
+        assert received == ["is_correct", "score", "feedback", "detailed_explanation", "mistakes"]
+        assert result.score == 85 and result.mistakes == ["遗漏正则化"]
+        assert evaluator.llm.chat.call_args.kwargs["stream"] is True
+
+    def test_invalid_stream_falls_back(self, evaluator, question):
+        """测试：流式输出不完整时使用备用评估"""
+        evaluator.llm.chat.return_value = self.stream_of('{"score": 85, "feedback": "不')
+
+        result = evaluator.evaluate_answer(question, "答案", on_field=lambda f, v: None)
+
+        assert result.feedback == "自动评估系统暂时不可用"
+
+
+class TestSelfConsistency:
+    """简答题自洽评分单元测试"""
+
+    @pytest.fixture
+    def question(self):
+        return Question(
+            question_id="sc", question_type="short_answer", content="什么是过拟合？",
+            options=[], correct_answer="模型过于复杂", explanation="解析", difficulty="medium",
+            source_chunks=[], tags=[], metadata={}
+        )
+
+    @staticmethod
+    def make_evaluator(replies, samples=3):
+        """按调用顺序返回replies中的分数；值为Event时阻塞到该事件被设置，为异常时抛出"""
+        config = Mock(spec=Config)
+        config.OPENAI_MODEL = "gpt-3.5-turbo"
+        evaluator = AnswerEvaluator(
+            config, llm=MagicMock(), evaluation_cache=Mock(), consistency_samples=samples
+        )
+        evaluator.evaluation_cache.get.return_value = None
+        lock = threading.Lock()
+        calls = iter(replies)
+
+        def chat(**kwargs):
+            with lock:
+                reply = next(calls)
+            if isinstance(reply, Exception):
+                raise reply
+            if isinstance(reply, threading.Event):
+                reply.wait(5)
+                reply = 0
+            payload = {"is_correct": reply >= 60, "score": reply, "feedback": f"{reply}分",
+                       "detailed_explanation": "解释"}
+            return Mock(choices=[Mock(message=Mock(content=json.dumps(payload, ensure_ascii=False)))])
+        evaluator.llm.chat.side_effect = chat
+        return evaluator
+
+    def test_stops_early_on_agreement(self, question):
+        """测试：过半样本一致时不等待其余采样，置信度取一致比例"""
+        straggler = threading.Event()
+        evaluator = self.make_evaluator([85, 88, straggler])
+
+        result = evaluator.evaluate_answer(question, "答案")
+
+        assert not straggler.is_set()
+        assert result.score == 85 and result.is_correct
+        assert result.confidence_score == 1.0
+        assert evaluator.llm.chat.call_args.kwargs["temperature"] == AnswerEvaluator.CONSISTENCY_TEMPERATURE
+        evaluator.evaluation_cache.put.assert_called_once()
+        straggler.set()
+
+    def test_disagreement_lowers_confidence(self, question):
+        """测试：样本不一致时取最大的一致组，置信度降低且结果不缓存"""
+        evaluator = self.make_evaluator([85, 30, 35, 50], samples=4)
+
+        result = evaluator.evaluate_answer(question, "答案")
+
+        assert evaluator.llm.chat.call_count == 4
+        assert result.score == 30 and not result.is_correct
+        assert result.confidence_score == 0.5
+        evaluator.evaluation_cache.put.assert_not_called()
+
+    def test_failed_sample_not_counted_in_confidence(self, question):
+        """测试：调用失败的采样不拉低置信度"""
+        evaluator = self.make_evaluator([ConnectionError("down"), 85, 88])
+
+        result = evaluator.evaluate_answer(question, "答案")
+
+        assert result.score == 85
+        assert result.confidence_score == 1.0
+
+    def test_majority_uses_median_sample(self, question):
+        """测试：多数一致时取分数为中位数的样本"""
+        evaluator = self.make_evaluator([62, 10, 78, 70, 75], samples=5)
+
+        result = evaluator.evaluate_answer(question, "答案")
+
+        assert result.is_correct
+        assert result.score in (62, 70, 75, 78)
+        assert result.confidence_score >= 0.75
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,99 @@
+import pytest
+from unittest.mock import Mock, MagicMock
+from models.answer_evaluator import AnswerEvaluator
+from models.answer_pregrader import ShortAnswerPreGrader
+from models.embeddings import HashingEmbedder
+from models import Question
+from models.config import Config
+
+
+class SemanticStubEmbedder(HashingEmbedder):
+    """测试用：把本地哈希向量当作语义embedding"""
+    semantic = True
+
+
+class TestShortAnswerPreGrader:
+    """ShortAnswerPreGrader 单元测试"""
+
+    @pytest.fixture
+    def question(self):
+        return Question(
+            question_id="pregrade-q1", question_type="short_answer", content="什么是过拟合？",
+            options=[], correct_answer="过拟合是指模型过于复杂，在训练数据上表现很好，但在新数据上表现较差。",
+            explanation="解析", difficulty="medium", source_chunks=[], tags=[],
+            metadata={
+                "scoring_criteria": ["提到模型复杂度", "说明训练集与测试集表现差异"],
+                "rubric_keywords": [["模型过于复杂", "模型复杂"], ["新数据上表现较差", "泛化差"]]
+            }
+        )
+
+    @pytest.fixture
+    def pregrader(self):
+        return ShortAnswerPreGrader(HashingEmbedder(), accept_threshold=0.9, reject_threshold=0.2)
+
+    def test_blank_answer_rejected(self, pregrader, question):
+        """测试：空白答案直接判0分"""
+        result = pregrader.grade(question, "  。 ")
+
+        assert result.score == 0
+        assert not result.is_correct
+
+    def test_near_verbatim_accepted(self, question):
+        """测试：使用语义embedding时，与参考答案几乎一致的答案直接判对"""
+        pregrader = ShortAnswerPreGrader(SemanticStubEmbedder(), accept_threshold=0.9, reject_threshold=0.2)
+        result = pregrader.grade(question, "过拟合是指模型过于复杂，在训练数据上表现好，但在新数据上表现较差")
+
+        assert result.is_correct
+        assert result.score >= 90
+
+    def test_negated_answer_not_accepted(self, question):
+        """测试：否定了关键事实的近似原文不在本地判对"""
+        pregrader = ShortAnswerPreGrader(SemanticStubEmbedder(), accept_threshold=0.9, reject_threshold=0.2)
+        negated = question.correct_answer.replace("表现较差", "表现也很好")
+
+        assert pregrader.grade(question, negated) is None
+
+    def test_hashing_embedder_never_accepts(self, pregrader, question):
+        """测试：本地哈希向量不用于判对，近似原文也交给LLM评分"""
+        assert pregrader.grade(question, question.correct_answer) is None
+
+    @pytest.mark.parametrize("answer", [
+        "对训练数据拟合过度，泛化能力弱",
+        "模型记住了样本噪声，换一批数据就不准了",
+        "The model fits the training set too closely and generalizes poorly.",
+    ])
+    def test_hashing_embedder_never_rejects_paraphrase(self, pregrader, question, answer):
+        """测试：本地哈希向量不用于判错，换了说法的正确答案交给LLM评分"""
+        assert pregrader.grade(question, answer) is None
+
+    def test_off_topic_rejected(self, question):
+        """测试：使用语义embedding时，与参考答案和评分要点都无关的答案直接判错"""
+        pregrader = ShortAnswerPreGrader(SemanticStubEmbedder(), accept_threshold=0.9, reject_threshold=0.2)
+        result = pregrader.grade(question, "今天天气晴朗，适合出去散步")
+
+        assert not result.is_correct
+        assert result.score == 0
+
+    def test_ambiguous_escalated(self, pregrader, question):
+        """测试：中间区间的答案交给LLM，并统计升级比例"""
+        assert pregrader.grade(question, "模型太复杂导致泛化能力下降") is None
+        pregrader.grade(question, "")
+
+        stats = pregrader.stats()
+        assert stats["escalated"] == 1
+        assert stats["escalation_rate"] == 0.5
+
+    def test_evaluator_skips_llm_when_resolved_locally(self, pregrader, question):
+        """测试：预评分可确定时评估器不调用LLM"""
+        config = Mock(spec=Config)
+        llm = MagicMock()
+        evaluator = AnswerEvaluator(config, llm=llm, prompts=MagicMock(), pregrader=pregrader)
+
+        result = evaluator.evaluate_answer(question, "")
+
+        assert result.score == 0
+        llm.chat.assert_not_called()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,88 @@
+import time
+import pytest
+from unittest.mock import Mock, MagicMock
+from models.cancellation import CancelToken, OperationCancelled, check_cancelled, current_cancel_token
+from models.llm_gateway import LLMGateway
+
+
+class TestCancelToken:
+    """CancelToken 单元测试"""
+
+    def test_cancel_closes_registered_streams(self):
+        """测试：取消时关闭进行中的流，之后登记的流立即关闭"""
+        token = CancelToken()
+        stream, late_stream = Mock(), Mock()
+        token.register(stream)
+
+        token.cancel()
+        token.register(late_stream)
+
+        stream.close.assert_called_once()
+        late_stream.close.assert_called_once()
+        with pytest.raises(OperationCancelled):
+            token.check()
+
+    def test_deadline_expires(self):
+        """测试：超过时限后视为已取消"""
+        token = CancelToken(deadline=0.01)
+        assert 0 < token.remaining() <= 0.01
+        time.sleep(0.02)
+        assert token.expired
+        with pytest.raises(OperationCancelled):
+            token.check()
+
+    def test_limit_only_shortens_deadline(self):
+        """测试：收紧截止时间，不延长已有的更早截止时间"""
+        token = CancelToken()
+        token.limit(10)
+        assert 9 < token.remaining() <= 10
+        token.limit(60)
+        assert token.remaining() <= 10
+        token.limit(None)
+        assert token.remaining() <= 10
+
+    def test_bind_sets_context(self):
+        """测试：令牌只在绑定的上下文中生效"""
+        token = CancelToken()
+        token.cancel()
+        check_cancelled()  # 未绑定时不检查
+        with token.bind():
+            assert current_cancel_token() is token
+            with pytest.raises(OperationCancelled):
+                check_cancelled()
+        assert current_cancel_token() is None
+
+    def test_gateway_rejects_cancelled_calls(self):
+        """测试：令牌已取消时网关不再发出请求"""
+        client = MagicMock()
+        gateway = LLMGateway(Mock(DEBUG=False), client)
+        token = CancelToken()
+        token.cancel()
+
+        with token.bind(), pytest.raises(OperationCancelled):
+            gateway.chat(model="m", messages=[])
+        client.chat.completions.create.assert_not_called()
+
+    def test_gateway_registers_streams(self):
+        """测试：流式响应登记到令牌，取消时被关闭，正常结束后注销"""
+        client = MagicMock()
+        stream = MagicMock()
+        stream.__enter__.return_value = ["a"]
+        client.chat.completions.create.return_value = stream
+        gateway = LLMGateway(Mock(DEBUG=False), client)
+
+        token = CancelToken()
+        with token.bind():
+            with gateway.chat(model="m", messages=[], stream=True) as response:
+                token.cancel()
+        stream.close.assert_called_once()
+
+        token = CancelToken()
+        with token.bind():
+            with gateway.chat(model="m", messages=[], stream=True) as response:
+                assert list(response) == ["a"]
+        assert token._streams == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -254,6 +254,21 @@ class TestCLIEndToEnd:
             "A. 模型过于复杂"
         )
 
+    
+    def test_background_result_shows_answer_and_explanation(self, cli, sample_question, sample_evaluation_wrong):
+        """测试：后台评分结果显示正确答案和解析，不只是得分"""
+        from rich.console import Console
+        from models.grading_pipeline import GradedAnswer
+        cli.console = Console(file=StringIO(), width=120)
+        
+        cli._show_background_results([GradedAnswer(1, sample_question, "B. 数据不足", sample_evaluation_wrong)])
+        
+        output = cli.console.file.getvalue()
+        assert "第 1 题" in output
+        assert sample_question.correct_answer in output
+        assert sample_evaluation_wrong.detailed_explanation in output
+        assert "混淆了过拟合和欠拟合" in output
+
 
 class TestCLIUserInteraction:
     """CLI 用户交互测试"""
@@ -0,0 +1,74 @@
+import random
+import pytest
+from unittest.mock import Mock
+from models.coverage_scheduler import ChunkCoverage, CoverageScheduler
+from models.question_dedup import material_hash
+from models import Chunk
+
+
+class TestCoverageScheduler:
+    """CoverageScheduler 单元测试"""
+
+    @pytest.fixture
+    def chunks(self):
+        """创建10个资料分块"""
+        return [Chunk(text=f"第{i}段学习资料内容", metadata={}) for i in range(10)]
+
+    @pytest.fixture
+    def scheduler(self):
+        """创建带内存store的调度器"""
+        documents = {}
+        store = Mock()
+        store.load_chunk_coverage.side_effect = lambda user, material: documents.get((user, material))
+        store.save_chunk_coverage.side_effect = lambda user, material, doc: documents.__setitem__((user, material), doc)
+        return CoverageScheduler(store=store, rng=random.Random(0))
+
+    def test_selection_covers_all_chunks_before_repeating(self, scheduler, chunks):
+        """测试：全部分块覆盖前不会重复选择"""
+        seen = []
+        for _ in range(5):
+            seen.extend(id(c) for c in scheduler.select_chunks("u1", chunks, 2))
+
+        assert len(set(seen)) == 10
+        assert scheduler.coverage_ratio("u1", chunks) == 1.0
+
+    def test_new_round_after_full_coverage(self, scheduler, chunks):
+        """测试：全部覆盖后开始新一轮"""
+        for _ in range(5):
+            scheduler.select_chunks("u1", chunks, 2)
+        scheduler.select_chunks("u1", chunks, 2)
+
+        assert scheduler.coverage_ratio("u1", chunks) == 0.2
+
+    def test_weak_chunks_prioritized(self, scheduler, chunks):
+        """测试：新一轮中优先选择答错过的分块"""
+        material = material_hash(chunks)
+        for _ in range(5):
+            scheduler.select_chunks("u1", chunks, 2)
+        scheduler.record_result("u1", material, len(chunks), [3, 7], is_correct=False)
+
+        selected = scheduler.select_chunks("u1", chunks, 2)
+        assert selected == [chunks[3], chunks[7]]
+
+    def test_state_is_per_user_and_persisted(self, scheduler, chunks):
+        """测试：覆盖状态按用户隔离，并可从store恢复"""
+        scheduler.select_chunks("u1", chunks, 4)
+        assert scheduler.coverage_ratio("u2", chunks) == 0.0
+
+        restored = CoverageScheduler(store=scheduler.store)
+        assert restored.coverage_ratio("u1", chunks) == 0.4
+
+    def test_document_roundtrip(self):
+        """测试：位集序列化为十六进制字符串"""
+        coverage = ChunkCoverage(70, covered=(1 << 69) | 1, weak=1 << 5)
+        document = coverage.to_document()
+        restored = ChunkCoverage.from_document(70, document)
+
+        assert document["covered"] == format((1 << 69) | 1, "x")
+        assert (restored.covered, restored.weak) == (coverage.covered, coverage.weak)
+        # 分块数变化（资料被重新分块）时重新开始
+        assert ChunkCoverage.from_document(71, document).covered == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
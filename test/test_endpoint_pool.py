@@ -0,0 +1,110 @@
+import pytest
+import time
+import httpx
+from unittest.mock import Mock, MagicMock
+from openai import RateLimitError
+from models.endpoint_pool import Endpoint, EndpointPool
+from models.llm_gateway import LLMGateway
+from models.rate_limiter import AdaptiveRateLimiter
+
+
+class TestEndpointPool:
+    """EndpointPool 单元测试"""
+
+    @pytest.fixture
+    def pool(self):
+        """创建包含两个端点的端点池"""
+        return EndpointPool(
+            [Endpoint("https://a", Mock()), Endpoint("https://b", Mock())],
+            eject_seconds=30,
+            recovery_seconds=60
+        )
+
+    def test_routes_to_lower_latency(self, pool):
+        """测试：优先路由到近期延迟更低的端点"""
+        a, b = pool.endpoints
+        pool.release(pool.acquire(), latency=0.1)
+        pool.release(pool.acquire(), latency=0.1)
+        a.latency_ewma, b.latency_ewma = 2.0, 0.2
+
+        assert pool.acquire() is b
+
+    def test_ejects_after_consecutive_failures(self, pool):
+        """测试：连续失败的端点被摘除，流量切到健康端点"""
+        a, b = pool.endpoints
+        for _ in range(EndpointPool.MAX_CONSECUTIVE_FAILURES):
+            a.in_flight += 1
+            pool.release(a, success=False)
+
+        assert a.is_ejected(time.monotonic())
+        for _ in range(5):
+            assert pool.acquire() is b
+
+    def test_slow_recovery_weight(self, pool):
+        """测试：恢复期内端点权重逐步回升"""
+        a = pool.endpoints[0]
+        now = time.monotonic()
+        a.recovering_since = now - 30
+
+        assert pool._weight(a, now) == pytest.approx(0.5)
+        assert pool._weight(a, now + 60) == 1.0
+
+    def test_all_ejected_still_serves(self, pool):
+        """测试：全部端点被摘除时仍返回最早恢复的端点"""
+        now = time.monotonic()
+        pool.endpoints[0].ejected_until = now + 100
+        pool.endpoints[1].ejected_until = now + 10
+
+        assert pool.acquire() is pool.endpoints[1]
+
+    def test_from_config_requires_multiple_urls(self):
+        """测试：只配置一个端点时不启用端点池"""
+        config = Mock(
+            OPENAI_BASE_URLS="https://a",
+            OPENAI_API_KEYS="",
+            OPENAI_API_KEY="k"
+        )
+        assert EndpointPool.from_config(config, Mock()) is None
+
+    def test_throttled_endpoint_does_not_shrink_others(self):
+        """测试：每个端点有自己的限流器，一个端点被429限流只收缩它自己的并发窗口"""
+        throttled, healthy = MagicMock(), MagicMock()
+        throttled.chat.completions.create.side_effect = RateLimitError(
+            "rate limited",
+            response=httpx.Response(429, request=httpx.Request("POST", "https://a")),
+            body=None
+        )
+        healthy.chat.completions.create.return_value = Mock(usage=None)
+        pool = EndpointPool([
+            Endpoint("https://a", throttled, limiter=AdaptiveRateLimiter(max_concurrency=4)),
+            Endpoint("https://b", healthy, limiter=AdaptiveRateLimiter(max_concurrency=4))
+        ])
+        gateway = LLMGateway(Mock(DEBUG=False), throttled, endpoint_pool=pool)
+
+        # 没有延迟样本的端点a先被选中
+        with pytest.raises(RateLimitError):
+            gateway.chat(model="m", messages=[])
+        gateway.chat(model="m", messages=[])
+
+        a, b = pool.endpoints
+        assert a.limiter.concurrency_limit == 2
+        assert b.limiter.concurrency_limit == 4
+        assert healthy.chat.completions.create.call_count == 1
+
+    def test_from_config_creates_limiter_per_endpoint(self):
+        """测试：按端点各创建一个限流器"""
+        config = Mock(
+            OPENAI_BASE_URLS="https://a,https://b",
+            OPENAI_API_KEYS="",
+            OPENAI_API_KEY="k",
+            LLM_ENDPOINT_EJECT_SECONDS=30,
+            LLM_ENDPOINT_RECOVERY_SECONDS=60
+        )
+        pool = EndpointPool.from_config(config, Mock(), limiter_factory=AdaptiveRateLimiter)
+
+        a, b = pool.endpoints
+        assert a.limiter is not b.limiter
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
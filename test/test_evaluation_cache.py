@@ -0,0 +1,76 @@
+import json
+import pytest
+from unittest.mock import Mock, MagicMock
+from models.answer_evaluator import AnswerEvaluator
+from models.evaluation_cache import EvaluationCache, answer_hash
+from models.config import Config
+
+
+class TestEvaluationCache:
+    """EvaluationCache 单元测试"""
+
+    @pytest.fixture
+    def question(self, make_question):
+        return make_question(
+            "q1", question_type="short_answer", content="什么是过拟合？", options=[],
+            correct_answer="模型在训练集上表现好、在新数据上表现差", explanation=""
+        )
+
+    def test_normalized_answers_share_key(self):
+        """测试：首尾空白、句末标点和全半角差异不影响缓存键"""
+        assert answer_hash("过拟合") == answer_hash(" 过拟合。 ")
+        assert answer_hash("ＡＢＣ") == answer_hash("ABC")
+        assert answer_hash("模型  过于复杂") == answer_hash("模型 过于复杂")
+        assert answer_hash("过拟合") != answer_hash("欠拟合")
+
+    def test_meaningful_symbols_kept(self):
+        """测试：正负号、小数点和比较符号会改变答案含义，不共用缓存键"""
+        assert answer_hash("-5") != answer_hash("5")
+        assert answer_hash("0.5") != answer_hash("05")
+        assert answer_hash(".5") != answer_hash("5")
+        assert answer_hash("x>y") != answer_hash("x<y")
+
+    def test_hit_across_processes(self, question, make_question, make_result, evaluation_store):
+        """测试：持久化后其他进程（新实例）也能命中"""
+        EvaluationCache(evaluation_store).put(question, "过拟合", make_result(80))
+
+        cache = EvaluationCache(evaluation_store)
+        result = cache.get(question, "过拟合。 ")
+
+        assert result == make_result(80)
+        assert cache.get(make_question("q2"), "过拟合") is None
+        assert cache.stats()["hit_rate"] == 0.5
+
+    def test_store_failure_does_not_break_grading(self, question, make_result):
+        """测试：store不可用时退化为进程内缓存"""
+        store = Mock()
+        store.load_evaluation.side_effect = ConnectionError("down")
+        store.save_evaluation.side_effect = ConnectionError("down")
+        cache = EvaluationCache(store)
+
+        assert cache.get(question, "过拟合") is None
+        cache.put(question, "过拟合", make_result())
+        assert cache.get(question, "过拟合") == make_result()
+
+    def test_evaluator_reuses_cached_grade(self, question, evaluation_store):
+        """测试：同一题目的相同答案只调用一次LLM"""
+        config = Mock(spec=Config)
+        config.OPENAI_MODEL = "gpt-3.5-turbo"
+        llm = MagicMock()
+        llm.chat.return_value = Mock(choices=[Mock(message=Mock(content=json.dumps(
+            {"is_correct": True, "score": 85, "feedback": "好", "detailed_explanation": "解释"}
+        )))])
+        evaluator = AnswerEvaluator(
+            config, llm=llm, prompts=MagicMock(),
+            evaluation_cache=EvaluationCache(evaluation_store)
+        )
+
+        first = evaluator.evaluate_answer(question, "过拟合")
+        second = evaluator.evaluate_answer(question, "过拟合。 ")
+
+        assert llm.chat.call_count == 1
+        assert first == second
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
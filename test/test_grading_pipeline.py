@@ -0,0 +1,68 @@
+import threading
+import pytest
+from unittest.mock import Mock
+from models.grading_pipeline import GradingPipeline
+
+
+class TestGradingPipeline:
+    """GradingPipeline 单元测试"""
+
+    def test_submit_returns_before_grading(self, make_question, make_result):
+        """测试：提交后立即返回，评分完成前即可继续下一题"""
+        release = threading.Event()
+        agent = Mock()
+        agent.evaluate_answer.side_effect = lambda q, a, user_id: release.wait(5) and make_result(80)
+        pipeline = GradingPipeline(agent, "alice")
+
+        future = pipeline.submit(1, make_question("q1"), "答案")
+
+        assert not future.done()
+        release.set()
+        graded = pipeline.close()
+        assert graded[0].evaluation.score == 80
+        assert graded[0].saved
+
+    def test_close_waits_for_all_writes(self, make_question, make_result):
+        """测试：关闭时等待全部评分和写入完成，结果按题目顺序返回"""
+        agent = Mock()
+        agent.evaluate_answer.side_effect = lambda q, a, user_id: make_result(int(a))
+        pipeline = GradingPipeline(agent, "alice", max_workers=4)
+
+        for i in range(1, 6):
+            pipeline.submit(i, make_question(f"q{i}"), str(i * 10))
+        graded = pipeline.close()
+
+        assert [a.index for a in graded] == [1, 2, 3, 4, 5]
+        assert agent.save_performance.call_count == 5
+        assert all(a.saved for a in graded)
+
+    def test_failed_write_retried(self, make_question, make_result):
+        """测试：写入失败时重试，重试成功不丢失记录"""
+        agent = Mock()
+        agent.evaluate_answer.return_value = make_result(90)
+        agent.save_performance.side_effect = [ConnectionError("down"), None]
+        pipeline = GradingPipeline(agent, "alice")
+        pipeline.WRITE_RETRY_DELAY = 0
+
+        pipeline.submit(1, make_question("q1"), "答案")
+        graded = pipeline.close()
+
+        assert agent.save_performance.call_count == 2
+        assert graded[0].saved
+
+    def test_grading_error_reported(self, make_question):
+        """测试：评分失败的题目记录错误且不写入"""
+        agent = Mock()
+        agent.evaluate_answer.side_effect = TimeoutError("deadline")
+        pipeline = GradingPipeline(agent, "alice")
+
+        pipeline.submit(1, make_question("q1"), "答案")
+        graded = pipeline.close()
+
+        assert isinstance(graded[0].error, TimeoutError)
+        agent.save_performance.assert_not_called()
+        assert pipeline.take_completed()[0].index == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
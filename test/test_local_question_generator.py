@@ -0,0 +1,88 @@
+import random
+import pytest
+from models.local_question_generator import LocalQuestionGenerator, split_sentences, CLOZE_BLANK
+from models import Chunk
+
+
+class TestLocalQuestionGenerator:
+    """LocalQuestionGenerator 单元测试"""
+
+    @pytest.fixture
+    def generator(self):
+        """创建固定随机种子的本地出题器"""
+        return LocalQuestionGenerator(rng=random.Random(0))
+
+    @pytest.fixture
+    def sample_chunks(self):
+        """创建示例学习资料分块"""
+        return [
+            Chunk(
+                text="监督学习需要带标签的训练数据。无监督学习从无标签数据中发现结构。",
+                metadata={"source": "intro"}
+            ),
+            Chunk(
+                text="过拟合是指模型在训练数据上表现很好但泛化能力差。正则化可以缓解过拟合。",
+                metadata={"source": "concepts"}
+            ),
+            Chunk(
+                text="交叉验证用于评估模型的泛化能力。梯度下降通过迭代更新参数来最小化损失。",
+                metadata={"source": "techniques"}
+            )
+        ]
+
+    @pytest.fixture
+    def key_concepts(self):
+        """概念提取结果（编号行格式）"""
+        return {"concepts": ["1. 监督学习", "2. 过拟合：模型复杂度过高", "- 交叉验证", "**正则化**", "梯度下降"]}
+
+    def test_split_sentences(self):
+        """测试：按中英文标点切分并过滤过短句子"""
+        text = "机器学习是人工智能的分支。好的！Deep learning uses neural networks. It scales well."
+        assert split_sentences(text) == [
+            "机器学习是人工智能的分支。",
+            "Deep learning uses neural networks.",
+            "It scales well."
+        ]
+
+    def test_extract_terms_cleans_concepts(self, generator, sample_chunks, key_concepts):
+        """测试：概念列表去除编号、说明和强调符号"""
+        terms = generator.extract_terms(sample_chunks, key_concepts)
+        assert terms[:5] == ["监督学习", "过拟合", "交叉验证", "正则化", "梯度下降"]
+
+    def test_extract_terms_without_concepts(self, generator, sample_chunks):
+        """测试：没有概念提取结果时从原文找出重复词组"""
+        terms = generator.extract_terms(sample_chunks)
+        assert "过拟合" in terms
+        assert "泛化能力" in terms
+
+    def test_cloze_question(self, generator, sample_chunks, key_concepts):
+        """测试：填空题挖去术语，正确答案在选项中且与原句一致"""
+        question = generator.generate_cloze(sample_chunks, key_concepts, "easy")
+
+        assert question.question_type == "multiple_choice"
+        assert CLOZE_BLANK in question.content
+        assert len(question.options) == 4
+        assert question.correct_answer in question.options
+        original = question.content.replace("填空：", "").replace(CLOZE_BLANK, question.correct_answer)
+        assert original in question.source_chunks[0]
+        assert question.metadata["generation_method"] == "local_cloze"
+
+    def test_true_false_statements_match_answer(self, generator, sample_chunks, key_concepts):
+        """测试：真命题是原文句子，假命题不是"""
+        text = "".join(chunk.text for chunk in sample_chunks)
+        answers = set()
+        for _ in range(20):
+            question = generator.generate_true_false(sample_chunks, key_concepts)
+            answers.add(question.correct_answer)
+            assert (question.content in text) == (question.correct_answer == "True")
+        assert answers == {"True", "False"}
+
+    def test_falls_back_to_true_false(self, generator):
+        """测试：术语不足以出填空题时退化为真假题，无可用句子时返回None"""
+        chunks = [Chunk(text="这是一段很短但完整的说明文字。", metadata={})]
+        assert generator.generate("multiple_choice", chunks).question_type == "true_false"
+        assert generator.generate("multiple_choice", [Chunk(text="太短", metadata={})]) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
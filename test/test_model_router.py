@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import Mock, MagicMock
+from models.model_router import ModelRouter, parse_routes
+from models.llm_gateway import LLMGateway
+
+
+class TestModelRouter:
+    """ModelRouter 单元测试"""
+
+    @pytest.fixture
+    def router(self):
+        """创建路由器：默认小模型策略 + 覆盖规则"""
+        config = Mock(
+            OPENAI_MODEL="large-model",
+            OPENAI_SMALL_MODEL="small-model",
+            MODEL_ROUTES="generate:short_answer:easy=small;evaluate=custom-model"
+        )
+        return ModelRouter.from_config(config)
+
+    def test_cheap_tasks_use_small_model(self, router):
+        """测试：真假题和概念提取路由到小模型"""
+        assert router.select("generate", "true_false", "medium") == "small-model"
+        assert router.select("extract_concepts") == "small-model"
+
+    def test_hard_items_use_large_model(self, router):
+        """测试：难题和未配置的任务使用大模型"""
+        assert router.select("generate", "multiple_choice", "hard") == "large-model"
+        # 难度规则优先于题型规则：难的真假题不走小模型
+        assert router.select("generate", "true_false", "hard") == "large-model"
+        assert router.select("unknown_task") == "large-model"
+
+    def test_config_overrides(self, router):
+        """测试：MODEL_ROUTES覆盖默认策略，支持别名和具体模型名"""
+        assert router.select("generate", "short_answer", "easy") == "small-model"
+        assert router.select("evaluate", "multiple_choice", "easy") == "custom-model"
+        # 更具体的默认规则优先于宽泛的覆盖规则
+        assert router.select("evaluate", "short_answer", "easy") == "large-model"
+
+    def test_parse_routes_fills_wildcards(self):
+        """测试：缺省段视为通配符"""
+        assert parse_routes("explanation=m1; ;generate::hard=m2") == {
+            ("explanation", "*", "*"): "m1",
+            ("generate", "*", "hard"): "m2"
+        }
+
+    def test_gateway_selects_model_and_records_stats(self, router):
+        """测试：网关按路由替换模型并记录延迟和token用量"""
+        client = MagicMock()
+        client.chat.completions.create.return_value = Mock(
+            usage=Mock(prompt_tokens=120, completion_tokens=30, prompt_tokens_details=None)
+        )
+        gateway = LLMGateway(Mock(DEBUG=False), client, router=router)
+
+        gateway.chat(model="large-model", route=("generate", "true_false", "easy"), messages=[])
+
+        assert client.chat.completions.create.call_args.kwargs["model"] == "small-model"
+        stats = gateway.stats()["routes"]
+        assert len(stats) == 1
+        assert stats[0]["route"] == "generate:true_false:easy"
+        assert stats[0]["model"] == "small-model"
+        assert stats[0]["avg_prompt_tokens"] == 120
+        assert stats[0]["avg_completion_tokens"] == 30
+
+    def test_streamed_calls_record_usage(self, router):
+        """测试：流式调用请求附带用量，并按最后一个数据块记录路由的token用量"""
+        chunks = [
+            Mock(choices=[Mock(delta=Mock(content="{}"))], usage=None),
+            Mock(choices=[], usage=Mock(prompt_tokens=200, completion_tokens=50))
+        ]
+        client = MagicMock()
+        client.chat.completions.create.return_value = iter(chunks)
+        gateway = LLMGateway(Mock(DEBUG=False), client, router=router)
+
+        with gateway.chat(
+            model="large-model", route=("generate", "multiple_choice", "hard"), messages=[], stream=True
+        ) as stream:
+            assert list(stream) == chunks
+
+        assert client.chat.completions.create.call_args.kwargs["stream_options"] == {"include_usage": True}
+        stats = gateway.stats()["routes"]
+        assert stats[0]["avg_prompt_tokens"] == 200
+        assert stats[0]["avg_completion_tokens"] == 50
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
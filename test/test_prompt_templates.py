@@ -0,0 +1,52 @@
+import pytest
+from models.prompt_templates import PromptTemplate, load_prompt_templates, minify
+
+
+class TestPromptTemplates:
+    """提示词模板引擎单元测试"""
+
+    @pytest.fixture
+    def engine(self):
+        """加载项目模板目录"""
+        return load_prompt_templates()
+
+    def test_all_templates_loaded(self, engine):
+        """测试：模板目录中的模板全部被加载"""
+        for name in ["multiple_choice", "short_answer", "true_false",
+                     "key_concepts", "prometheus_eval"]:
+            assert name in engine.templates
+
+    def test_static_prefix_identical_across_requests(self, engine):
+        """测试：不同资料和难度的请求共享逐字相同的静态前缀"""
+        a = engine.render_messages("multiple_choice", difficulty="easy", concepts="无", context="资料A")
+        b = engine.render_messages("multiple_choice", difficulty="hard", concepts="过拟合", context="资料B")
+
+        assert a[0] == b[0]
+        assert a[0]["role"] == "system"
+        assert a[1]["content"].endswith("资料A")
+
+    def test_minify_removes_indentation(self):
+        """测试：压缩去除缩进、空行和注释"""
+        assert minify("# 注释\n    第一行  \n\n        第二行\n") == "第一行\n第二行"
+
+    def test_variables_in_system_rejected(self):
+        """测试：静态段包含变量时报错"""
+        with pytest.raises(ValueError):
+            PromptTemplate("bad", "[system]\n难度 $difficulty\n[user]\n$context\n")
+
+    def test_tracks_trimmed_tokens(self, engine):
+        """测试：统计空白压缩节省的token"""
+        before = engine.tokens_trimmed
+        engine.render_messages("short_answer", difficulty="easy", concepts="无", context="x")
+
+        assert engine.tokens_trimmed > before
+
+    def test_comments_not_counted_as_trimmed(self):
+        """测试：注释行不计入空白压缩节省的token"""
+        compact = PromptTemplate("compact", "[system]\n# 注释注释注释注释注释注释注释注释\n指令\n[user]\n$context")
+
+        assert compact.trimmed_tokens == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,63 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+from models.question_dedup import (
+    QuestionDeduplicator, content_hash, normalize_text, simhash, hamming_distance
+)
+
+
+class TestQuestionDedup:
+    """题目去重单元测试"""
+
+    def test_normalize_text_folds_width_and_punctuation(self):
+        """测试：规范化去除空白、标点并折叠全角字符"""
+        assert normalize_text("过拟合。 ") == normalize_text("过拟合")
+        assert normalize_text("ＡＢＣ") == "abc"
+
+    def test_content_hash_is_full_width(self):
+        """测试：题目ID为完整 SHA-256，且与格式差异无关"""
+        a = content_hash("multiple_choice", "什么是过拟合？", ["甲", "乙"], "甲")
+        b = content_hash("multiple_choice", "什么是 过拟合?", ["乙", "甲"], "甲")
+
+        assert len(a) == 64
+        assert a == b
+
+    def test_simhash_close_for_near_duplicates(self):
+        """测试：近似文本的 SimHash 汉明距离小"""
+        a = simhash("过拟合是指模型在训练数据上表现很好，但在新数据上表现不佳的现象")
+        b = simhash("过拟合是指模型在训练数据上表现很好，但在新数据上表现不佳的情况")
+        c = simhash("交叉验证是一种评估模型泛化能力的技术")
+
+        assert hamming_distance(a, b) < hamming_distance(a, c)
+
+    def test_detects_exact_and_near_duplicates(self, make_question):
+        """测试：精确重复和近似重复都能被识别"""
+        dedup = QuestionDeduplicator()
+        dedup.add(make_question(content="下列哪一项最准确地描述了机器学习中过拟合现象的成因与表现？"))
+
+        assert dedup.is_duplicate(make_question(content="下列哪一项最准确地描述了机器学习中过拟合现象的成因与表现？"))
+        assert dedup.is_duplicate(make_question(content="下列哪一项最准确地描述了机器学习中过拟合现象的成因和表现?"))
+        assert not dedup.is_duplicate(make_question(content="K折交叉验证中每一折的作用是什么？"))
+
+    def test_loads_bank_from_store_in_background(self, make_question):
+        """测试：题库指纹在后台只加载一次，加载前去重不阻塞也不访问store"""
+        existing = make_question(content="什么是监督学习中的标签数据？")
+        store = Mock()
+        store.load_question_fingerprints.return_value = [{
+            "content_hash": existing.question_id,
+            "simhash": format(simhash(existing.content), "016x")
+        }]
+        dedup = QuestionDeduplicator(store=store)
+
+        assert not dedup.is_duplicate(existing)
+        store.load_question_fingerprints.assert_not_called()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            dedup.load_in_background(executor).result(timeout=5)
+            dedup.load_in_background(executor).result(timeout=5)
+
+        assert dedup.is_duplicate(existing)
+        store.load_question_fingerprints.assert_called_once()
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
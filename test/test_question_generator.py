@@ -1,6 +1,11 @@
+import random
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from concurrent.futures import Future
+from unittest.mock import Mock, patch, MagicMock, call
 from models.question_generator import QuestionGenerator
+from models.question_schema import (
+    QuestionValidationError, expand_question, invalid_fields, repair_locally, validate_payload
+)
 from models import Chunk, Question
 from models.config import Config
 
@@ -61,19 +66,224 @@ class TestQuestionGenerator:
         assert "medium" in difficulties or "hard" in difficulties
         assert all(d in ["easy", "medium", "hard"] for d in difficulties)
     
-    def test_extract_key_concepts(self, generator, sample_chunks):
-        """测试：关键概念提取"""
+    def test_ready_concepts_in_prompt(self, generator, sample_chunks):
+        """测试：已提取的核心概念写入出题提示词的[user]段"""
+        messages = generator._render_question_prompt(
+            "true_false", sample_chunks[:1], "easy", {"concepts": ["1. 过拟合", {"name": "交叉验证"}]}
+        )
+        empty = generator._render_question_prompt("true_false", sample_chunks[:1], "easy", {})
+
+        assert "核心概念：过拟合、交叉验证" in messages[1]["content"]
+        assert "核心概念：无" in empty[1]["content"]
+        assert messages[0] == empty[0]
+
+
+    def test_uses_injected_gateway(self, config):
+        """测试：使用注入的共享网关和客户端，不再单独创建"""
+        shared_llm = Mock()
+        with patch('models.question_generator.OpenAI') as mock_openai:
+            generator = QuestionGenerator(config, llm=shared_llm)
+        
+        mock_openai.assert_not_called()
+        assert generator.llm is shared_llm
+        assert generator.client is shared_llm.client
+
+
+    def test_compact_multiple_choice_expanded(self, generator, sample_chunks):
+        """测试：紧凑格式选择题在本地展开，答案下标还原为选项文本"""
         with patch.object(generator.client.chat.completions, 'create') as mock_create:
-            # 模拟 API 响应
             mock_response = Mock()
-            mock_response.choices = [Mock(message=Mock(content="机器学习\n过拟合\n交叉验证"))]
+            mock_response.choices = [Mock(message=Mock(
+                content='{"q": "什么是过拟合？", "o": ["甲", "乙", "丙", "丁"], "a": 2, "e": "解释", "t": ["过拟合"]}'
+            ))]
             mock_create.return_value = mock_response
             
-            concepts = generator._extract_key_concepts_for_questions(sample_chunks)
+            question = generator._generate_multiple_choice(sample_chunks, {}, "easy")
             
-            assert concepts is not None
-            assert "concepts" in concepts
-            assert len(concepts["concepts"]) > 0
+            assert question.correct_answer == "丙"
+            assert question.options == ["甲", "乙", "丙", "丁"]
+            assert question.tags == ["过拟合"]
+            assert mock_create.call_args.kwargs["max_tokens"] == generator.config.MAX_TOKENS_MULTIPLE_CHOICE
+
+    
+    def test_duplicates_regenerated_within_budget(self, generator, sample_chunks):
+        """测试：与题库或本次已出题目重复的题目不交付，在重试次数内重新生成，用完后跳过并通知"""
+        def make(question_id, content):
+            return Question(
+                question_id=question_id, question_type="multiple_choice", content=content,
+                options=["A", "B"], correct_answer="A", explanation="", difficulty="easy",
+                source_chunks=[], tags=[], metadata={}
+            )
+        banked = make("banked", "以下哪项是过拟合的典型表现？")
+        fresh = make("fresh", "交叉验证的主要作用是什么？")
+        repeat = make("fresh", "交叉验证的主要作用是什么？")
+        second = make("second", "正则化通过什么方式缓解过拟合？")
+        generator.local_generator = Mock()
+        generator.deduplicator = Mock()
+        generator.deduplicator.is_duplicate.side_effect = lambda q: q.question_id == "banked"
+        on_complete, on_skipped = Mock(), Mock()
+        
+        assert generator.DEDUP_RETRY_BUDGET == 2
+        with patch.object(
+            generator, '_generate_multiple_choice_stream',
+            side_effect=[banked, fresh, repeat, second, banked]
+        ) as mock_gen:
+            questions = generator.generate_questions_stream(
+                sample_chunks, num_questions=3,
+                question_types=["multiple_choice"], pre_extracted_concepts={},
+                on_question_complete=on_complete, on_question_skipped=on_skipped
+            )
+        
+        assert questions == [fresh, second]
+        assert mock_gen.call_count == 5
+        assert on_complete.call_args_list == [call(fresh), call(second)]
+        on_skipped.assert_called_once_with(3, 3)
+        generator.local_generator.generate.assert_not_called()
+        assert generator.deduplicator.add.call_args_list == [call(fresh), call(second)]
+
+    def test_llm_failure_degrades_to_local(self, generator, sample_chunks):
+        """测试：LLM调用失败时由本地规则出题"""
+        # 固定随机种子：示例资料很短，本地规则偶尔会出重复的题
+        with patch.object(generator.client.chat.completions, 'create', side_effect=ConnectionError("down")), \
+                patch('models.question_generator.random', random.Random(0)), \
+                patch.object(generator.local_generator, 'rng', random.Random(0)):
+            questions = generator.generate_questions(
+                sample_chunks, num_questions=2,
+                question_types=["multiple_choice", "true_false"]
+            )
+
+        assert len(questions) == 2
+        assert all(q.metadata["source"] == "local" for q in questions)
+
+    def test_instant_first_question_is_local(self, generator, sample_chunks):
+        """测试：即时首题不调用LLM"""
+        with patch.object(generator, '_generate_true_false') as mock_gen:
+            questions = generator.generate_questions(
+                sample_chunks, num_questions=1,
+                question_types=["true_false"], pre_extracted_concepts={},
+                instant_first=True
+            )
+
+        mock_gen.assert_not_called()
+        assert questions[0].metadata["generation_method"] == "local_rule"
+
+    def test_pending_concepts_not_awaited(self, generator, sample_chunks):
+        """测试：概念仍在提取中时不等待，完成后才传给出题"""
+        pending = Future()
+        question = expand_question("true_false", {"s": "过拟合是指模型泛化能力强", "a": False}, "easy", [], "llm")
+        with patch.object(generator, '_generate_true_false', return_value=question) as mock_gen:
+            generator.generate_questions(
+                sample_chunks, num_questions=1, question_types=["true_false"],
+                pre_extracted_concepts=pending
+            )
+            pending.set_result({"concepts": ["过拟合"]})
+            generator.generate_questions(
+                sample_chunks, num_questions=1, question_types=["true_false"],
+                pre_extracted_concepts=pending
+            )
+
+        assert mock_gen.call_args_list[0].args[1] == {}
+        assert mock_gen.call_args_list[1].args[1] == {"concepts": ["过拟合"]}
+
+    def test_true_false_explanation_uses_source_text(self, generator, sample_chunks):
+        """测试：真假题两阶段生成解析时使用资料原文而非片段序号"""
+        question = expand_question("true_false", {"s": "陈述", "a": True}, "easy", sample_chunks[1:2], "llm")
+        generator.llm = MagicMock()
+        generator.llm.chat.return_value = Mock(choices=[Mock(message=Mock(content="解析"))])
+        generator.prompts = MagicMock()
+
+        assert generator.generate_explanation(question) == "解析"
+        context = generator.prompts.render_messages.call_args.kwargs["context"]
+        assert context == sample_chunks[1].text
+
+    def test_chunk_selector_records_indices(self, generator, sample_chunks):
+        """测试：使用分块选择器时只传入选中的分块并记录其下标"""
+        selector = Mock(return_value=[sample_chunks[2], sample_chunks[0]])
+        question = Question(
+            question_id="q", question_type="true_false", content="c", options=["True", "False"],
+            correct_answer="True", explanation="", difficulty="easy",
+            source_chunks=[], tags=[], metadata={}
+        )
+
+        with patch.object(generator, '_generate_true_false', return_value=question) as mock_gen:
+            generator.generate_questions(
+                sample_chunks, num_questions=1, question_types=["true_false"],
+                pre_extracted_concepts={}, chunk_selector=selector
+            )
+
+        selector.assert_called_once_with(sample_chunks, 2)
+        assert mock_gen.call_args.args[0] == [sample_chunks[2], sample_chunks[0]]
+        assert question.metadata["chunk_indices"] == [0, 2]
+
+    def test_repair_only_broken_field(self, generator, sample_chunks):
+        """测试：选项不足时只请求修复选项字段，不重新生成整道题"""
+        def reply(content):
+            return Mock(choices=[Mock(message=Mock(content=content))], usage=None)
+
+        with patch.object(generator.client.chat.completions, 'create') as mock_create:
+            mock_create.side_effect = [
+                reply('{"q": "什么是过拟合？", "o": ["甲", "乙", "丙"], "a": "乙", "e": "解释"}'),
+                reply('{"o": ["甲", "乙", "丙", "丁"]}')
+            ]
+            question = generator._generate_multiple_choice(sample_chunks, {}, "easy")
+
+        assert mock_create.call_count == 2
+        repair_messages = mock_create.call_args.kwargs["messages"]
+        assert "需要修复的字段：o" in repair_messages[-1]["content"]
+        assert question.options == ["甲", "乙", "丙", "丁"]
+        assert question.correct_answer == "乙"
+
+
+class TestQuestionSchema:
+    """紧凑输出格式展开测试"""
+    
+    def test_expand_short_answer(self):
+        """测试：简答题展开参考答案和评分要点"""
+        question = expand_question(
+            "short_answer",
+            {"q": "问题", "r": "参考答案", "c": ["要点1"], "e": "解释", "t": []},
+            "medium", [], "llm"
+        )
+        
+        assert question.correct_answer == "参考答案"
+        assert question.metadata["scoring_criteria"] == ["要点1"]
+    
+    def test_expand_true_false(self):
+        """测试：真假题布尔答案展开为 True/False"""
+        question = expand_question("true_false", {"s": "陈述", "a": False, "e": ""}, "easy", [], "llm")
+        
+        assert question.correct_answer == "False"
+        assert question.options == ["True", "False"]
+    
+    def test_invalid_fields_reported(self):
+        """测试：校验报告缺失、数量错误和不匹配的字段"""
+        assert invalid_fields("multiple_choice", {"q": "问题", "a": 0}) == {"o"}
+        assert invalid_fields("multiple_choice", {"q": "问题", "o": ["甲", "乙", "丙"], "a": 0}) == {"o"}
+        assert invalid_fields("multiple_choice", {"q": "问题", "o": ["甲", "乙", "丙", "丁"], "a": "戊"}) == {"a"}
+        assert invalid_fields("true_false", {"s": "陈述", "a": True}) == set()
+    
+    def test_local_repair_matches_answer_to_option(self):
+        """测试：答案字母、带标签选项和近似文本在本地匹配到选项下标"""
+        data = {"q": "问题", "o": ["A. 正则化", "B. 交叉验证", "C. 梯度下降", "D. 数据增强"], "a": "交叉验证法"}
+        repaired = repair_locally("multiple_choice", data)
+        assert repaired["o"][1] == "交叉验证"
+        assert validate_payload("multiple_choice", repaired)["a"] == 1
+        
+        assert repair_locally("multiple_choice", {**data, "a": "c"})["a"] == 2
+        assert repair_locally("true_false", {"s": "陈述", "a": "错误"})["a"] is False
+    
+    def test_local_repair_trims_extra_options(self):
+        """测试：选项过多时保留正确答案"""
+        data = {"q": "问题", "o": ["甲", "乙", "丙", "丁", "戊"], "a": 4}
+        repaired = validate_payload("multiple_choice", repair_locally("multiple_choice", data))
+        assert repaired["o"] == ["甲", "乙", "丙", "戊"]
+        assert repaired["a"] == 3
+    
+    def test_unrepairable_raises(self):
+        """测试：无法修复时抛出校验错误"""
+        with pytest.raises(QuestionValidationError) as exc_info:
+            validate_payload("short_answer", {"q": "问题"})
+        assert exc_info.value.fields == {"r"}
 
 
 class TestQuestionGeneratorStream:
@@ -0,0 +1,54 @@
+import random
+import pytest
+from unittest.mock import Mock
+from models.question_pool import SharedQuestionPool
+from models import Question
+
+
+class TestSharedQuestionPool:
+    """SharedQuestionPool 单元测试"""
+
+    @pytest.fixture
+    def pool(self, pool_store):
+        """创建带内存store的共享题目池"""
+        return SharedQuestionPool(pool_store, rng=random.Random(0))
+
+    def test_other_users_draw_generated_questions(self, pool, make_question):
+        """测试：一个用户生成的题目可被其他用户抽取，按难度排列"""
+        questions = [make_question("q1", difficulty="hard"), make_question("q2", difficulty="easy")]
+        pool.add("m1", questions)
+        pool.mark_served("m1", "alice", questions)
+
+        drawn = pool.draw("m1", "bob", 5, ["multiple_choice"])
+
+        assert [q.question_id for q in drawn] == ["q2", "q1"]
+        assert isinstance(drawn[0], Question)
+        assert pool.draw("m2", "bob", 5, ["multiple_choice"]) == []
+
+    def test_no_repeat_for_same_user(self, pool, make_question):
+        """测试：用户不会再次抽到已见过的题目"""
+        pool.add("m1", [make_question("q1"), make_question("q2")])
+        first = pool.draw("m1", "bob", 1, ["multiple_choice"])
+        pool.mark_served("m1", "bob", first)
+
+        second = pool.draw("m1", "bob", 5, ["multiple_choice"])
+
+        assert len(second) == 1
+        assert second[0].question_id != first[0].question_id
+
+    def test_filters_question_types(self, pool, make_question):
+        """测试：只抽取请求的题型"""
+        pool.add("m1", [make_question("q1"), make_question("q2", question_type="true_false")])
+        drawn = pool.draw("m1", "bob", 5, ["true_false"])
+        assert [q.question_id for q in drawn] == ["q2"]
+
+    def test_store_failure_falls_back_to_generation(self):
+        """测试：store不可用时返回空列表，由调用方生成题目"""
+        store = Mock()
+        store.load_served_question_ids.side_effect = ConnectionError("down")
+        pool = SharedQuestionPool(store)
+        assert pool.draw("m1", "bob", 3, ["multiple_choice"]) == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
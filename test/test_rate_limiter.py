@@ -0,0 +1,155 @@
+import pytest
+import threading
+import time
+from unittest.mock import Mock, MagicMock
+from models.rate_limiter import AdaptiveRateLimiter, TokenBucket
+from models.llm_gateway import LLMGateway
+from models.retry_policy import RetryPolicy
+from openai import APIConnectionError
+
+
+class TestRateLimiter:
+    """AdaptiveRateLimiter 单元测试"""
+
+    @pytest.fixture
+    def limiter(self):
+        """创建限流器"""
+        return AdaptiveRateLimiter(
+            requests_per_minute=6000,
+            tokens_per_minute=1000000,
+            max_concurrency=4,
+            latency_target=1.0,
+            initial_concurrency=2
+        )
+
+    def test_token_bucket_wait_time(self):
+        """测试：令牌不足时返回需要等待的时间"""
+        bucket = TokenBucket(60)  # 每秒补充1个
+        now = time.monotonic()
+        bucket.consume(60)
+
+        assert bucket.time_until(1, now) == pytest.approx(1.0, abs=0.05)
+
+    def test_concurrency_cap_blocks(self, limiter):
+        """测试：达到并发上限后新的调用排队等待"""
+        t1 = limiter.acquire()
+        t2 = limiter.acquire()
+        acquired = threading.Event()
+
+        def worker():
+            ticket = limiter.acquire()
+            acquired.set()
+            limiter.release(ticket)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        assert not acquired.wait(0.1)
+
+        limiter.release(t1)
+        assert acquired.wait(1.0)
+        thread.join()
+        limiter.release(t2)
+
+        assert limiter.stats()["max_queue_wait"] >= 0.1
+
+    def test_rate_limited_decreases_limit(self, limiter):
+        """测试：429 时并发上限乘性减小"""
+        ticket = limiter.acquire()
+        limiter.release(ticket, rate_limited=True)
+
+        assert limiter.concurrency_limit == 1.0
+        assert limiter.stats()["rate_limited"] == 1
+
+    def test_success_increases_limit(self, limiter):
+        """测试：成功且延迟正常时并发上限加性增加，不超过最大值"""
+        for _ in range(20):
+            limiter.release(limiter.acquire(), latency=0.01)
+
+        assert limiter.concurrency_limit == 4.0
+
+
+class TestLLMGateway:
+    """LLMGateway 单元测试"""
+
+    def test_chat_goes_through_limiter(self):
+        """测试：调用经过限流器并记录排队时间"""
+        config = Mock(DEBUG=False)
+        client = MagicMock()
+        limiter = AdaptiveRateLimiter(requests_per_minute=6000, max_concurrency=2)
+        gateway = LLMGateway(config, client, limiter)
+
+        gateway.chat(model="m", messages=[{"role": "user", "content": "hi"}])
+
+        client.chat.completions.create.assert_called_once()
+        assert limiter.stats()["total_calls"] == 1
+        assert limiter.in_flight == 0
+
+    def test_stream_releases_on_exit(self):
+        """测试：流式调用在上下文退出时释放槽位"""
+        config = Mock(DEBUG=False)
+        client = MagicMock()
+        stream_cm = MagicMock()
+        stream_cm.__enter__.return_value = ["a", "b"]
+        client.chat.completions.create.return_value = stream_cm
+        limiter = AdaptiveRateLimiter(requests_per_minute=6000, max_concurrency=2)
+        gateway = LLMGateway(config, client, limiter)
+
+        with gateway.chat(model="m", messages=[], stream=True) as stream:
+            assert limiter.in_flight == 1
+            assert list(stream) == ["a", "b"]
+
+        assert limiter.in_flight == 0
+
+    def test_retry_on_transient_error(self):
+        """测试：瞬时错误按退避策略重试"""
+        config = Mock(DEBUG=False)
+        client = MagicMock()
+        client.chat.completions.create.side_effect = [
+            APIConnectionError(request=Mock()),
+            "ok"
+        ]
+        policy = RetryPolicy(max_attempts=3, base_delay=0.01, deadline=5)
+        gateway = LLMGateway(config, client, retry_policy=policy)
+
+        assert gateway.chat(model="m", messages=[]) == "ok"
+        assert client.chat.completions.create.call_count == 2
+
+    def test_no_retry_on_permanent_error(self):
+        """测试：非瞬时错误直接抛出，不重试"""
+        config = Mock(DEBUG=False)
+        client = MagicMock()
+        client.chat.completions.create.side_effect = ValueError("bad request")
+        gateway = LLMGateway(config, client, retry_policy=RetryPolicy(max_attempts=3))
+
+        with pytest.raises(ValueError):
+            gateway.chat(model="m", messages=[])
+        assert client.chat.completions.create.call_count == 1
+
+    def test_hedged_request_returns_first(self):
+        """测试：首个请求超过 p95 延迟后发出对冲请求，取先返回者"""
+        config = Mock(DEBUG=False)
+        client = MagicMock()
+        calls = []
+
+        def create(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                time.sleep(0.5)
+                return "slow"
+            return "fast"
+
+        client.chat.completions.create.side_effect = create
+        gateway = LLMGateway(
+            config, client,
+            retry_policy=RetryPolicy(max_attempts=1, deadline=5),
+            hedge_ratio=1.0
+        )
+        for _ in range(20):
+            gateway.latency.record(0.01)
+
+        assert gateway.chat(model="m", messages=[]) == "fast"
+        assert gateway.stats()["hedged"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
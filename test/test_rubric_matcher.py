@@ -0,0 +1,96 @@
+import json
+import pytest
+from unittest.mock import Mock, MagicMock
+from models.answer_evaluator import AnswerEvaluator
+from models.question_schema import expand_question
+from models.rubric_matcher import AhoCorasick, RubricMatcher, compile_rubric, criterion_terms
+from models import Chunk
+from models.config import Config
+
+
+class TestAhoCorasick:
+    """AhoCorasick 单元测试"""
+
+    def test_overlapping_patterns(self):
+        """测试：一次扫描找出相互重叠的全部模式串"""
+        automaton = AhoCorasick({"he": {"he"}, "she": {"she"}, "his": {"his"}, "hers": {"hers"}})
+
+        assert automaton.find("ushers") == {"he", "she", "hers"}
+        assert automaton.find("xyz") == set()
+
+
+class TestRubricMatcher:
+    """RubricMatcher 单元测试"""
+
+    def test_criterion_terms_strip_leading_verb(self):
+        """测试：从评分要点中去掉"提到/说明"等动词并拆分关键词"""
+        assert criterion_terms("提到模型复杂度") == [["模型复杂度"]]
+        assert criterion_terms("说明训练集与测试集的差异") == [["训练集"], ["测试集的差异"]]
+
+    def test_synonyms_and_partial_credit(self):
+        """测试：同义词任一命中即算命中，按要点给出部分得分和遗漏要点"""
+        matcher = RubricMatcher(
+            ["提到模型复杂度", "说明泛化能力差", "提出正则化等解决办法"],
+            [["模型复杂", "参数过多"], ["泛化", "新数据上表现差"], ["正则化", "早停"]]
+        )
+
+        result = matcher.match("参数过多，导致在新数据上表现差。")
+
+        assert result.hit == ["提到模型复杂度", "说明泛化能力差"]
+        assert result.missed == ["提出正则化等解决办法"]
+        assert result.score == pytest.approx(66.7)
+        assert not result.complete
+
+    def test_compiled_at_creation(self):
+        """测试：简答题展开时即编译评分要点自动机"""
+        data = {"q": "什么是过拟合？", "r": "模型过于复杂", "c": ["提到模型复杂度"], "k": [["模型复杂"]]}
+        question = expand_question("short_answer", data, "easy", [Chunk(text="资料", metadata={})], "llm")
+
+        assert question.metadata["rubric_keywords"] == [["模型复杂"]]
+        assert compile_rubric(question).match("模型复杂").complete
+
+    def test_no_usable_criteria(self, make_question):
+        """测试：没有评分要点的题目不编译"""
+        question = make_question("rubric-empty", question_type="short_answer", metadata={"scoring_criteria": []})
+        assert compile_rubric(question) is None
+
+
+class TestRubricGrading:
+    """评分要点自动机与评估器的配合"""
+
+    @pytest.fixture
+    def evaluator(self):
+        config = Mock(spec=Config)
+        config.OPENAI_MODEL = "gpt-3.5-turbo"
+        llm = MagicMock()
+        llm.chat.return_value = Mock(choices=[Mock(message=Mock(content=json.dumps(
+            {"is_correct": False, "score": 40, "feedback": "不完整", "detailed_explanation": "解释"}
+        )))])
+        return AnswerEvaluator(config, llm=llm, prompts=MagicMock(), rubric_accept=True)
+
+    @pytest.fixture
+    def rubric_metadata(self):
+        return {"scoring_criteria": ["提到模型复杂度", "说明泛化能力差"], "rubric_keywords": [["模型复杂"], ["泛化"]]}
+
+    def test_complete_answer_skips_llm(self, evaluator, make_question, rubric_metadata):
+        """测试：命中全部要点时本地判对，不调用LLM"""
+        question = make_question("rubric-full", question_type="short_answer", metadata=rubric_metadata)
+
+        result = evaluator.evaluate_answer(question, "模型复杂，泛化能力差")
+
+        assert result.is_correct and result.score == 100
+        evaluator.llm.chat.assert_not_called()
+
+    def test_partial_answer_escalates(self, evaluator, make_question, rubric_metadata):
+        """测试：遗漏要点时交给LLM评分，预览给出遗漏的要点"""
+        question = make_question("rubric-partial", question_type="short_answer", metadata=rubric_metadata)
+
+        assert evaluator.preview(question, "模型复杂").missed == ["说明泛化能力差"]
+        result = evaluator.evaluate_answer(question, "模型复杂")
+
+        assert result.score == 40
+        evaluator.llm.chat.assert_called_once()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
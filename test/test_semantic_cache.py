@@ -0,0 +1,116 @@
+import pytest
+import numpy as np
+from unittest.mock import Mock, MagicMock
+from models.answer_evaluator import AnswerEvaluator
+from models.embeddings import HashingEmbedder, GatewayEmbedder
+from models.semantic_cache import SemanticCache
+from models import Question, EvaluationResult
+from models.config import Config
+
+
+class TestSemanticCache:
+    """SemanticCache 单元测试"""
+
+    @pytest.fixture
+    def cache(self):
+        return SemanticCache(HashingEmbedder(), threshold=0.9, name="test")
+
+    def test_near_identical_request_hits(self, cache):
+        """测试：近似相同的文本命中缓存，无关文本不命中"""
+        cache.put("过拟合是指模型在训练集上表现很好，但在测试集上表现较差。", {"concepts": ["过拟合"]})
+
+        assert cache.get("过拟合是指模型在训练集上表现很好，但在测试集上表现较差") == {"concepts": ["过拟合"]}
+        assert cache.get("梯度下降通过沿负梯度方向更新参数来最小化损失函数。") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["hit_rate"] == 0.5
+
+    def test_partitions_isolated(self, cache):
+        """测试：不同分区（题目）的相同答案互不命中"""
+        cache.put("模型过于复杂", "q1的评分", partition="q1")
+
+        assert cache.get("模型过于复杂", partition="q2") is None
+        assert cache.get("模型过于复杂", partition="q1") == "q1的评分"
+
+    def test_returns_copy(self, cache):
+        """测试：命中时返回副本，调用方修改不影响缓存"""
+        cache.put("文本", {"concepts": ["a"]})
+        cache.get("文本")["concepts"].append("b")
+
+        assert cache.get("文本") == {"concepts": ["a"]}
+
+    def test_capacity_evicts_oldest(self):
+        """测试：分区满后覆盖最早的条目"""
+        cache = SemanticCache(HashingEmbedder(), threshold=0.99, capacity=2)
+        for text in ["第一条内容", "第二条不同的记录", "第三段全新文字"]:
+            cache.put(text, text)
+
+        assert cache.get("第一条内容") is None
+        assert cache.get("第三段全新文字") == "第三段全新文字"
+
+    def test_gateway_embedder_normalizes(self):
+        """测试：远程embedding结果被归一化"""
+        llm = Mock()
+        llm.embed.return_value = [[3.0, 4.0]]
+
+        vectors = GatewayEmbedder(llm, "text-embedding-3-small").embed(["x"])
+
+        assert np.allclose(vectors, [[0.6, 0.8]])
+        llm.embed.assert_called_once_with(["x"], model="text-embedding-3-small")
+
+
+class TestGradingCache:
+    """简答题评分的语义缓存"""
+
+    def test_paraphrased_answer_reuses_grade(self):
+        """测试：同一题目下近似相同的答案不再调用LLM"""
+        config = Mock(spec=Config)
+        config.OPENAI_MODEL = "gpt-3.5-turbo"
+        llm = MagicMock()
+        llm.chat.return_value = Mock(choices=[Mock(message=Mock(
+            content='{"is_correct": true, "score": 90, "feedback": "好", "detailed_explanation": "解析"}'
+        ))])
+        cache = SemanticCache(HashingEmbedder(), threshold=0.9)
+        evaluator = AnswerEvaluator(config, llm=llm, prompts=MagicMock(), grading_cache=cache)
+        question = Question(
+            question_id="q1", question_type="short_answer", content="什么是过拟合？",
+            options=[], correct_answer="模型过于复杂", explanation="", difficulty="medium",
+            source_chunks=[], tags=[], metadata={}
+        )
+
+        first = evaluator.evaluate_answer(question, "模型过于复杂，在训练集上表现好但泛化差。")
+        second = evaluator.evaluate_answer(question, "模型过于复杂，在训练集上表现好但泛化差")
+
+        assert llm.chat.call_count == 1
+        assert isinstance(second, EvaluationResult)
+        assert second.score == first.score == 90
+
+    def test_negated_answer_not_served_cached_grade(self):
+        """测试：否定改写的答案相似度很高，但不复用原答案的评分"""
+        config = Mock(spec=Config)
+        config.OPENAI_MODEL = "gpt-3.5-turbo"
+        llm = MagicMock()
+        llm.chat.return_value = Mock(choices=[Mock(message=Mock(
+            content='{"is_correct": true, "score": 90, "feedback": "好", "detailed_explanation": "解析"}'
+        ))])
+        cache = SemanticCache(HashingEmbedder(), threshold=0.9)
+        evaluator = AnswerEvaluator(config, llm=llm, prompts=MagicMock(), grading_cache=cache)
+        question = Question(
+            question_id="q-negation", question_type="short_answer", content="什么是过拟合？",
+            options=[], correct_answer="模型过于复杂", explanation="", difficulty="medium",
+            source_chunks=[], tags=[], metadata={}
+        )
+        answer = "过拟合是指模型过于复杂，在训练集上表现很好，但在测试集上表现较差，泛化能力弱。"
+
+        evaluator.evaluate_answer(question, answer)
+        evaluator.evaluate_answer(question, answer.replace("是指", "不是指"))
+
+        assert llm.chat.call_count == 2
+
+    def test_hashing_embedder_not_semantic(self):
+        """测试：本地哈希向量不标记为语义embedding（不用于复用评分）"""
+        assert not HashingEmbedder.semantic
+        assert GatewayEmbedder.semantic
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,101 @@
+import threading
+import time
+import pytest
+from unittest.mock import Mock, MagicMock
+from models.single_flight import SingleFlight, request_key
+from models.llm_gateway import LLMGateway
+
+
+class TestSingleFlight:
+    """SingleFlight 单元测试"""
+
+    def test_concurrent_sync_callers_share_result(self):
+        """测试：并发的相同请求只执行一次"""
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def fn():
+            calls.append(1)
+            release.wait(timeout=2)
+            return "result"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do("k", fn)))
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join()
+
+        assert calls == [1]
+        assert results == ["result"] * 4
+        assert flight.stats() == {"executed": 1, "coalesced": 3, "in_flight": 0}
+
+    def test_error_propagates_to_all_callers(self):
+        """测试：首个调用失败时，共享该请求的调用方都收到异常"""
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fn():
+            release.wait(timeout=2)
+            raise ValueError("boom")
+
+        errors = []
+
+        def call():
+            try:
+                flight.do("k", fn)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join()
+
+        assert len(errors) == 3
+
+    def test_request_key_ignores_timeout(self):
+        """测试：请求键不受超时参数影响"""
+        kwargs = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+        assert request_key(kwargs) == request_key({**kwargs, "timeout": 5})
+        assert request_key(kwargs) != request_key({**kwargs, "temperature": 0.7})
+
+    def test_gateway_coalesces_low_temperature_calls_only(self):
+        """测试：网关只合并低温度的非流式调用"""
+        release = threading.Event()
+        client = MagicMock()
+
+        def create(**kwargs):
+            release.wait(timeout=2)
+            return Mock(usage=None)
+
+        client.chat.completions.create.side_effect = create
+        gateway = LLMGateway(Mock(DEBUG=False), client, single_flight=SingleFlight())
+
+        def call(temperature):
+            gateway.chat(model="m", messages=[], temperature=temperature)
+
+        threads = [threading.Thread(target=call, args=(0.3,)) for _ in range(3)]
+        threads += [threading.Thread(target=call, args=(0.7,)) for _ in range(2)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join()
+
+        assert client.chat.completions.create.call_count == 3
+        assert gateway.stats()["single_flight"]["coalesced"] == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
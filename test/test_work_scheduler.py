@@ -0,0 +1,96 @@
+import threading
+import time
+import pytest
+from models.rate_limiter import AdaptiveRateLimiter
+from models.work_scheduler import (
+    FairWorkQueue, Priority, Waiter, WorkContext, current_work, llm_work
+)
+
+
+class TestFairWorkQueue:
+    """FairWorkQueue 单元测试"""
+
+    def test_higher_priority_first(self):
+        """测试：高优先级类别先出队，与入队顺序无关"""
+        queue = FairWorkQueue()
+        background = Waiter(WorkContext(Priority.BACKGROUND, "a"))
+        interactive = Waiter(WorkContext(Priority.INTERACTIVE, "b"))
+        queue.push(background)
+        queue.push(interactive)
+
+        assert queue.head() is interactive
+        queue.remove(interactive, admitted=True)
+        assert queue.head() is background
+
+    def test_round_robin_across_users(self):
+        """测试：同一类别内按用户轮转，批量请求不会挤占其他用户"""
+        queue = FairWorkQueue()
+        a1, a2, a3 = (Waiter(WorkContext(Priority.NEXT_QUESTION, "alice")) for _ in range(3))
+        b1 = Waiter(WorkContext(Priority.NEXT_QUESTION, "bob"))
+        for waiter in (a1, a2, a3, b1):
+            queue.push(waiter)
+
+        order = []
+        while queue.head() is not None:
+            waiter = queue.head()
+            order.append(waiter)
+            queue.remove(waiter, admitted=True)
+
+        assert order == [a1, b1, a2, a3]
+
+    def test_stats_depth_and_served(self):
+        """测试：统计各类别的排队深度和已放行数"""
+        queue = FairWorkQueue()
+        waiter = Waiter(WorkContext(Priority.INTERACTIVE, "a"))
+        queue.push(waiter)
+        queue.push(Waiter(WorkContext(Priority.BACKGROUND, "a")))
+        queue.remove(waiter, admitted=True)
+
+        stats = queue.stats()
+        assert stats["interactive"]["depth"] == 0
+        assert stats["interactive"]["served"] == 1
+        assert stats["background"]["depth"] == 1
+
+    def test_llm_work_context(self):
+        """测试：llm_work在上下文内生效，退出后恢复"""
+        with llm_work(Priority.INTERACTIVE, "alice"):
+            assert current_work() == WorkContext(Priority.INTERACTIVE, "alice")
+        assert current_work().priority == Priority.NEXT_QUESTION
+
+
+class TestPriorityAdmission:
+    """限流器按优先级放行"""
+
+    def test_interactive_admitted_before_background(self):
+        """测试：并发已满时，后到的评分请求先于排队的后台请求获得槽位"""
+        limiter = AdaptiveRateLimiter(
+            requests_per_minute=6000, tokens_per_minute=1000000,
+            max_concurrency=1, initial_concurrency=1
+        )
+        ticket = limiter.acquire()
+        admitted = []
+
+        def worker(priority, name):
+            with llm_work(priority, name):
+                t = limiter.acquire(timeout=5)
+            admitted.append(name)
+            limiter.release(t, latency=0.01)
+
+        threads = [threading.Thread(target=worker, args=(Priority.BACKGROUND, f"bg{i}")) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        interactive = threading.Thread(target=worker, args=(Priority.INTERACTIVE, "grade"))
+        interactive.start()
+        time.sleep(0.05)
+
+        limiter.release(ticket, latency=0.01)
+        for thread in threads + [interactive]:
+            thread.join(timeout=5)
+
+        assert admitted[0] == "grade"
+        assert limiter.stats()["queues"]["interactive"]["served"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])